@@ -0,0 +1,32 @@
+"""add (room_id, created_at, id) index on messages
+
+Revision ID: 3f8b1d6e2a47
+Revises: 7c2e5a9d4b61
+Create Date: 2026-10-18 11:02:19.318406
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "3f8b1d6e2a47"
+down_revision: Union[str, None] = "7c2e5a9d4b61"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index(
+        "ix_messages_room_id_created_at_id",
+        "messages",
+        ["room_id", "created_at", "id"],
+        unique=False,
+    )
+    op.drop_index("ix_messages_room_id", table_name="messages")
+
+
+def downgrade() -> None:
+    op.create_index("ix_messages_room_id", "messages", ["room_id"], unique=False)
+    op.drop_index("ix_messages_room_id_created_at_id", table_name="messages")
@@ -0,0 +1,54 @@
+"""add full-text and trigram search indexes to messages
+
+Revision ID: 9a4c6e2f1b83
+Revises: 3f8b1d6e2a47
+Create Date: 2026-10-18 16:05:12.271904
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "9a4c6e2f1b83"
+down_revision: Union[str, None] = "3f8b1d6e2a47"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    op.add_column(
+        "messages",
+        sa.Column(
+            "search_vector",
+            postgresql.TSVECTOR(),
+            sa.Computed("to_tsvector('simple', content)", persisted=True),
+            nullable=True,
+        ),
+    )
+    op.create_index(
+        "ix_messages_search_vector",
+        "messages",
+        ["search_vector"],
+        unique=False,
+        postgresql_using="gin",
+    )
+    op.create_index(
+        "ix_messages_content_trgm",
+        "messages",
+        ["content"],
+        unique=False,
+        postgresql_using="gin",
+        postgresql_ops={"content": "gin_trgm_ops"},
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_messages_content_trgm", table_name="messages")
+    op.drop_index("ix_messages_search_vector", table_name="messages")
+    op.drop_column("messages", "search_vector")
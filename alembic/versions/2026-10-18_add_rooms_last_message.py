@@ -0,0 +1,55 @@
+"""denormalize last message and activity time onto rooms
+
+Revision ID: b5d83f0c7e19
+Revises: 9a4c6e2f1b83
+Create Date: 2026-10-18 17:40:03.918245
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "b5d83f0c7e19"
+down_revision: Union[str, None] = "9a4c6e2f1b83"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column("rooms", sa.Column("last_message_id", sa.Integer(), nullable=True))
+    op.add_column(
+        "rooms",
+        sa.Column(
+            "last_activity_at",
+            sa.TIMESTAMP(),
+            server_default=sa.func.now(),
+            nullable=False,
+        ),
+    )
+
+    op.execute(
+        """
+        UPDATE rooms AS r
+        SET last_message_id = m.id,
+            last_activity_at = m.created_at
+        FROM (
+            SELECT DISTINCT ON (room_id) room_id, id, created_at
+            FROM messages
+            ORDER BY room_id, created_at DESC, id DESC
+        ) AS m
+        WHERE r.id = m.room_id
+        """
+    )
+    op.execute(
+        "UPDATE rooms SET last_activity_at = created_at WHERE last_message_id IS NULL"
+    )
+    op.alter_column("rooms", "last_activity_at", server_default=None)
+
+
+def downgrade() -> None:
+    op.drop_column("rooms", "last_activity_at")
+    op.drop_column("rooms", "last_message_id")
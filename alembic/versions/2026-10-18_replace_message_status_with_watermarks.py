@@ -0,0 +1,133 @@
+"""replace message_status with read watermarks and hidden_messages
+
+Revision ID: 7c2e5a9d4b61
+Revises: 413ef3abc459
+Create Date: 2026-10-18 10:12:41.503118
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "7c2e5a9d4b61"
+down_revision: Union[str, None] = "413ef3abc459"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        "room_user", sa.Column("last_delivered_message_id", sa.Integer(), nullable=True)
+    )
+    op.add_column(
+        "room_user", sa.Column("last_read_message_id", sa.Integer(), nullable=True)
+    )
+    op.create_table(
+        "hidden_messages",
+        sa.Column("user_id", sa.Integer(), nullable=False),
+        sa.Column("message_id", sa.Integer(), nullable=False),
+        sa.Column("hidden_at", sa.TIMESTAMP(), nullable=False),
+        sa.ForeignKeyConstraint(["message_id"], ["messages.id"], ondelete="CASCADE"),
+        sa.ForeignKeyConstraint(["user_id"], ["users.id"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("user_id", "message_id"),
+    )
+    op.create_index(
+        "ix_hidden_messages_message_id", "hidden_messages", ["message_id"], unique=False
+    )
+
+    op.execute(
+        """
+        UPDATE room_user AS ru
+        SET last_delivered_message_id = s.delivered,
+            last_read_message_id = s.read
+        FROM (
+            SELECT m.room_id,
+                   ms.user_id,
+                   MAX(m.id) FILTER (
+                       WHERE ms.status IN ('delivered', 'viewed')
+                   ) AS delivered,
+                   MAX(m.id) FILTER (WHERE ms.status = 'viewed') AS read
+            FROM message_status AS ms
+            JOIN messages AS m ON m.id = ms.message_id
+            GROUP BY m.room_id, ms.user_id
+        ) AS s
+        WHERE ru.room_id = s.room_id AND ru.user_id = s.user_id
+        """
+    )
+    op.execute(
+        """
+        INSERT INTO hidden_messages (user_id, message_id, hidden_at)
+        SELECT user_id, message_id, MAX(updated_at)
+        FROM message_status
+        WHERE status = 'deleted'
+        GROUP BY user_id, message_id
+        """
+    )
+
+    op.drop_index("ix_message_status_user_id", table_name="message_status")
+    op.drop_index("ix_message_status_message_id", table_name="message_status")
+    op.drop_index(op.f("ix_message_status_id"), table_name="message_status")
+    op.drop_table("message_status")
+    sa.Enum(name="message_status_enum").drop(op.get_bind(), checkfirst=True)
+
+
+def downgrade() -> None:
+    op.create_table(
+        "message_status",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("message_id", sa.Integer(), nullable=False),
+        sa.Column("user_id", sa.Integer(), nullable=False),
+        sa.Column(
+            "status",
+            sa.Enum(
+                "sent",
+                "delivered",
+                "viewed",
+                "failed",
+                "deleted",
+                name="message_status_enum",
+            ),
+            nullable=False,
+        ),
+        sa.Column("updated_at", sa.TIMESTAMP(), nullable=False),
+        sa.ForeignKeyConstraint(["message_id"], ["messages.id"], ondelete="CASCADE"),
+        sa.ForeignKeyConstraint(["user_id"], ["users.id"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index(
+        op.f("ix_message_status_id"), "message_status", ["id"], unique=False
+    )
+    op.create_index(
+        "ix_message_status_message_id", "message_status", ["message_id"], unique=False
+    )
+    op.create_index(
+        "ix_message_status_user_id", "message_status", ["user_id"], unique=False
+    )
+
+    op.execute(
+        """
+        INSERT INTO message_status (message_id, user_id, status, updated_at)
+        SELECT m.id,
+               ru.user_id,
+               CASE
+                   WHEN h.message_id IS NOT NULL THEN 'deleted'
+                   WHEN m.id <= COALESCE(ru.last_read_message_id, 0) THEN 'viewed'
+                   ELSE 'delivered'
+               END::message_status_enum,
+               COALESCE(h.hidden_at, m.updated_at)
+        FROM messages AS m
+        JOIN room_user AS ru
+          ON ru.room_id = m.room_id AND m.created_at >= ru.joined_at
+        LEFT JOIN hidden_messages AS h
+          ON h.message_id = m.id AND h.user_id = ru.user_id
+        """
+    )
+
+    op.drop_index("ix_hidden_messages_message_id", table_name="hidden_messages")
+    op.drop_table("hidden_messages")
+    op.drop_column("room_user", "last_read_message_id")
+    op.drop_column("room_user", "last_delivered_message_id")
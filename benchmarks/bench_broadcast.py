@@ -0,0 +1,65 @@
+"""CPU per broadcast of one `new_message` event to a room.
+
+`per recipient` is the old path: `model_dump(mode="json")` once, then
+`send_json` encoding the payload again for every socket. `encode once` builds a
+single Frame straight from the model and enqueues the same text everywhere.
+
+    python -m benchmarks.bench_broadcast
+"""
+
+import datetime
+import json
+import time
+from typing import Callable, cast
+
+from fastapi import WebSocket
+
+from src.connections import Connection
+from src.frames import Frame
+from src.messages.schemas import MessageCreateResponse
+
+RECIPIENTS = (10, 100, 1_000)
+REPEAT = 200
+
+
+def measure(fn: Callable[[], None]) -> float:
+    start = time.process_time()
+    for _ in range(REPEAT):
+        fn()
+    return (time.process_time() - start) / REPEAT
+
+
+def main() -> None:
+    message = MessageCreateResponse(
+        id=1,
+        room_id=1,
+        sender_id=1,
+        content="Привет! " * 40,
+        created_at=datetime.datetime.now(),
+    )
+
+    print(f"{'recipients':>10} {'per recipient, us':>18} {'encode once, us':>16}")
+    for count in RECIPIENTS:
+        connections = [
+            Connection(cast(WebSocket, None), uid, max_queue=1) for uid in range(count)
+        ]
+
+        def per_recipient() -> None:
+            payload = {"type": "new_message", "data": message.model_dump(mode="json")}
+            for _ in connections:
+                json.dumps(payload, ensure_ascii=False, separators=(",", ":"))
+
+        def encode_once() -> None:
+            frame = Frame("new_message", message)
+            frame.text
+            for connection in connections:
+                connection.send(frame)
+
+        print(
+            f"{count:>10} {measure(per_recipient) * 1e6:>18.1f} "
+            f"{measure(encode_once) * 1e6:>16.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""Cost of serving a cached room list, by page size.
+
+The old hit path stored a JSON list of per-item JSON strings, so a hit ran
+`json.loads` on the list and on every item, `model_validate` on every item,
+and then FastAPI validated and serialised the models again for
+`response_model`. The current hit path hands the stored bytes to the response.
+
+    python -m benchmarks.bench_cache_hits
+"""
+
+import json
+import timeit
+from datetime import datetime
+
+from fastapi import Response
+from fastapi.encoders import jsonable_encoder
+from pydantic import TypeAdapter
+
+from src.responses import raw_json_response
+from src.rooms.schemas import LastMessageOut, RoomWithLastMessageOut
+
+SIZES = (10, 100, 1_000)
+REPEAT = 200
+ADAPTER = TypeAdapter(list[RoomWithLastMessageOut])
+
+
+def build(size: int) -> list[RoomWithLastMessageOut]:
+    now = datetime(2024, 1, 1)
+    return [
+        RoomWithLastMessageOut(
+            id=i,
+            name=f"room {i}",
+            is_private=False,
+            created_by=1,
+            created_at=now,
+            last_message=LastMessageOut(
+                id=i, content="hello " * 10, created_at=now, sender_id=1
+            ),
+        )
+        for i in range(size)
+    ]
+
+
+def old_hit(stored: str) -> bytes:
+    rooms = [
+        RoomWithLastMessageOut.model_validate(json.loads(item))
+        for item in json.loads(stored)
+    ]
+    validated = ADAPTER.validate_python(jsonable_encoder(rooms))
+    return ADAPTER.dump_json(validated)
+
+
+def main() -> None:
+    print(f"{'rooms':>6} {'old hit, us':>12} {'raw hit, us':>12}")
+    for size in SIZES:
+        rooms = build(size)
+        old_stored = json.dumps([r.model_dump_json() for r in rooms])
+        new_stored = ADAPTER.dump_json(rooms)
+        injected = Response()
+
+        old = timeit.timeit(lambda: old_hit(old_stored), number=REPEAT)
+        new = timeit.timeit(
+            lambda: raw_json_response(new_stored, injected), number=REPEAT
+        )
+        print(f"{size:>6} {old / REPEAT * 1e6:>12.1f} {new / REPEAT * 1e6:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
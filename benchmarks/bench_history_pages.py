@@ -0,0 +1,111 @@
+"""Latency of a room history page by depth: OFFSET vs keyset cursor.
+
+Needs a reachable Postgres at DATABASE_URL. The data lives in a temporary
+table with the same `(room_id, created_at, id)` index as `messages`, so
+nothing in the real schema is touched. Both query shapes are the ones
+`get_messages_by_room` issues: `ORDER BY created_at, id LIMIT/OFFSET` and a
+row comparison `(created_at, id) < cursor ORDER BY ... DESC LIMIT`.
+
+    python -m benchmarks.bench_history_pages
+"""
+
+import asyncio
+import time
+from typing import Any
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection, create_async_engine
+
+from src.config import settings
+
+ROWS = 500_000
+LIMIT = 20
+PAGES = (1, 100, 10_000)
+REPEAT = 20
+
+SETUP = [
+    """
+    CREATE TEMPORARY TABLE bench_messages (
+        id integer PRIMARY KEY,
+        room_id integer NOT NULL,
+        created_at timestamp NOT NULL,
+        content text NOT NULL
+    )
+    """,
+    """
+    INSERT INTO bench_messages
+    SELECT i, 1, timestamp '2024-01-01' + i * interval '1 second', md5(i::text)
+    FROM generate_series(1, :rows) AS i
+    """,
+    """
+    CREATE INDEX ix_bench_messages_room_id_created_at_id
+    ON bench_messages (room_id, created_at, id)
+    """,
+    "ANALYZE bench_messages",
+]
+
+OFFSET_PAGE = text(
+    """
+    SELECT * FROM bench_messages
+    WHERE room_id = 1
+    ORDER BY created_at, id
+    LIMIT :limit OFFSET :offset
+    """
+)
+
+KEYSET_PAGE = text(
+    """
+    SELECT * FROM bench_messages
+    WHERE room_id = 1 AND (created_at, id) < (:created_at, :id)
+    ORDER BY created_at DESC, id DESC
+    LIMIT :limit
+    """
+)
+
+CURSOR_AT = text(
+    """
+    SELECT created_at, id FROM bench_messages
+    WHERE room_id = 1
+    ORDER BY created_at DESC, id DESC
+    LIMIT 1 OFFSET :offset
+    """
+)
+
+
+async def measure(conn: AsyncConnection, query: Any, params: dict[str, Any]) -> float:
+    await conn.execute(query, params)
+    start = time.perf_counter()
+    for _ in range(REPEAT):
+        (await conn.execute(query, params)).all()
+    return (time.perf_counter() - start) / REPEAT
+
+
+async def run() -> None:
+    engine = create_async_engine(settings.DATABASE_URL)
+    async with engine.connect() as conn:
+        for statement in SETUP:
+            await conn.execute(text(statement), {"rows": ROWS})
+
+        print(f"{'page':>7} {'offset, ms':>11} {'keyset, ms':>11}")
+        for page in PAGES:
+            offset = (page - 1) * LIMIT
+            cursor = (await conn.execute(CURSOR_AT, {"offset": offset})).one()
+            offset_time = await measure(
+                conn, OFFSET_PAGE, {"limit": LIMIT, "offset": offset}
+            )
+            keyset_time = await measure(
+                conn,
+                KEYSET_PAGE,
+                {"limit": LIMIT, "created_at": cursor.created_at, "id": cursor.id},
+            )
+            print(f"{page:>7} {offset_time * 1e3:>11.2f} {keyset_time * 1e3:>11.2f}")
+
+    await engine.dispose()
+
+
+def main() -> None:
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    main()
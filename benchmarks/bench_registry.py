@@ -0,0 +1,52 @@
+"""Online-member lookup cost as the number of connected sockets grows.
+
+Every room holds the same number of members, so a lookup that depends only on
+the room size stays flat while a scan over all connections grows linearly.
+
+    python -m benchmarks.bench_registry
+"""
+
+import timeit
+from typing import cast
+
+from fastapi import WebSocket
+
+from src.connections import Connection, ConnectionRegistry
+
+ROOM_SIZE = 50
+TOTALS = (1_000, 10_000, 100_000)
+REPEAT = 200
+
+
+def build(total: int) -> tuple[ConnectionRegistry, dict[int, int]]:
+    registry = ConnectionRegistry()
+    user_rooms: dict[int, int] = {}
+    for user_id in range(total):
+        connection = Connection(cast(WebSocket, None), user_id)
+        registry.add(connection)
+        registry.join(connection, user_id // ROOM_SIZE)
+        user_rooms[user_id] = user_id // ROOM_SIZE
+    return registry, user_rooms
+
+
+def main() -> None:
+    print(f"{'connections':>12} {'scan, us':>10} {'index, us':>10} {'count, us':>10}")
+    for total in TOTALS:
+        registry, user_rooms = build(total)
+        room_id = total // ROOM_SIZE // 2
+
+        scan = timeit.timeit(
+            lambda: [uid for uid, rid in user_rooms.items() if rid == room_id],
+            number=REPEAT,
+        )
+        index = timeit.timeit(lambda: registry.users_in_room(room_id), number=REPEAT)
+        count = timeit.timeit(lambda: registry.room_count(room_id), number=REPEAT)
+
+        print(
+            f"{total:>12} {scan / REPEAT * 1e6:>10.2f} "
+            f"{index / REPEAT * 1e6:>10.2f} {count / REPEAT * 1e6:>10.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,185 @@
+"""Room search latency of the statements `search_messages` actually issues.
+
+Needs a reachable Postgres at DATABASE_URL with the pg_trgm extension
+available. Temporary `messages`, `room_user` and `hidden_messages` tables
+shadow the real ones for this session only, with the same generated
+`search_vector` column and indexes, so nothing in the real schema is touched.
+The statements are recorded from `search_messages` itself (visibility join,
+hidden-message filter, rank ordering, substring fallback) and replayed in the
+order the service runs them, stopping at the first that returns rows. The full
+10M-row seed takes a while; pass a smaller count as the first argument for a
+quick run.
+
+Targets on the 10M-row seed (warm cache, p95 of `REPEAT` runs):
+word search under 50 ms, substring fallback under 150 ms, both independent of
+how deep the room history goes.
+
+    python -m benchmarks.bench_search [rows]
+"""
+
+import asyncio
+import statistics
+import sys
+import time
+from types import SimpleNamespace
+from typing import Any
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection, create_async_engine
+
+from src.config import settings
+from src.messages.service import search_messages
+from src.pagination import SearchPagination
+
+ROWS = 10_000_000
+ROOMS = 1_000
+ROOM_ID = 7
+USER_ID = 1
+LIMIT = 20
+REPEAT = 50
+WORDS = ["alpha", "bravo", "charlie", "delta", "echo", "foxtrot", "golf", "hotel"]
+
+SETUP = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    """
+    CREATE TEMPORARY TABLE messages (
+        id integer PRIMARY KEY,
+        room_id integer NOT NULL,
+        sender_id integer NOT NULL,
+        content text NOT NULL,
+        created_at timestamp NOT NULL,
+        updated_at timestamp NOT NULL,
+        search_vector tsvector
+            GENERATED ALWAYS AS (to_tsvector('simple', content)) STORED
+    )
+    """,
+    """
+    INSERT INTO messages (id, room_id, sender_id, content, created_at, updated_at)
+    SELECT i,
+           i % :rooms,
+           1,
+           (:words)[1 + i % 8] || ' ' || md5(i::text) || ' ' || (:words)[1 + i % 7],
+           timestamp '2024-01-01' + i * interval '1 second',
+           timestamp '2024-01-01' + i * interval '1 second'
+    FROM generate_series(1, :rows) AS i
+    """,
+    """
+    CREATE INDEX ix_bench_room ON messages (room_id, created_at, id)
+    """,
+    "CREATE INDEX ix_bench_fts ON messages USING gin (search_vector)",
+    "CREATE INDEX ix_bench_trgm ON messages USING gin (content gin_trgm_ops)",
+    """
+    CREATE TEMPORARY TABLE room_user (
+        id integer PRIMARY KEY,
+        room_id integer NOT NULL,
+        user_id integer NOT NULL,
+        joined_at timestamp NOT NULL,
+        last_delivered_message_id integer,
+        last_read_message_id integer
+    )
+    """,
+    """
+    INSERT INTO room_user (id, room_id, user_id, joined_at)
+    VALUES (1, :room_id, :user_id, timestamp '2024-01-01')
+    """,
+    """
+    CREATE TEMPORARY TABLE hidden_messages (
+        user_id integer NOT NULL,
+        message_id integer NOT NULL,
+        hidden_at timestamp NOT NULL,
+        PRIMARY KEY (user_id, message_id)
+    )
+    """,
+    """
+    INSERT INTO hidden_messages (user_id, message_id, hidden_at)
+    SELECT :user_id, id, now() FROM messages
+    WHERE room_id = :room_id AND id % 50 = 0
+    """,
+    "CREATE INDEX ix_bench_hidden ON hidden_messages (message_id)",
+    "ANALYZE messages",
+    "ANALYZE room_user",
+    "ANALYZE hidden_messages",
+]
+
+# (name, search text): a word hit, a substring that only the fallback finds,
+# and a substring too short for the trigram index.
+CASES = [
+    ("word", "delta"),
+    ("substring", "a3f"),
+    ("short substring", "a3"),
+]
+
+
+class StatementRecorder:
+    """Stands in for the session and records every statement it is given.
+
+    Each one answers with no rows, so the fallback is always reached and the
+    whole chain `search_messages` can issue gets recorded.
+    """
+
+    def __init__(self) -> None:
+        self.statements: list[Any] = []
+
+    async def execute(self, statement: Any) -> Any:
+        self.statements.append(statement)
+        return SimpleNamespace(all=lambda: [])
+
+
+async def record(term: str) -> list[Any]:
+    recorder = StatementRecorder()
+    await search_messages(
+        ROOM_ID,
+        term,
+        recorder,  # type: ignore[arg-type]
+        SimpleNamespace(id=USER_ID),  # type: ignore[arg-type]
+        SearchPagination(limit=LIMIT),
+    )
+    return recorder.statements
+
+
+async def replay(conn: AsyncConnection, statements: list[Any]) -> int:
+    for count, statement in enumerate(statements, 1):
+        if (await conn.execute(statement)).all():
+            return count
+    return len(statements)
+
+
+async def measure(conn: AsyncConnection, statements: list[Any]) -> tuple[float, int]:
+    issued = await replay(conn, statements)
+    timings = []
+    for _ in range(REPEAT):
+        start = time.perf_counter()
+        await replay(conn, statements)
+        timings.append(time.perf_counter() - start)
+    return statistics.quantiles(timings, n=20)[18], issued
+
+
+async def run(rows: int) -> None:
+    engine = create_async_engine(settings.DATABASE_URL)
+    async with engine.connect() as conn:
+        for statement in SETUP:
+            await conn.execute(
+                text(statement),
+                {
+                    "rows": rows,
+                    "rooms": ROOMS,
+                    "words": WORDS,
+                    "room_id": ROOM_ID,
+                    "user_id": USER_ID,
+                },
+            )
+
+        print(f"{'search':<16} {'statements':>10} {'p95, ms':>9}")
+        for name, term in CASES:
+            p95, issued = await measure(conn, await record(term))
+            print(f"{name:<16} {issued:>10} {p95 * 1e3:>9.2f}")
+
+    await engine.dispose()
+
+
+def main() -> None:
+    asyncio.run(run(int(sys.argv[1]) if len(sys.argv) > 1 else ROWS))
+
+
+if __name__ == "__main__":
+    main()
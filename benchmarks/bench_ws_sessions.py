@@ -0,0 +1,112 @@
+"""DB sessions held by chat sockets: idle sockets vs. in-flight actions.
+
+Opens `SOCKETS` chat sockets through the real `chat_ws` handler, then lets a
+growing number of them send `get_messages` at once. Sessions come from a
+counting factory and the query sleeps for `QUERY_TIME`, so `peak sessions` is
+the number of pool connections the workload would pin. With one session per
+socket it would equal `sockets`; with a session per action it follows `active`.
+
+    python -m benchmarks.bench_ws_sessions
+"""
+
+import asyncio
+from types import SimpleNamespace
+from typing import Any
+from unittest.mock import AsyncMock
+
+from fastapi import WebSocketDisconnect
+
+from src.broker import LocalBroker
+from src.messages import ws
+from src.messages.manager import ChatConnectionManager
+
+SOCKETS = 2_000
+ACTIVE = (0, 10, 100, 500)
+QUERY_TIME = 0.01
+
+
+class CountingSessions:
+    def __init__(self) -> None:
+        self.open = 0
+        self.peak = 0
+
+    def __call__(self) -> "CountingSessions":
+        return self
+
+    async def __aenter__(self) -> AsyncMock:
+        self.open += 1
+        self.peak = max(self.peak, self.open)
+        return AsyncMock()
+
+    async def __aexit__(self, *exc: Any) -> None:
+        self.open -= 1
+
+
+class FakeWebSocket:
+    def __init__(self) -> None:
+        self.scope: dict[str, Any] = {"subprotocols": []}
+        self.inbox: asyncio.Queue[dict[str, Any] | None] = asyncio.Queue()
+
+    async def accept(self, subprotocol: str | None = None) -> None:
+        return None
+
+    async def receive_json(self) -> dict[str, Any]:
+        data = await self.inbox.get()
+        if data is None:
+            raise WebSocketDisconnect()
+        return data
+
+    async def send_text(self, text: str) -> None:
+        return None
+
+    async def send_bytes(self, data: bytes) -> None:
+        return None
+
+    async def close(self, code: int = 1000) -> None:
+        return None
+
+
+async def get_messages_by_room(*args: Any, **kwargs: Any) -> list[Any]:
+    await asyncio.sleep(QUERY_TIME)
+    return []
+
+
+async def run() -> None:
+    ws.manager = ChatConnectionManager(broker=LocalBroker())
+    ws.get_messages_by_room = get_messages_by_room  # type: ignore[assignment]
+
+    sessions = CountingSessions()
+    sockets = [FakeWebSocket() for _ in range(SOCKETS)]
+    handlers = [
+        asyncio.create_task(
+            ws.chat_ws(
+                websocket,
+                room_id=1,
+                sessions=sessions,
+                redis=AsyncMock(),
+                current_user=SimpleNamespace(id=uid),
+            )
+        )
+        for uid, websocket in enumerate(sockets)
+    ]
+    await asyncio.sleep(0.1)
+
+    print(f"{'sockets':>8} {'active':>7} {'peak sessions':>14}")
+    for active in ACTIVE:
+        sessions.peak = sessions.open
+        for websocket in sockets[:active]:
+            websocket.inbox.put_nowait({"action": "get_messages"})
+        await asyncio.sleep(QUERY_TIME * 5)
+        print(f"{SOCKETS:>8} {active:>7} {sessions.peak:>14}")
+
+    for websocket in sockets:
+        websocket.inbox.put_nowait(None)
+    await asyncio.gather(*handlers, return_exceptions=True)
+
+
+def main() -> None:
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    main()
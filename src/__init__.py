@@ -1,20 +1,24 @@
-from src.cache import add_file_to_temp_redis, clear_temp_files, get_temp_files
+from src.cache import add_file_to_temp_redis, add_files_to_temp_redis, take_temp_files
 from src.config import settings
 from src.constants import TEMP_FILE_KEY
 from src.database import Base
-from src.deps import get_db, get_redis
-from src.minio_client import upload_file_to_minio
-from src.pagination import Pagination
+from src.deps import get_db, get_redis, get_session_maker
+from src.minio_client import remove_file_from_minio, upload_file_to_minio
+from src.pagination import MessagePagination, Pagination, SearchPagination
 
 __all__ = [
     "settings",
     "Base",
     "get_db",
     "get_redis",
+    "get_session_maker",
     "TEMP_FILE_KEY",
-    "get_temp_files",
-    "clear_temp_files",
+    "take_temp_files",
     "add_file_to_temp_redis",
+    "add_files_to_temp_redis",
+    "remove_file_from_minio",
     "upload_file_to_minio",
     "Pagination",
+    "MessagePagination",
+    "SearchPagination",
 ]
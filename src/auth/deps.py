@@ -1,81 +1,64 @@
 from typing import Optional, Tuple
 
-from authlib.integrations.httpx_client import AsyncOAuth2Client
-from fastapi import Cookie, Depends, Header, WebSocket, status
+from fastapi import Cookie, Depends, Header, Response, WebSocket, status
+from redis.asyncio import Redis
 from sqlalchemy import select
-from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
 
 from src.auth.exceptions import AuthException
+from src.auth.introspection import (
+    introspect_google_token,
+    is_local_token,
+    token_cache,
+)
+from src.auth.service import refresh_session
+from src.auth.tokens import decode_access_token
+from src.config import settings
 from src.core import User
-from src.deps import get_db
+from src.deps import get_db, get_redis, get_session_maker
 
 
 async def get_current_user(
+    response: Response,
     authorization: str | None = Header(default=None, alias="Authorization"),
-    token_cookie: str | None = Cookie(default=None),
+    token_cookie: str | None = Cookie(default=None, alias="access_token"),
+    refresh_cookie: str | None = Cookie(default=None, alias="refresh_token"),
     db: AsyncSession = Depends(get_db),
+    redis: Redis = Depends(get_redis),
 ) -> Tuple[User, Optional[str]]:
     if authorization and authorization.startswith("Bearer "):
         token = authorization.split(" ")[1]
     elif token_cookie:
         token = token_cookie
+    elif refresh_cookie:
+        token = None
     else:
         raise AuthException("Токен не найден")
 
-    async with AsyncOAuth2Client(
-        token={"access_token": token, "token_type": "Bearer"}
-    ) as client:
-        try:
-            resp = await client.get("https://openidconnect.googleapis.com/v1/userinfo")
-            resp.raise_for_status()
-            user_info = resp.json()
-            email = user_info.get("email")
-        except Exception:
-            try:
-                token_info = await client.get(
-                    "https://oauth2.googleapis.com/tokeninfo",
-                    params={"access_token": token},
-                )
-                token_info.raise_for_status()
-                auth_id = token_info.json().get("sub")
-            except Exception:
-                raise AuthException("access_token и auth_id недействительны")
-
-            result = await db.execute(select(User).where(User.auth_id == auth_id))
-            user = result.scalar_one_or_none()
-            if not user or not user.refresh_token:
-                raise AuthException("Пользователь не найден или нет refresh_token")
-            try:
-                new_token = await client.refresh_token(
-                    url="https://oauth2.googleapis.com/token",
-                    refresh_token=user.refresh_token,
-                )
-                new_access_token = new_token["access_token"]
-                client.token = {
-                    "access_token": new_access_token,
-                    "token_type": "Bearer",
-                }
-
-                resp = await client.get(
-                    "https://openidconnect.googleapis.com/v1/userinfo"
-                )
-                resp.raise_for_status()
-                user_info = resp.json()
-                email = user_info.get("email")
-            except Exception:
-                raise AuthException("Не удалось обновить токен")
-
-            result = await db.execute(select(User).where(User.email == email))
-            user = result.scalar_one_or_none()
-            if not user:
-                raise AuthException("Пользователь не найден")
-
-            return user, new_access_token
-
-    if not email:
-        raise AuthException("Email не найден в профиле Google")
-
-    result = await db.execute(select(User).where(User.email == email))
+    user_id = decode_access_token(token) if token else None
+    if user_id is None and token and not is_local_token(token):
+        user_id = await token_cache.resolve(
+            token, redis, lambda: introspect_google_token(token, db)
+        )
+    if user_id is None:
+        if not refresh_cookie:
+            raise AuthException("Токен недействителен")
+
+        session_user, new_access_token, new_refresh_token = await refresh_session(
+            refresh_cookie, db, redis
+        )
+        response.set_cookie(
+            key="refresh_token",
+            value=new_refresh_token,
+            httponly=True,
+            secure=True,
+            samesite="none",
+            domain=".mushysoft.online",
+            max_age=settings.REFRESH_TOKEN_EXPIRE_SECONDS,
+        )
+        return session_user, new_access_token
+
+    result = await db.execute(select(User).where(User.id == user_id))
     user = result.scalar_one_or_none()
     if not user:
         raise AuthException("Пользователь не найден")
@@ -85,8 +68,9 @@ async def get_current_user(
 
 async def get_current_user_ws(
     websocket: WebSocket,
-    db: AsyncSession = Depends(get_db),
-    token_cookie: str | None = Cookie(default=None),
+    sessions: async_sessionmaker[AsyncSession] = Depends(get_session_maker),
+    redis: Redis = Depends(get_redis),
+    token_cookie: str | None = Cookie(default=None, alias="access_token"),
 ) -> User:
     auth_header = websocket.headers.get("authorization")
 
@@ -98,24 +82,19 @@ async def get_current_user_ws(
         await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
         raise AuthException("Токен не найден")
 
-    async with AsyncOAuth2Client(
-        token={"access_token": token, "token_type": "Bearer"}
-    ) as client:
-        try:
-            resp = await client.get("https://openidconnect.googleapis.com/v1/userinfo")
-            resp.raise_for_status()
-        except Exception:
-            await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
-            raise AuthException("Недействительный токен Google")
-
-    user_info = resp.json()
-    email = user_info.get("email")
-    if not email:
+    user_id = decode_access_token(token)
+    if user_id is None and not is_local_token(token):
+        async with sessions() as db:
+            user_id = await token_cache.resolve(
+                token, redis, lambda: introspect_google_token(token, db)
+            )
+    if user_id is None:
         await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
-        raise AuthException("Email не найден в профиле Google")
+        raise AuthException("Токен недействителен")
 
-    result = await db.execute(select(User).where(User.email == email))
-    user = result.scalar_one_or_none()
+    async with sessions() as db:
+        result = await db.execute(select(User).where(User.id == user_id))
+        user = result.scalar_one_or_none()
     if not user:
         await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
         raise AuthException("Пользователь не найден")
@@ -0,0 +1,153 @@
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable
+
+import jwt
+from redis.asyncio import Redis
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.auth.tokens import hash_token
+from src.config import settings
+from src.constants import AUTH_TOKEN_KEY
+from src.core import User
+from src.http_clients import http_client
+
+logger = logging.getLogger(__name__)
+
+GOOGLE_TOKENINFO_URL = "https://oauth2.googleapis.com/tokeninfo"
+
+# (user id, seconds the token stays valid) or None when the token is rejected.
+Introspection = tuple[int, int] | None
+
+
+def is_local_token(token: str) -> bool:
+    try:
+        jwt.get_unverified_header(token)
+    except jwt.PyJWTError:
+        return False
+    return True
+
+
+class TokenCache:
+    """Resolves bearer tokens to user ids through an LRU, then Redis, then upstream.
+
+    Entries never outlive the token they were resolved from. Concurrent misses
+    for the same token share one upstream call.
+    """
+
+    def __init__(self, maxsize: int = settings.AUTH_CACHE_SIZE) -> None:
+        self.maxsize = maxsize
+        self._local: OrderedDict[str, tuple[int, float]] = OrderedDict()
+        self._inflight: dict[str, asyncio.Future[int | None]] = {}
+
+    async def resolve(
+        self,
+        token: str,
+        redis: Redis,
+        introspect: Callable[[], Awaitable[Introspection]],
+    ) -> int | None:
+        token_hash = hash_token(token)
+
+        user_id = self._get_local(token_hash)
+        if user_id is not None:
+            return user_id
+
+        inflight = self._inflight.get(token_hash)
+        if inflight is not None:
+            return await asyncio.shield(inflight)
+
+        future: asyncio.Future[int | None] = asyncio.get_running_loop().create_future()
+        self._inflight[token_hash] = future
+        try:
+            user_id = await self._load(token_hash, redis, introspect)
+            future.set_result(user_id)
+            return user_id
+        except BaseException as e:
+            future.set_exception(e)
+            future.exception()
+            raise
+        finally:
+            self._inflight.pop(token_hash, None)
+
+    def clear(self) -> None:
+        self._local.clear()
+
+    async def _load(
+        self,
+        token_hash: str,
+        redis: Redis,
+        introspect: Callable[[], Awaitable[Introspection]],
+    ) -> int | None:
+        key = AUTH_TOKEN_KEY.format(token_hash=token_hash)
+        try:
+            async with redis.pipeline(transaction=False) as pipe:
+                pipe.get(key)
+                pipe.ttl(key)
+                cached, ttl = await pipe.execute()
+        except Exception as e:
+            logger.warning(f"Ошибка чтения кеша токенов: {e}")
+            cached, ttl = None, -1
+
+        if cached is not None and ttl > 0:
+            user_id = int(cached)
+            self._set_local(token_hash, user_id, ttl)
+            return user_id
+
+        result = await introspect()
+        if result is None:
+            return None
+
+        user_id, expires_in = result
+        ttl = min(expires_in, settings.AUTH_CACHE_TTL)
+        if ttl > 0:
+            self._set_local(token_hash, user_id, ttl)
+            try:
+                await redis.set(key, user_id, ex=ttl)
+            except Exception as e:
+                logger.warning(f"Ошибка записи кеша токенов: {e}")
+        return user_id
+
+    def _get_local(self, token_hash: str) -> int | None:
+        entry = self._local.get(token_hash)
+        if entry is None:
+            return None
+        user_id, expires_at = entry
+        if expires_at <= time.monotonic():
+            del self._local[token_hash]
+            return None
+        self._local.move_to_end(token_hash)
+        return user_id
+
+    def _set_local(self, token_hash: str, user_id: int, ttl: int) -> None:
+        self._local[token_hash] = (user_id, time.monotonic() + ttl)
+        self._local.move_to_end(token_hash)
+        while len(self._local) > self.maxsize:
+            self._local.popitem(last=False)
+
+
+async def introspect_google_token(token: str, db: AsyncSession) -> Introspection:
+    try:
+        resp = await http_client.client.get(
+            GOOGLE_TOKENINFO_URL, params={"access_token": token}
+        )
+        resp.raise_for_status()
+        token_info = resp.json()
+    except Exception:
+        return None
+
+    auth_id = token_info.get("sub")
+    if not auth_id:
+        return None
+
+    result = await db.execute(select(User.id).where(User.auth_id == auth_id))
+    user_id = result.scalar_one_or_none()
+    if user_id is None:
+        return None
+
+    return user_id, int(token_info.get("expires_in", 0))
+
+
+token_cache: TokenCache = TokenCache()
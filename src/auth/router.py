@@ -1,10 +1,11 @@
-from fastapi import APIRouter, Depends, Request
+from fastapi import APIRouter, Cookie, Depends, Request
+from redis.asyncio import Redis
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from src.auth import service
 from src.auth.deps import get_current_user
 from src.core import User
-from src.deps import get_db
+from src.deps import get_db, get_redis
 
 router = APIRouter(prefix="/auth", tags=["auth"])
 
@@ -16,15 +17,28 @@ async def login(request: Request):  # type: ignore[no-untyped-def]
 
 @router.get("/callback", summary="Redirect to Google", status_code=302)
 async def auth_callback(  # type: ignore[no-untyped-def]
-    request: Request, db: AsyncSession = Depends(get_db)
+    request: Request,
+    db: AsyncSession = Depends(get_db),
+    redis: Redis = Depends(get_redis),
+):
+    return await service.auth_callback(request=request, db=db, redis=redis)
+
+
+@router.post("/refresh", summary="Rotate session tokens", status_code=200)
+async def refresh(  # type: ignore[no-untyped-def]
+    refresh_token: str | None = Cookie(default=None),
+    db: AsyncSession = Depends(get_db),
+    redis: Redis = Depends(get_redis),
 ):
-    return await service.auth_callback(request=request, db=db)
+    return await service.refresh(refresh_token=refresh_token, db=db, redis=redis)
 
 
 @router.get("/logout", summary="Logout", status_code=204)
 async def logout(  # type: ignore[no-untyped-def]
+    refresh_token: str | None = Cookie(default=None),
     db: AsyncSession = Depends(get_db),
+    redis: Redis = Depends(get_redis),
     result: tuple[User, str | None] = Depends(get_current_user),
 ):
     user, new_token = result
-    return await service.logout(db, user)
+    return await service.logout(db, redis, user, refresh_token)
@@ -1,17 +1,36 @@
+import io
 import logging
+from typing import Any
 
-import aiohttp
+import orjson
 from authlib.integrations.starlette_client import OAuth
-from fastapi import HTTPException, Request
+from fastapi import HTTPException, Request, Response
 from fastapi.responses import JSONResponse, RedirectResponse
+from redis.asyncio import Redis
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from src import settings, upload_file_to_minio
+from src.auth.exceptions import AuthException
+from src.auth.tokens import (
+    FAILED,
+    GRACE,
+    REUSED,
+    claim_refresh_token,
+    create_access_token,
+    issue_refresh_token,
+    revoke_refresh_family,
+    revoke_refresh_token,
+    store_successor,
+    wait_for_successor,
+)
 from src.core import User, UserStatus
+from src.http_clients import http_client
 
 logger = logging.getLogger(__name__)
 
+GOOGLE_TOKEN_URL = "https://oauth2.googleapis.com/token"
+
 oauth = OAuth()
 oauth.register(
     name="google",
@@ -35,13 +54,32 @@ async def login(request: Request):  # type: ignore[no-untyped-def]
     return response
 
 
+def set_auth_cookies(response: Response, access_token: str, refresh_token: str) -> None:
+    response.set_cookie(
+        key="access_token",
+        value=access_token,
+        httponly=True,
+        secure=True,
+        samesite="none",
+        domain=".mushysoft.online",
+        max_age=settings.TOKEN_EXPIRE_SECONDS,
+    )
+    response.set_cookie(
+        key="refresh_token",
+        value=refresh_token,
+        httponly=True,
+        secure=True,
+        samesite="none",
+        domain=".mushysoft.online",
+        max_age=settings.REFRESH_TOKEN_EXPIRE_SECONDS,
+    )
+
+
 async def auth_callback(  # type: ignore[no-untyped-def]
-    request: Request, db: AsyncSession
+    request: Request, db: AsyncSession, redis: Redis
 ):
     token = await oauth.google.authorize_access_token(request)
-    logger.info(token)
 
-    access_token = token["access_token"]
     refresh_token = token.get("refresh_token")  # может быть None
 
     user_info = await oauth.google.userinfo(token=token)
@@ -54,14 +92,15 @@ async def auth_callback(  # type: ignore[no-untyped-def]
     avatar_minio_url = None
     if avatar_url:
         try:
-            async with aiohttp.ClientSession() as session:
-                async with session.get(avatar_url) as avatar_upload:
-                    if avatar_upload.status == 200:
-                        content = await avatar_upload.read()
-                        filename = f"avatars/{user_info['sub']}.jpg"
-                        avatar_minio_url = upload_file_to_minio(
-                            content, filename, "image/jpeg"
-                        )
+            avatar_upload = await http_client.client.get(avatar_url)
+            if avatar_upload.status_code == 200:
+                filename = f"avatars/{user_info['sub']}.jpg"
+                avatar_minio_url = await upload_file_to_minio(
+                    io.BytesIO(avatar_upload.content),
+                    filename,
+                    "image/jpeg",
+                    len(avatar_upload.content),
+                )
         except Exception as e:
             logger.warning(f"Ошибка при загрузке аватарки: {e}")
 
@@ -79,8 +118,9 @@ async def auth_callback(  # type: ignore[no-untyped-def]
         )
         db.add(user)
         await db.commit()
-    elif not user.avatar_url and avatar_minio_url:
-        user.avatar_url = avatar_minio_url
+    else:
+        if not user.avatar_url and avatar_minio_url:
+            user.avatar_url = avatar_minio_url
         if refresh_token:
             user.refresh_token = refresh_token
         await db.commit()
@@ -98,10 +138,14 @@ async def auth_callback(  # type: ignore[no-untyped-def]
 
     await db.commit()
 
+    access_token = create_access_token(user.id)
+    session_token = await issue_refresh_token(user.id, redis)
+
     if settings.DEBUG:
         return JSONResponse(
             {
                 "access_token": access_token,
+                "refresh_token": session_token,
                 "user": {
                     "id": user.id,
                     "username": user.username,
@@ -111,20 +155,104 @@ async def auth_callback(  # type: ignore[no-untyped-def]
         )
 
     response: RedirectResponse = RedirectResponse(settings.REDIRECT_URL)
-    response.set_cookie(
-        key="access_token",
-        value=access_token,
-        httponly=True,
-        secure=True,
-        samesite="none",
-        domain=".mushysoft.online",
-        max_age=settings.TOKEN_EXPIRE_SECONDS,
+    set_auth_cookies(response, access_token, session_token)
+
+    return response
+
+
+async def refresh_google_token(refresh_token: str) -> dict[str, Any]:
+    resp = await http_client.client.post(
+        GOOGLE_TOKEN_URL,
+        data={
+            "grant_type": "refresh_token",
+            "refresh_token": refresh_token,
+            "client_id": settings.GOOGLE_CLIENT_ID,
+            "client_secret": settings.GOOGLE_CLIENT_SECRET,
+        },
     )
+    resp.raise_for_status()
+    token: dict[str, Any] = resp.json()
+    return token
+
+
+async def refresh_session(
+    refresh_token: str | None, db: AsyncSession, redis: Redis
+) -> tuple[User, str, str]:
+    if not refresh_token:
+        raise AuthException("Refresh-токен не найден")
+
+    claim = await claim_refresh_token(refresh_token, redis)
+    if claim is None:
+        raise AuthException("Refresh-токен недействителен")
+    state, value = claim
+
+    if state == REUSED:
+        # The token was spent and its grace window is over: whoever presents it
+        # now is replaying a copy, so end every session of the user.
+        logger.warning(f"Повторное использование refresh-токена пользователя {value}")
+        await revoke_refresh_family(int(value), redis)
+        raise AuthException("Refresh-токен недействителен")
+
+    if state == GRACE:
+        successor = await wait_for_successor(refresh_token, value, redis)
+        if successor is None:
+            raise AuthException("Не удалось обновить токен")
+        pair = orjson.loads(successor)
+        result = await db.execute(select(User).where(User.id == pair["user_id"]))
+        user = result.scalar_one_or_none()
+        if not user:
+            raise AuthException("Пользователь не найден или нет refresh_token")
+        return user, pair["access_token"], pair["refresh_token"]
 
+    result = await db.execute(select(User).where(User.id == int(value)))
+    user = result.scalar_one_or_none()
+    if not user or not user.refresh_token:
+        await store_successor(refresh_token, FAILED, redis)
+        raise AuthException("Пользователь не найден или нет refresh_token")
+
+    try:
+        await refresh_google_token(user.refresh_token)
+    except Exception as e:
+        logger.warning(f"Google отклонил refresh_token пользователя {user.id}: {e}")
+        await store_successor(refresh_token, FAILED, redis)
+        raise AuthException("Не удалось обновить токен")
+
+    access_token = create_access_token(user.id)
+    session_token = await issue_refresh_token(user.id, redis)
+    await store_successor(
+        refresh_token,
+        orjson.dumps(
+            {
+                "user_id": user.id,
+                "access_token": access_token,
+                "refresh_token": session_token,
+            }
+        ).decode(),
+        redis,
+    )
+    return user, access_token, session_token
+
+
+async def refresh(  # type: ignore[no-untyped-def]
+    refresh_token: str | None, db: AsyncSession, redis: Redis
+):
+    user, access_token, session_token = await refresh_session(refresh_token, db, redis)
+
+    response: JSONResponse = JSONResponse(
+        {"access_token": access_token, "refresh_token": session_token}
+        if settings.DEBUG
+        else {"user_id": user.id}
+    )
+    set_auth_cookies(response, access_token, session_token)
     return response
 
 
-async def logout(db: AsyncSession, current_user: User) -> None:
+async def logout(
+    db: AsyncSession, redis: Redis, current_user: User, refresh_token: str | None
+) -> None:
+    if refresh_token:
+        await revoke_refresh_token(refresh_token, redis)
+
     user_status = (
         await db.execute(
             select(UserStatus).where(UserStatus.user_id == current_user.id)
@@ -0,0 +1,150 @@
+import asyncio
+import hashlib
+import secrets
+import time
+
+import jwt
+from redis.asyncio import Redis
+
+from src.config import settings
+from src.constants import (
+    REFRESH_FAMILY_KEY,
+    REFRESH_SUCCESSOR_KEY,
+    REFRESH_TOKEN_KEY,
+    REFRESH_USED_KEY,
+)
+
+ALGORITHM = "HS256"
+
+# Rotation: a refresh token is single-use. The first refresh claims it and
+# leaves a "pending" successor slot for REFRESH_TOKEN_GRACE_SECONDS; once the
+# new pair is minted it is stored there, so parallel requests carrying the same
+# cookie get that same pair rather than new sessions. A used marker outlives
+# the window, and presenting the token after it is treated as theft.
+# KEYS: token, used marker, successor slot. ARGV: grace, used marker TTL.
+CLAIM_REFRESH_SCRIPT = """
+local user_id = redis.call('GET', KEYS[1])
+if user_id then
+    redis.call('DEL', KEYS[1])
+    redis.call('SET', KEYS[2], user_id, 'EX', ARGV[2])
+    redis.call('SET', KEYS[3], 'pending', 'EX', ARGV[1])
+    return {'fresh', user_id}
+end
+local successor = redis.call('GET', KEYS[3])
+if successor then
+    return {'grace', successor}
+end
+local used = redis.call('GET', KEYS[2])
+if used then
+    return {'reused', used}
+end
+return false
+"""
+
+# KEYS: the user's family set. ARGV: refresh token key prefix.
+REVOKE_FAMILY_SCRIPT = """
+for _, token_hash in ipairs(redis.call('SMEMBERS', KEYS[1])) do
+    redis.call('DEL', ARGV[1] .. token_hash)
+end
+redis.call('DEL', KEYS[1])
+"""
+
+FRESH = "fresh"
+GRACE = "grace"
+REUSED = "reused"
+PENDING = "pending"
+FAILED = "failed"
+
+
+def hash_token(token: str) -> str:
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+def create_access_token(user_id: int) -> str:
+    now = int(time.time())
+    payload = {
+        "sub": str(user_id),
+        "type": "access",
+        "iat": now,
+        "exp": now + settings.ACCESS_TOKEN_EXPIRE_SECONDS,
+    }
+    return jwt.encode(payload, settings.SECRET_KEY, algorithm=ALGORITHM)
+
+
+def decode_access_token(token: str) -> int | None:
+    try:
+        payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[ALGORITHM])
+    except jwt.PyJWTError:
+        return None
+    if payload.get("type") != "access":
+        return None
+    try:
+        return int(payload["sub"])
+    except (KeyError, ValueError):
+        return None
+
+
+async def issue_refresh_token(user_id: int, redis: Redis) -> str:
+    token = secrets.token_urlsafe(32)
+    token_hash = hash_token(token)
+    family = REFRESH_FAMILY_KEY.format(user_id=user_id)
+    async with redis.pipeline(transaction=True) as pipe:
+        pipe.set(
+            REFRESH_TOKEN_KEY.format(token_hash=token_hash),
+            user_id,
+            ex=settings.REFRESH_TOKEN_EXPIRE_SECONDS,
+        )
+        pipe.sadd(family, token_hash)
+        pipe.expire(family, settings.REFRESH_TOKEN_EXPIRE_SECONDS)
+        await pipe.execute()
+    return token
+
+
+async def claim_refresh_token(token: str, redis: Redis) -> tuple[str, str] | None:
+    token_hash = hash_token(token)
+    claim = await redis.eval(  # type: ignore[misc]
+        CLAIM_REFRESH_SCRIPT,
+        3,
+        REFRESH_TOKEN_KEY.format(token_hash=token_hash),
+        REFRESH_USED_KEY.format(token_hash=token_hash),
+        REFRESH_SUCCESSOR_KEY.format(token_hash=token_hash),
+        str(settings.REFRESH_TOKEN_GRACE_SECONDS),
+        str(settings.REFRESH_TOKEN_EXPIRE_SECONDS),
+    )
+    if not claim:
+        return None
+    state, value = claim
+    return state, value
+
+
+async def store_successor(token: str, value: str, redis: Redis) -> None:
+    await redis.set(
+        REFRESH_SUCCESSOR_KEY.format(token_hash=hash_token(token)),
+        value,
+        ex=settings.REFRESH_TOKEN_GRACE_SECONDS,
+    )
+
+
+async def wait_for_successor(token: str, value: str, redis: Redis) -> str | None:
+    # The first refresh may still be minting the pair; poll its slot briefly.
+    key = REFRESH_SUCCESSOR_KEY.format(token_hash=hash_token(token))
+    deadline = time.monotonic() + settings.REFRESH_SUCCESSOR_WAIT
+    while value == PENDING and time.monotonic() < deadline:
+        await asyncio.sleep(0.05)
+        value = await redis.get(key) or FAILED
+    if value in (PENDING, FAILED):
+        return None
+    return value
+
+
+async def revoke_refresh_family(user_id: int, redis: Redis) -> None:
+    await redis.eval(  # type: ignore[misc]
+        REVOKE_FAMILY_SCRIPT,
+        1,
+        REFRESH_FAMILY_KEY.format(user_id=user_id),
+        REFRESH_TOKEN_KEY.format(token_hash=""),
+    )
+
+
+async def revoke_refresh_token(token: str, redis: Redis) -> None:
+    await redis.delete(REFRESH_TOKEN_KEY.format(token_hash=hash_token(token)))
@@ -0,0 +1,140 @@
+import asyncio
+import logging
+from typing import Awaitable, Callable
+
+from redis.asyncio import Redis
+from redis.asyncio.client import PubSub
+
+from src.cache import redis_client
+from src.config import settings
+from src.constants import CHAT_ROOM_CHANNEL, USER_PUSH_CHANNEL
+from src.frames import Frame
+
+logger = logging.getLogger(__name__)
+
+Handler = Callable[[int, Frame], Awaitable[None]]
+
+
+class LocalBroker:
+    """Delivers events keyed by room or user to sockets of this process only."""
+
+    def __init__(self) -> None:
+        self._handler: Handler | None = None
+
+    def set_handler(self, handler: Handler) -> None:
+        self._handler = handler
+
+    async def subscribe(self, key: int) -> None:
+        return None
+
+    async def unsubscribe(self, key: int) -> None:
+        return None
+
+    async def publish(self, key: int, frame: Frame) -> None:
+        await self._deliver(key, frame)
+
+    async def publish_many(self, keys: list[int], frame: Frame) -> None:
+        for key in keys:
+            await self._deliver(key, frame)
+
+    async def close(self) -> None:
+        return None
+
+    async def _deliver(self, key: int, frame: Frame) -> None:
+        if self._handler is not None:
+            await self._handler(key, frame)
+
+
+class RedisBroker(LocalBroker):
+    """Fans events out to every worker through one Redis channel per key.
+
+    A worker is subscribed only to the keys (rooms, users) it holds local
+    sockets for, and events published by any worker are delivered through the
+    subscription, including the publisher's own.
+    """
+
+    def __init__(self, redis: Redis, channel: Callable[[int], str]) -> None:
+        super().__init__()
+        self._redis = redis
+        self._channel = channel
+        self._pubsub: PubSub | None = None
+        self._listener: asyncio.Task[None] | None = None
+        self._channels: dict[str, int] = {}
+
+    async def subscribe(self, key: int) -> None:
+        channel = self._channel(key)
+        if self._pubsub is None:
+            self._pubsub = self._redis.pubsub(ignore_subscribe_messages=True)
+        self._channels[channel] = key
+        await self._pubsub.subscribe(channel)
+        if self._listener is None or self._listener.done():
+            self._listener = asyncio.create_task(self._listen(self._pubsub))
+
+    async def unsubscribe(self, key: int) -> None:
+        channel = self._channel(key)
+        self._channels.pop(channel, None)
+        if self._pubsub is not None:
+            await self._pubsub.unsubscribe(channel)
+
+    async def publish(self, key: int, frame: Frame) -> None:
+        await self._redis.publish(self._channel(key), frame.text)
+
+    async def publish_many(self, keys: list[int], frame: Frame) -> None:
+        if not keys:
+            return
+        async with self._redis.pipeline(transaction=False) as pipe:
+            for key in keys:
+                pipe.publish(self._channel(key), frame.text)
+            await pipe.execute()
+
+    async def close(self) -> None:
+        if self._listener is not None:
+            self._listener.cancel()
+            try:
+                await self._listener
+            except asyncio.CancelledError:
+                pass
+            self._listener = None
+        if self._pubsub is not None:
+            await self._pubsub.aclose()  # type: ignore[no-untyped-call]
+            self._pubsub = None
+        self._channels.clear()
+
+    async def _listen(self, pubsub: PubSub) -> None:
+        while True:
+            try:
+                event = await pubsub.get_message(
+                    ignore_subscribe_messages=True, timeout=1.0
+                )
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Ошибка чтения каналов событий: {e}")
+                await asyncio.sleep(1.0)
+                continue
+
+            if not event or event.get("type") != "message":
+                continue
+
+            key = self._channels.get(event["channel"])
+            if key is None:
+                continue
+
+            try:
+                await self._deliver(key, Frame.loads(event["data"]))
+            except Exception as e:
+                logger.warning(f"Ошибка доставки события {event['channel']}: {e}")
+
+
+def room_channel(room_id: int) -> str:
+    return CHAT_ROOM_CHANNEL.format(room_id=room_id)
+
+
+def user_channel(user_id: int) -> str:
+    return USER_PUSH_CHANNEL.format(user_id=user_id)
+
+
+def create_broker(channel: Callable[[int], str]) -> LocalBroker:
+    if settings.WS_BROKER == "redis":
+        return RedisBroker(redis_client, channel)
+    return LocalBroker()
@@ -1,114 +1,271 @@
+import asyncio
 import datetime
 import json
-from typing import Any
+import logging
+import math
+import random
+import struct
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Iterable, Sequence
 
+import orjson
 from redis.asyncio import Redis
+from redis.client import NEVER_DECODE
 
 from src.config import settings
 from src.constants import (
+    INVITES_VERSION_KEY,
+    ROOMS_VERSION_KEY,
     TEMP_FILE_KEY,
-    TEMP_INVITES_KEY,
-    TEMP_PARTICIPANTS_KEY,
-    TEMP_ROOMS_KEY,
 )
 
+logger = logging.getLogger(__name__)
+
 redis_client: Redis = Redis.from_url(settings.REDIS_URL, decode_responses=True)
 
 
-async def add_file_to_temp_redis(
-    redis: Redis, user_id: int, file_url: str, room_id: int
+# Attachments are staged as a Redis list of JSON entries. Pushes are atomic
+# RPUSH + EXPIRE transactions, so concurrent uploads never overwrite each
+# other, and the message that claims them reads and deletes the list in one
+# script, so an upload can't slip in between the read and the delete.
+
+TAKE_TEMP_FILES_SCRIPT = """
+local entries = redis.call('LRANGE', KEYS[1], 0, -1)
+redis.call('DEL', KEYS[1])
+return entries
+"""
+
+
+async def add_files_to_temp_redis(
+    redis: Redis, user_id: int, room_id: int, file_urls: Sequence[str]
 ) -> None:
+    if not file_urls:
+        return
     key = TEMP_FILE_KEY.format(user_id=user_id, room_id=room_id)
-    current_data = await redis.get(key)
-    files = json.loads(current_data) if current_data else []
+    uploaded_at = datetime.datetime.now().isoformat()
+    async with redis.pipeline(transaction=True) as pipe:
+        pipe.rpush(
+            key,
+            *(
+                json.dumps({"url": url, "uploaded_at": uploaded_at})
+                for url in file_urls
+            ),
+        )
+        pipe.expire(key, settings.TEMP_FILES_TTL)
+        await pipe.execute()
 
-    files.append({"url": file_url, "uploaded_at": datetime.datetime.now().isoformat()})
 
-    await redis.set(key, json.dumps(files), ex=3600)
+async def add_file_to_temp_redis(
+    redis: Redis, user_id: int, file_url: str, room_id: int
+) -> None:
+    await add_files_to_temp_redis(redis, user_id, room_id, [file_url])
 
 
-async def get_temp_files(
+async def take_temp_files(
     redis: Redis, user_id: int, room_id: int
 ) -> list[dict[str, Any]]:
     key = TEMP_FILE_KEY.format(user_id=user_id, room_id=room_id)
-    data = await redis.get(key)
-    return json.loads(data) if data else []
+    entries = await redis.eval(TAKE_TEMP_FILES_SCRIPT, 1, key)  # type: ignore[misc]
+    return [json.loads(entry) for entry in entries]
 
 
-async def clear_temp_files(redis: Redis, user_id: int, room_id: int) -> None:
-    key = TEMP_FILE_KEY.format(user_id=user_id, room_id=room_id)
-    await redis.delete(key)
+# List caches are keyed by a per-entity version counter. Writers bump the
+# counter after committing, which orphans every cached page at once; orphaned
+# pages simply age out, so the TTL only bounds memory, not staleness. Callers
+# read the version before querying the database and build the page key from
+# it, so a page built from pre-bump data is never stored under the post-bump
+# key.
 
 
-def serialize_datetime(obj: Any) -> str:
-    if hasattr(obj, "isoformat"):
-        return str(obj.isoformat())
-    return str(obj)
+async def get_cache_version(redis: Redis, key: str) -> int:
+    version = await redis.get(key)
+    return int(version) if version else 0
 
 
-async def get_cached_rooms(
-    redis: Redis, user_id: int, limit: int, offset: int
-) -> str | None:
-    key = TEMP_ROOMS_KEY.format(user_id=user_id, limit=limit, offset=offset)
-    data = await redis.get(key)
-    return json.loads(data) if data else None
+async def versioned_key(
+    redis: Redis, version_key: str, template: str, **params: Any
+) -> str:
+    version = await get_cache_version(redis, version_key)
+    return template.format(version=version, **params)
 
 
-async def set_cached_rooms(
-    redis: Redis, user_id: int, limit: int, offset: int, data: list[str]
+async def bump_cache_versions(
+    redis: Redis,
+    rooms: Iterable[int] = (),
+    invites: Iterable[int] = (),
 ) -> None:
-    key = TEMP_ROOMS_KEY.format(user_id=user_id, limit=limit, offset=offset)
-    await redis.setex(
-        key,
-        datetime.timedelta(seconds=15),
-        json.dumps(data, default=serialize_datetime),
-    )
+    keys = [
+        *(ROOMS_VERSION_KEY.format(user_id=user_id) for user_id in rooms),
+        *(INVITES_VERSION_KEY.format(user_id=user_id) for user_id in invites),
+    ]
+    if not keys:
+        return
+    async with redis.pipeline(transaction=False) as pipe:
+        for key in keys:
+            pipe.incr(key)
+        await pipe.execute()
 
 
-async def get_cached_participants(redis: Redis, room_id: int) -> str | None:
-    key = TEMP_PARTICIPANTS_KEY.format(room_id=room_id)
-    data = await redis.get(key)
-    return json.loads(data) if data else None
+class CacheMetrics:
+    def __init__(self) -> None:
+        self.local_hits = 0
+        self.redis_hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.early_refreshes = 0
+        self.errors = 0
+        self.loads = 0
+        self.load_seconds = 0.0
+        self.lookup_seconds = 0.0
 
+    def snapshot(self) -> dict[str, int]:
+        lookups = self.redis_hits + self.misses
+        return {
+            "local_hits": self.local_hits,
+            "redis_hits": self.redis_hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "early_refreshes": self.early_refreshes,
+            "errors": self.errors,
+            "avg_load_us": (
+                int(self.load_seconds / self.loads * 1e6) if self.loads else 0
+            ),
+            "avg_lookup_us": int(self.lookup_seconds / lookups * 1e6) if lookups else 0,
+        }
 
-async def set_cached_participants(redis: Redis, room_id: int, data: list[str]) -> None:
-    key = TEMP_PARTICIPANTS_KEY.format(room_id=room_id)
-    await redis.setex(
-        key,
-        datetime.timedelta(seconds=30),
-        json.dumps(data, default=serialize_datetime),
-    )
 
+# Little-endian (load seconds, expires at) in front of every cached document.
+ENTRY_HEADER = struct.Struct("<dd")
 
-async def delete_cached_participants(redis: Redis, room_id: int) -> None:
-    await redis.delete(TEMP_PARTICIPANTS_KEY.format(room_id=room_id))
 
+class ReadThroughCache:
+    """Process-local LRU in front of Redis in front of a loader.
 
-async def get_cached_invites(
-    redis: Redis, user_id: int, sent: bool, limit: int, offset: int
-) -> str | None:
-    prefix = "sent" if sent else "received"
-    key = TEMP_INVITES_KEY.format(
-        user_id=user_id, prefix=prefix, limit=limit, offset=offset
-    )
-    data = await redis.get(key)
-    return json.loads(data) if data else None
+    The loader's value is encoded once with orjson and the cache hands out
+    those bytes, so a hit never decodes or re-validates anything. In Redis the
+    document is prefixed with a fixed header (load seconds, expires at) and
+    stored with a jittered TTL, so pages written together do not expire
+    together. Near expiry a reader may refresh early, with a probability that
+    grows with the load cost (XFetch), so one worker rebuilds the entry while
+    the rest keep serving it. Concurrent misses in one process share a single
+    load.
+    """
 
+    def __init__(
+        self,
+        name: str,
+        ttl: int,
+        maxsize: int = settings.CACHE_LOCAL_SIZE,
+        local_ttl: float = settings.CACHE_LOCAL_TTL,
+        jitter: float = settings.CACHE_TTL_JITTER,
+        beta: float = 1.0,
+    ) -> None:
+        self.name = name
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.local_ttl = local_ttl
+        self.jitter = jitter
+        self.beta = beta
+        self.metrics = CacheMetrics()
+        self._local: OrderedDict[str, tuple[bytes, float]] = OrderedDict()
+        self._inflight: dict[str, asyncio.Future[bytes]] = {}
 
-async def set_cached_invites(
-    redis: Redis,
-    user_id: int,
-    sent: bool,
-    limit: int,
-    offset: int,
-    data: list[str],
-) -> None:
-    prefix = "sent" if sent else "received"
-    key = TEMP_INVITES_KEY.format(
-        user_id=user_id, prefix=prefix, limit=limit, offset=offset
-    )
-    await redis.setex(
-        key,
-        datetime.timedelta(seconds=30),
-        json.dumps(data, default=serialize_datetime),
-    )
+    async def get_or_load(
+        self, redis: Redis, key: str, load: Callable[[], Awaitable[Any]]
+    ) -> bytes:
+        entry = self._local.get(key)
+        if entry is not None:
+            if entry[1] > time.monotonic():
+                self._local.move_to_end(key)
+                self.metrics.local_hits += 1
+                return entry[0]
+            del self._local[key]
+
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            self.metrics.coalesced += 1
+            return await asyncio.shield(inflight)
+
+        future: asyncio.Future[bytes] = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            value = await self._fetch(redis, key, load)
+            future.set_result(value)
+            return value
+        except BaseException as e:
+            future.set_exception(e)
+            future.exception()
+            raise
+        finally:
+            self._inflight.pop(key, None)
+
+    def clear(self) -> None:
+        self._local.clear()
+
+    def stats(self) -> dict[str, int]:
+        return {**self.metrics.snapshot(), "local_size": len(self._local)}
+
+    async def _fetch(
+        self, redis: Redis, key: str, load: Callable[[], Awaitable[Any]]
+    ) -> bytes:
+        start = time.perf_counter()
+        cached: bytes | None
+        try:
+            # The shared client decodes replies to str; cached documents are
+            # read back as the exact bytes that were stored.
+            cached = await redis.execute_command(  # type: ignore[no-untyped-call]
+                "GET", key, **{NEVER_DECODE: True}
+            )
+        except Exception as e:
+            logger.warning(f"Ошибка чтения кеша {self.name}: {e}")
+            self.metrics.errors += 1
+            cached = None
+        self.metrics.lookup_seconds += time.perf_counter() - start
+
+        if cached is not None:
+            delta, expires_at = ENTRY_HEADER.unpack_from(cached)
+            content = cached[ENTRY_HEADER.size :]
+            remaining = expires_at - time.time()
+            if delta * self.beta * -math.log(1.0 - random.random()) < remaining:
+                self.metrics.redis_hits += 1
+                self._set_local(key, content, remaining)
+                return content
+            self.metrics.early_refreshes += 1
+        else:
+            self.metrics.misses += 1
+
+        start = time.perf_counter()
+        content = orjson.dumps(await load())
+        delta = time.perf_counter() - start
+        self.metrics.loads += 1
+        self.metrics.load_seconds += delta
+
+        ttl = self.ttl * (1.0 - self.jitter * random.random())
+        self._set_local(key, content, ttl)
+        try:
+            await redis.set(
+                key,
+                ENTRY_HEADER.pack(delta, time.time() + ttl) + content,
+                ex=max(int(ttl), 1),
+            )
+        except Exception as e:
+            logger.warning(f"Ошибка записи кеша {self.name}: {e}")
+            self.metrics.errors += 1
+        return content
+
+    def _set_local(self, key: str, content: bytes, ttl: float) -> None:
+        self._local[key] = (content, time.monotonic() + min(ttl, self.local_ttl))
+        self._local.move_to_end(key)
+        while len(self._local) > self.maxsize:
+            self._local.popitem(last=False)
+
+
+rooms_cache = ReadThroughCache("rooms", ttl=settings.LIST_CACHE_TTL)
+invites_cache = ReadThroughCache("invites", ttl=settings.LIST_CACHE_TTL)
+
+
+def cache_stats() -> dict[str, dict[str, int]]:
+    return {
+        f"cache_{cache.name}": cache.stats() for cache in (rooms_cache, invites_cache)
+    }
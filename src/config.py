@@ -15,6 +15,12 @@ class Settings(BaseSettings):
     DEBUG: bool
     REDIRECT_URL: str
     TOKEN_EXPIRE_SECONDS: int
+    ACCESS_TOKEN_EXPIRE_SECONDS: int = 900
+    REFRESH_TOKEN_EXPIRE_SECONDS: int = 30 * 24 * 3600
+    REFRESH_TOKEN_GRACE_SECONDS: int = 30
+    REFRESH_SUCCESSOR_WAIT: float = 2.0
+    AUTH_CACHE_SIZE: int = 10_000
+    AUTH_CACHE_TTL: int = 300
 
     GOOGLE_CLIENT_ID: str
     GOOGLE_CLIENT_SECRET: str
@@ -29,6 +35,32 @@ class Settings(BaseSettings):
     MINIO_ACCESS_KEY: str
     MINIO_SECRET_KEY: str
     MINIO_BUCKET_NAME: str
+    MINIO_UPLOAD_CONCURRENCY: int = 8
+    MINIO_PART_SIZE: int = 16 * 1024 * 1024
+    MINIO_READ_TIMEOUT: float = 60.0
+
+    WS_BROKER: str = "redis"
+    WS_SEND_QUEUE_SIZE: int = 256
+    WS_OVERFLOW_POLICY: str = "drop_oldest"
+    WS_PING_INTERVAL: int = 20
+    WS_IDLE_TIMEOUT: int = 60
+    WS_SILENT_TIMEOUT: int = 600
+    WS_SEND_TIMEOUT: float = 10.0
+
+    HTTP_TIMEOUT: float = 10.0
+    HTTP_CONNECT_TIMEOUT: float = 5.0
+    HTTP_MAX_CONNECTIONS: int = 100
+    HTTP_MAX_KEEPALIVE: int = 20
+    HTTP_KEEPALIVE_EXPIRY: float = 60.0
+
+    PRESENCE_TTL: int = 60
+    PRESENCE_FLUSH_INTERVAL: int = 30
+    UNREAD_RECONCILE_INTERVAL: int = 300
+    LIST_CACHE_TTL: int = 6 * 3600
+    TEMP_FILES_TTL: int = 3600
+    CACHE_LOCAL_SIZE: int = 10_000
+    CACHE_LOCAL_TTL: float = 30.0
+    CACHE_TTL_JITTER: float = 0.1
 
     model_config = SettingsConfigDict(env_file=env_file_path, env_file_encoding="utf-8")
 
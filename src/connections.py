@@ -0,0 +1,319 @@
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable
+
+from fastapi import WebSocket, status
+
+from src.config import settings
+from src.constants import MSGPACK_SUBPROTOCOL
+from src.frames import Frame, negotiate_subprotocol, unpack
+
+logger = logging.getLogger(__name__)
+
+DROP_OLDEST = "drop_oldest"
+COALESCE = "coalesce"
+DISCONNECT = "disconnect"
+
+# Events that only carry the latest state of an entity: under pressure a newer
+# event replaces a queued one with the same key instead of evicting history.
+COALESCE_KEYS = {
+    "message_edited": "message_id",
+    "message_deleted": "message_id",
+    "last_message_update": "room_id",
+}
+
+
+PING = Frame("ping", {})
+
+
+def coalesce_key(frame: Frame) -> tuple[str, Any] | None:
+    field = COALESCE_KEYS.get(frame.type)
+    if field is None:
+        return None
+    value = frame.get(field)
+    if value is None:
+        return None
+    return frame.type, value
+
+
+class Connection:
+    """A socket with a bounded outbound queue drained by its own writer task."""
+
+    __slots__ = (
+        "websocket",
+        "user_id",
+        "binary",
+        "rooms",
+        "max_queue",
+        "policy",
+        "sent",
+        "dropped",
+        "evicted",
+        "closed",
+        "last_seen",
+        "answers_pings",
+        "_queue",
+        "_ready",
+        "_writer",
+    )
+
+    def __init__(
+        self,
+        websocket: WebSocket,
+        user_id: int,
+        max_queue: int = settings.WS_SEND_QUEUE_SIZE,
+        policy: str = settings.WS_OVERFLOW_POLICY,
+        binary: bool = False,
+    ) -> None:
+        self.websocket = websocket
+        self.user_id = user_id
+        self.binary = binary
+        self.rooms: set[int] = set()
+        self.max_queue = max_queue
+        self.policy = policy
+        self.sent = 0
+        self.dropped = 0
+        self.evicted = False
+        self.closed = False
+        self.last_seen = time.monotonic()
+        self.answers_pings = False
+        self._queue: deque[Frame] = deque()
+        self._ready = asyncio.Event()
+        self._writer: asyncio.Task[None] | None = None
+
+    @property
+    def depth(self) -> int:
+        return len(self._queue)
+
+    @classmethod
+    async def accept(cls, websocket: WebSocket, user_id: int) -> "Connection":
+        subprotocol = negotiate_subprotocol(websocket)
+        await websocket.accept(subprotocol=subprotocol)
+        connection = cls(websocket, user_id, binary=subprotocol == MSGPACK_SUBPROTOCOL)
+        connection.start()
+        return connection
+
+    def start(self) -> None:
+        self._writer = asyncio.create_task(self._drain())
+
+    async def receive(self) -> Any:
+        if self.binary:
+            data = unpack(await self.websocket.receive_bytes())
+        else:
+            data = await self.websocket.receive_json()
+        self.last_seen = time.monotonic()
+        if isinstance(data, dict) and data.get("action") == "pong":
+            self.answers_pings = True
+        return data
+
+    def send(self, frame: Frame) -> bool:
+        if self.closed:
+            return False
+
+        if len(self._queue) >= self.max_queue:
+            self.dropped += 1
+            if self.policy == DISCONNECT:
+                self._evict()
+                return False
+            if self.policy == COALESCE and self._coalesce(frame):
+                return True
+            self._queue.popleft()
+
+        self._queue.append(frame)
+        self._ready.set()
+        return True
+
+    async def close(self, code: int | None = None) -> None:
+        self.closed = True
+        self._queue.clear()
+        if self._writer is not None and not self._writer.done():
+            self._writer.cancel()
+            try:
+                await self._writer
+            except asyncio.CancelledError:
+                pass
+        self._writer = None
+
+        if code is not None:
+            try:
+                await asyncio.wait_for(self.websocket.close(code=code), timeout=1.0)
+            except Exception:
+                pass
+
+    def _coalesce(self, frame: Frame) -> bool:
+        key = coalesce_key(frame)
+        if key is None:
+            return False
+        for index, queued in enumerate(self._queue):
+            if coalesce_key(queued) == key:
+                self._queue[index] = frame
+                return True
+        return False
+
+    def _evict(self) -> None:
+        self.evicted = True
+        self.closed = True
+        self._queue.clear()
+        self._ready.set()
+
+    async def _drain(self) -> None:
+        try:
+            while not self.closed:
+                await self._ready.wait()
+                while self._queue:
+                    frame = self._queue.popleft()
+                    # A write to a dead peer can sit in the kernel buffer for
+                    # minutes; give up on it and mark the connection closed.
+                    if self.binary:
+                        send = self.websocket.send_bytes(frame.packed)
+                    else:
+                        send = self.websocket.send_text(frame.text)
+                    await asyncio.wait_for(send, settings.WS_SEND_TIMEOUT)
+                    self.sent += 1
+                self._ready.clear()
+
+            if self.evicted:
+                logger.info(f"Медленный клиент {self.user_id} отключён")
+                await self.websocket.close(code=status.WS_1013_TRY_AGAIN_LATER)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.info(f"Соединение пользователя {self.user_id} закрыто: {e}")
+            self.closed = True
+            self._queue.clear()
+
+
+class ConnectionRegistry:
+    """Connections indexed by user and by room.
+
+    A user may hold any number of sockets (devices, tabs), each with its own
+    rooms. Room membership is kept as a room -> user -> connections index that
+    is updated on join and leave, so finding the online members of a room costs
+    O(room members) and counting them O(1), whatever the total connected.
+    """
+
+    def __init__(self) -> None:
+        self.users: dict[int, set[Connection]] = {}
+        self.rooms: dict[int, dict[int, set[Connection]]] = {}
+
+    def get(self, user_id: int) -> set[Connection]:
+        return self.users.get(user_id, set())
+
+    def is_online(self, user_id: int) -> bool:
+        return user_id in self.users
+
+    def contains(self, connection: Connection) -> bool:
+        return connection in self.users.get(connection.user_id, ())
+
+    def add(self, connection: Connection) -> bool:
+        connections = self.users.setdefault(connection.user_id, set())
+        connections.add(connection)
+        return len(connections) == 1
+
+    def remove(self, connection: Connection) -> list[int]:
+        emptied_rooms = [
+            room_id
+            for room_id in list(connection.rooms)
+            if self.leave(connection, room_id)
+        ]
+        connections = self.users.get(connection.user_id)
+        if connections is not None:
+            connections.discard(connection)
+            if not connections:
+                del self.users[connection.user_id]
+        return emptied_rooms
+
+    def join(self, connection: Connection, room_id: int) -> bool:
+        members = self.rooms.get(room_id)
+        is_new_room = members is None
+        if members is None:
+            members = self.rooms[room_id] = {}
+        members.setdefault(connection.user_id, set()).add(connection)
+        connection.rooms.add(room_id)
+        return is_new_room
+
+    def leave(self, connection: Connection, room_id: int) -> bool:
+        connection.rooms.discard(room_id)
+        members = self.rooms.get(room_id)
+        if members is None:
+            return False
+        devices = members.get(connection.user_id)
+        if devices is not None:
+            devices.discard(connection)
+            if not devices:
+                del members[connection.user_id]
+        if members:
+            return False
+        del self.rooms[room_id]
+        return True
+
+    def in_room(self, room_id: int) -> list[Connection]:
+        members = self.rooms.get(room_id)
+        if not members:
+            return []
+        return [c for devices in members.values() for c in devices]
+
+    def users_in_room(self, room_id: int) -> list[int]:
+        return list(self.rooms.get(room_id, ()))
+
+    def room_count(self, room_id: int) -> int:
+        return len(self.rooms.get(room_id, ()))
+
+    def connections(self) -> list[Connection]:
+        return [c for devices in self.users.values() for c in devices]
+
+
+class ConnectionMetrics:
+    """Outbound queue counters, kept across connections that already closed."""
+
+    def __init__(self) -> None:
+        self.sent = 0
+        self.dropped = 0
+        self.evicted = 0
+        self.reaped = 0
+
+    def retire(self, connection: Connection) -> None:
+        self.sent += connection.sent
+        self.dropped += connection.dropped
+        self.evicted += int(connection.evicted)
+
+    def snapshot(self, connections: list[Connection]) -> dict[str, int]:
+        return {
+            "connections": len(connections),
+            "queued": sum(c.depth for c in connections),
+            "max_queue_depth": max((c.depth for c in connections), default=0),
+            "sent": self.sent + sum(c.sent for c in connections),
+            "dropped": self.dropped + sum(c.dropped for c in connections),
+            "evicted": self.evicted + sum(int(c.evicted) for c in connections),
+            "reaped": self.reaped,
+        }
+
+
+async def heartbeat(
+    connections: list[Connection],
+    disconnect: Callable[[Connection, int | None], Awaitable[None]],
+) -> int:
+    # Any inbound frame counts as liveness. Clients that answer pings are held
+    # to the short idle timeout; older ones never send pong, so they get the
+    # longer WS_SILENT_TIMEOUT rather than none. Half-open sockets are caught
+    # sooner by the server's protocol-level pings (uvicorn --ws-ping-*) and by
+    # the writer's send timeout, which both leave the connection closed.
+    now = time.monotonic()
+    reaped = 0
+    for connection in connections:
+        idle = now - connection.last_seen
+        timeout = (
+            settings.WS_IDLE_TIMEOUT
+            if connection.answers_pings
+            else settings.WS_SILENT_TIMEOUT
+        )
+        if connection.closed or idle >= timeout:
+            await disconnect(connection, status.WS_1001_GOING_AWAY)
+            reaped += 1
+        elif idle >= settings.WS_PING_INTERVAL:
+            connection.send(PING)
+    if reaped:
+        logger.info(f"Закрыто неактивных соединений: {reaped}")
+    return reaped
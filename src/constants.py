@@ -1,4 +1,20 @@
-TEMP_FILE_KEY = "user:{user_id}:{room_id}:temp_files"
-TEMP_ROOMS_KEY = "user:{user_id}:rooms:{limit}:{offset}"
-TEMP_PARTICIPANTS_KEY = "room:{room_id}:participants"
-TEMP_INVITES_KEY = "user:{user_id}:{prefix}_invites:{limit}:{offset}"
+TEMP_FILE_KEY = "user:{user_id}:{room_id}:staged_files"
+TEMP_ROOMS_KEY = "user:{user_id}:rooms:v{version}:{limit}:{offset}"
+TEMP_INVITES_KEY = "user:{user_id}:{prefix}_invites:v{version}:{limit}:{offset}"
+ROOMS_VERSION_KEY = "user:{user_id}:rooms:version"
+ROOM_MEMBERS_KEY = "room:{room_id}:members"
+ROOM_MEMBERS_VERSION_KEY = "room:{room_id}:members:version"
+INVITES_VERSION_KEY = "user:{user_id}:invites:version"
+PRESENCE_KEY = "presence:user:{user_id}"
+CHAT_ROOM_CHANNEL = "chat:room:{room_id}"
+USER_PUSH_CHANNEL = "ws:user:{user_id}"
+JSON_SUBPROTOCOL = "chat.json.v1"
+MSGPACK_SUBPROTOCOL = "chat.msgpack.v1"
+REFRESH_TOKEN_KEY = "auth:refresh:{token_hash}"
+REFRESH_USED_KEY = "auth:refresh:{token_hash}:used"
+REFRESH_SUCCESSOR_KEY = "auth:refresh:{token_hash}:next"
+REFRESH_FAMILY_KEY = "auth:refresh_family:{user_id}"
+AUTH_TOKEN_KEY = "auth:token:{token_hash}"
+SEARCH_CONFIG = "simple"
+SEARCH_MIN_SUBSTRING = 3
+UNREAD_KEY = "user:{user_id}:unread"
@@ -1,7 +1,7 @@
 from src.core.models import (
     FileStorage,
+    HiddenMessage,
     Message,
-    MessageStatus,
     Room,
     RoomInvitation,
     RoomInvitationStatus,
@@ -14,7 +14,7 @@ __all__ = [
     "User",
     "UserStatus",
     "Message",
-    "MessageStatus",
+    "HiddenMessage",
     "Room",
     "RoomUser",
     "RoomInvitation",
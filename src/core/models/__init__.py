@@ -1,4 +1,4 @@
-from src.core.models.message_models import Message, MessageStatus
+from src.core.models.message_models import HiddenMessage, Message
 from src.core.models.room_models import (
     Room,
     RoomInvitation,
@@ -12,7 +12,7 @@ __all__ = [
     "User",
     "UserStatus",
     "Message",
-    "MessageStatus",
+    "HiddenMessage",
     "Room",
     "RoomUser",
     "RoomInvitation",
@@ -1,10 +1,12 @@
 import datetime
 from typing import TYPE_CHECKING, Any
 
-from sqlalchemy import TIMESTAMP, Enum, ForeignKey, Index, Text
+from sqlalchemy import TIMESTAMP, Computed, ForeignKey, Index, Text
+from sqlalchemy.dialects.postgresql import TSVECTOR
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from src import Base
+from src.constants import SEARCH_CONFIG
 
 if TYPE_CHECKING:
     from src.core.models.room_models import Room
@@ -29,10 +31,15 @@ class Message(Base):
     updated_at: Mapped[datetime.datetime] = mapped_column(
         TIMESTAMP, default=datetime.datetime.now, nullable=False
     )
+    search_vector: Mapped[str | None] = mapped_column(
+        TSVECTOR,
+        Computed(f"to_tsvector('{SEARCH_CONFIG}', content)", persisted=True),
+        deferred=True,
+    )
 
     room: Mapped["Room"] = relationship(back_populates="messages")
     sender: Mapped["User"] = relationship(back_populates="sent_messages")
-    statuses: Mapped[list["MessageStatus"]] = relationship(
+    hidden_by: Mapped[list["HiddenMessage"]] = relationship(
         back_populates="message", cascade="all, delete-orphan"
     )
     files: Mapped[list["FileStorage"]] = relationship(
@@ -40,9 +47,16 @@ class Message(Base):
     )
 
     __table_args__ = (
-        Index("ix_messages_room_id", "room_id"),
+        Index("ix_messages_room_id_created_at_id", "room_id", "created_at", "id"),
         Index("ix_messages_created_at", "created_at"),
         Index("ix_messages_sender_id", "sender_id"),
+        Index("ix_messages_search_vector", "search_vector", postgresql_using="gin"),
+        Index(
+            "ix_messages_content_trgm",
+            "content",
+            postgresql_using="gin",
+            postgresql_ops={"content": "gin_trgm_ops"},
+        ),
     )
 
     def to_dict(self) -> dict[str, Any]:
@@ -57,35 +71,20 @@ class Message(Base):
         }
 
 
-class MessageStatus(Base):
-    __tablename__ = "message_status"
+class HiddenMessage(Base):
+    __tablename__ = "hidden_messages"
 
-    id: Mapped[int] = mapped_column(primary_key=True, index=True)
-    message_id: Mapped[int] = mapped_column(
-        ForeignKey("messages.id", ondelete="CASCADE"), nullable=False
-    )
     user_id: Mapped[int] = mapped_column(
-        ForeignKey("users.id", ondelete="CASCADE"), nullable=False
+        ForeignKey("users.id", ondelete="CASCADE"), primary_key=True
     )
-    status: Mapped[str] = mapped_column(
-        Enum(
-            "sent",
-            "delivered",
-            "viewed",
-            "failed",
-            "deleted",
-            name="message_status_enum",
-        ),
-        nullable=False,
+    message_id: Mapped[int] = mapped_column(
+        ForeignKey("messages.id", ondelete="CASCADE"), primary_key=True
     )
-    updated_at: Mapped[datetime.datetime] = mapped_column(
+    hidden_at: Mapped[datetime.datetime] = mapped_column(
         TIMESTAMP, default=datetime.datetime.now, nullable=False
     )
 
-    message: Mapped["Message"] = relationship(back_populates="statuses")
-    user: Mapped["User"] = relationship(back_populates="message_statuses")
+    message: Mapped["Message"] = relationship(back_populates="hidden_by")
+    user: Mapped["User"] = relationship(back_populates="hidden_messages")
 
-    __table_args__ = (
-        Index("ix_message_status_message_id", "message_id"),
-        Index("ix_message_status_user_id", "user_id"),
-    )
+    __table_args__ = (Index("ix_hidden_messages_message_id", "message_id"),)
@@ -7,6 +7,7 @@ from sqlalchemy import (
     Enum,
     ForeignKey,
     Index,
+    Integer,
     String,
 )
 from sqlalchemy.orm import Mapped, mapped_column, relationship
@@ -33,6 +34,10 @@ class Room(Base):
     created_by: Mapped[int] = mapped_column(
         ForeignKey("users.id", ondelete="SET NULL"), nullable=False
     )
+    last_message_id: Mapped[int | None] = mapped_column(Integer, nullable=True)
+    last_activity_at: Mapped[datetime.datetime] = mapped_column(
+        TIMESTAMP, default=datetime.datetime.now, nullable=False
+    )
 
     creator: Mapped["User"] = relationship(back_populates="created_rooms")
     participants: Mapped[list["RoomUser"]] = relationship(
@@ -57,6 +62,10 @@ class RoomUser(Base):
     joined_at: Mapped[datetime.datetime] = mapped_column(
         TIMESTAMP, default=datetime.datetime.now, nullable=False
     )
+    last_delivered_message_id: Mapped[int | None] = mapped_column(
+        Integer, nullable=True
+    )
+    last_read_message_id: Mapped[int | None] = mapped_column(Integer, nullable=True)
 
     room: Mapped["Room"] = relationship(back_populates="participants")
     user: Mapped["User"] = relationship(back_populates="room_memberships")
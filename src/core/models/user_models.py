@@ -32,7 +32,7 @@ class User(Base):
     created_rooms = relationship("Room", back_populates="creator")
     room_memberships = relationship("RoomUser", back_populates="user")
     sent_messages = relationship("Message", back_populates="sender")
-    message_statuses = relationship("MessageStatus", back_populates="user")
+    hidden_messages = relationship("HiddenMessage", back_populates="user")
 
     __table_args__ = (
         Index("ix_users_email", "email"),
@@ -1,9 +1,9 @@
 from redis.asyncio import Redis
-from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
 from typing_extensions import AsyncGenerator
 
 from src.cache import redis_client
-from src.database import AsyncSessionLocal
+from src.database import AsyncSessionLocal, async_session_maker
 
 
 async def get_db() -> AsyncGenerator[AsyncSession, None]:
@@ -11,5 +11,9 @@ async def get_db() -> AsyncGenerator[AsyncSession, None]:
         yield session
 
 
+def get_session_maker() -> async_sessionmaker[AsyncSession]:
+    return async_session_maker
+
+
 async def get_redis() -> Redis:
     return redis_client
@@ -0,0 +1,32 @@
+import logging
+from typing import Any, Awaitable, Callable
+
+logger = logging.getLogger(__name__)
+
+MESSAGE_SENT = "message_sent"
+MESSAGE_UPDATED = "message_updated"
+MESSAGE_DELETED = "message_deleted"
+USER_ONLINE = "user_online"
+USER_OFFLINE = "user_offline"
+
+EventHandler = Callable[[dict[str, Any]], Awaitable[None]]
+
+
+class EventBus:
+    """In-process publish/subscribe for domain events raised by services."""
+
+    def __init__(self) -> None:
+        self._handlers: dict[str, list[EventHandler]] = {}
+
+    def subscribe(self, event: str, handler: EventHandler) -> None:
+        self._handlers.setdefault(event, []).append(handler)
+
+    async def emit(self, event: str, payload: dict[str, Any]) -> None:
+        for handler in self._handlers.get(event, []):
+            try:
+                await handler(payload)
+            except Exception as e:
+                logger.warning(f"Ошибка обработчика события {event}: {e}")
+
+
+bus: EventBus = EventBus()
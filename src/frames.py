@@ -0,0 +1,84 @@
+import datetime
+from typing import Any
+
+import msgpack
+import orjson
+from fastapi import WebSocket
+from pydantic import BaseModel
+
+from src.constants import JSON_SUBPROTOCOL, MSGPACK_SUBPROTOCOL
+
+SUBPROTOCOLS = (MSGPACK_SUBPROTOCOL, JSON_SUBPROTOCOL)
+
+
+def _default(obj: Any) -> Any:
+    if isinstance(obj, BaseModel):
+        return orjson.Fragment(obj.model_dump_json())
+    raise TypeError(f"Type is not JSON serializable: {type(obj).__name__}")
+
+
+def _pack_default(obj: Any) -> Any:
+    if isinstance(obj, BaseModel):
+        return obj.model_dump(mode="json")
+    if isinstance(obj, (datetime.datetime, datetime.date)):
+        return obj.isoformat()
+    raise TypeError(f"Type is not MessagePack serializable: {type(obj).__name__}")
+
+
+class Frame:
+    """A `{"type": ..., "data": ...}` event encoded at most once per format.
+
+    Pydantic models in `data` are dumped straight to JSON by pydantic-core and
+    spliced into the envelope, so a broadcast costs one encode regardless of
+    how many sockets receive it. The MessagePack form packs the same data with
+    models dumped in JSON mode, so both carry the same schema without a JSON
+    round trip.
+    """
+
+    __slots__ = ("type", "data", "_text", "_packed")
+
+    def __init__(self, type: str, data: Any, text: str | None = None) -> None:
+        self.type = type
+        self.data = data
+        self._text = text
+        self._packed: bytes | None = None
+
+    @classmethod
+    def loads(cls, text: str | bytes) -> "Frame":
+        payload = orjson.loads(text)
+        if isinstance(text, bytes):
+            text = text.decode()
+        return cls(payload.get("type"), payload.get("data"), text)
+
+    @property
+    def text(self) -> str:
+        if self._text is None:
+            self._text = orjson.dumps(
+                {"type": self.type, "data": self.data}, default=_default
+            ).decode()
+        return self._text
+
+    @property
+    def packed(self) -> bytes:
+        if self._packed is None:
+            self._packed = msgpack.packb(
+                {"type": self.type, "data": self.data}, default=_pack_default
+            )
+        return self._packed
+
+    def get(self, field: str) -> Any:
+        if isinstance(self.data, dict):
+            return self.data.get(field)
+        return getattr(self.data, field, None)
+
+
+def negotiate_subprotocol(websocket: WebSocket) -> str | None:
+    offered = websocket.scope.get("subprotocols") or []
+    for subprotocol in offered:
+        if subprotocol in SUBPROTOCOLS:
+            return str(subprotocol)
+    return None
+
+
+def unpack(data: bytes) -> Any:
+    return msgpack.unpackb(data)
@@ -0,0 +1,46 @@
+import importlib.util
+
+import httpx
+
+from src.config import settings
+
+# HTTP/2 needs the optional `h2` package (`pip install httpx[http2]`).
+HTTP2 = importlib.util.find_spec("h2") is not None
+
+
+class SharedHttpClient:
+    """One pooled keep-alive client for every outbound call (OAuth, avatars).
+
+    Opened in the app lifespan and closed on shutdown; created lazily when used
+    outside of it (scripts, tests).
+    """
+
+    def __init__(self) -> None:
+        self._client: httpx.AsyncClient | None = None
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                http2=HTTP2,
+                timeout=httpx.Timeout(
+                    settings.HTTP_TIMEOUT, connect=settings.HTTP_CONNECT_TIMEOUT
+                ),
+                limits=httpx.Limits(
+                    max_connections=settings.HTTP_MAX_CONNECTIONS,
+                    max_keepalive_connections=settings.HTTP_MAX_KEEPALIVE,
+                    keepalive_expiry=settings.HTTP_KEEPALIVE_EXPIRY,
+                ),
+            )
+        return self._client
+
+    def start(self) -> None:
+        self.client
+
+    async def close(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+http_client: SharedHttpClient = SharedHttpClient()
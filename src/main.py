@@ -1,4 +1,5 @@
-from typing import Any
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator
 
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
@@ -6,16 +7,71 @@ from fastapi.openapi.utils import get_openapi
 from starlette.middleware.sessions import SessionMiddleware
 
 from src.auth import router as auth_router
+from src.cache import cache_stats, redis_client
 from src.config import settings
+from src.database import async_session_maker
+from src.http_clients import http_client
 from src.messages import router as messages_router
 from src.messages import ws_docs_router as messages_ws_docs_router
 from src.messages import ws_router as messages_ws_router
+from src.messages.manager import manager as chat_manager
+from src.minio_client import storage
 from src.rooms import router as rooms_router
 from src.storage import router as storage_router
+from src.tasks import PeriodicTask
+from src.unread import reconcile_unread
 from src.user import router as user_router
 from src.websocket import ws_docs_router, ws_router
+from src.websocket.events import register_push_handlers
+from src.websocket.manager import manager as global_manager
+from src.websocket.service import flush_user_statuses
 
-app = FastAPI(debug=settings.DEBUG)
+
+async def reap_connections() -> None:
+    await chat_manager.heartbeat()
+    await global_manager.heartbeat()
+
+
+async def flush_statuses() -> None:
+    async with async_session_maker() as db:
+        await flush_user_statuses(db)
+
+
+async def reconcile_unread_counts() -> None:
+    async with async_session_maker() as db:
+        await reconcile_unread(
+            list(global_manager.active_connections), db, redis_client
+        )
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI) -> AsyncIterator[None]:
+    http_client.start()
+    await storage.start()
+    tasks = [
+        PeriodicTask("reaper", settings.WS_PING_INTERVAL, reap_connections),
+        PeriodicTask("status flush", settings.PRESENCE_FLUSH_INTERVAL, flush_statuses),
+        PeriodicTask(
+            "unread reconcile",
+            settings.UNREAD_RECONCILE_INTERVAL,
+            reconcile_unread_counts,
+        ),
+    ]
+    for task in tasks:
+        task.start()
+    yield
+    for task in tasks:
+        await task.stop()
+    await flush_statuses()
+    await chat_manager.broker.close()
+    await global_manager.broker.close()
+    await http_client.close()
+    await storage.close()
+
+
+register_push_handlers()
+
+app = FastAPI(debug=settings.DEBUG, lifespan=lifespan)
 
 app.add_middleware(SessionMiddleware, secret_key=settings.SECRET_KEY)
 
@@ -58,6 +114,15 @@ async def ping() -> dict[str, str]:
     return {"message": "pong"}
 
 
+@app.get("/metrics")
+async def metrics() -> dict[str, dict[str, int]]:
+    return {
+        "chat_ws": chat_manager.stats(),
+        "global_ws": global_manager.stats(),
+        **cache_stats(),
+    }
+
+
 app.include_router(auth_router)
 app.include_router(user_router)
 app.include_router(rooms_router)
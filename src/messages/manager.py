@@ -1,40 +1,74 @@
-from typing import Any, Dict
-
 from fastapi import WebSocket
 
+from src.broker import LocalBroker, create_broker, room_channel
+from src.connections import (
+    Connection,
+    ConnectionMetrics,
+    ConnectionRegistry,
+    heartbeat,
+)
+from src.frames import Frame
+
 
 class ChatConnectionManager:
-    def __init__(self) -> None:
-        self.active_connections: Dict[int, WebSocket] = {}
-        self.user_rooms: Dict[int, int] = {}
-
-    async def connect(self, user_id: int, websocket: WebSocket, room_id: int) -> None:
-        await websocket.accept()
-        self.active_connections[user_id] = websocket
-        self.user_rooms[user_id] = room_id
-
-    def disconnect(self, user_id: int) -> None:
-        self.active_connections.pop(user_id, None)
-        self.user_rooms.pop(user_id, None)
-
-    async def send_personal_message(
-        self, user_id: int, message: dict[str, Any]
-    ) -> None:
-        ws = self.active_connections.get(user_id)
-        if ws:
-            await ws.send_json(message)
-
-    async def broadcast_to_room(
-        self, user_ids: list[int], message: dict[str, Any]
-    ) -> None:
+    def __init__(self, broker: LocalBroker) -> None:
+        self.registry = ConnectionRegistry()
+        self.active_connections = self.registry.users
+        self.metrics = ConnectionMetrics()
+        self.broker = broker
+        self.broker.set_handler(self.deliver_to_room)
+
+    async def connect(
+        self, user_id: int, websocket: WebSocket, room_id: int
+    ) -> Connection:
+        connection = await Connection.accept(websocket, user_id)
+
+        self.registry.add(connection)
+        if self.registry.join(connection, room_id):
+            await self.broker.subscribe(room_id)
+        return connection
+
+    async def disconnect(self, connection: Connection, code: int | None = None) -> None:
+        if not self.registry.contains(connection):
+            return
+        for room_id in self.registry.remove(connection):
+            await self.broker.unsubscribe(room_id)
+        await connection.close(code)
+        self.metrics.retire(connection)
+
+    async def heartbeat(self) -> int:
+        reaped = await heartbeat(self.registry.connections(), self.disconnect)
+        self.metrics.reaped += reaped
+        return reaped
+
+    async def send_personal_message(self, user_id: int, frame: Frame) -> None:
+        for connection in self.registry.get(user_id):
+            connection.send(frame)
+
+    async def broadcast_to_room(self, user_ids: list[int], frame: Frame) -> None:
         for uid in user_ids:
-            await self.send_personal_message(uid, message)
+            await self.send_personal_message(uid, frame)
+
+    async def publish_to_room(self, room_id: int, frame: Frame) -> None:
+        await self.broker.publish(room_id, frame)
+
+    async def deliver_to_room(self, room_id: int, frame: Frame) -> None:
+        for connection in self.registry.in_room(room_id):
+            connection.send(frame)
 
     def get_online_rooms(self) -> set[int]:
-        return set(self.user_rooms.values())
+        return set(self.registry.rooms)
 
     def get_online_users_in_room(self, room_id: int) -> list[int]:
-        return [uid for uid, rid in self.user_rooms.items() if rid == room_id]
+        return self.registry.users_in_room(room_id)
+
+    def get_online_count(self, room_id: int) -> int:
+        return self.registry.room_count(room_id)
+
+    def stats(self) -> dict[str, int]:
+        return self.metrics.snapshot(self.registry.connections())
 
 
-manager: ChatConnectionManager = ChatConnectionManager()
+manager: ChatConnectionManager = ChatConnectionManager(
+    broker=create_broker(room_channel)
+)
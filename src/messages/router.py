@@ -1,10 +1,10 @@
 from typing import List
 
-from fastapi import APIRouter, Depends, Response
+from fastapi import APIRouter, Depends, HTTPException, Response
 from redis.asyncio import Redis
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from src import Pagination, get_db, get_redis, settings
+from src import MessagePagination, SearchPagination, get_db, get_redis, settings
 from src.auth.deps import get_current_user
 from src.core import User
 from src.messages import service
@@ -55,7 +55,8 @@ async def get_messages_by_room(  # type: ignore[no-untyped-def]
     response: Response,
     result: tuple[User, str | None] = Depends(get_current_user),
     db: AsyncSession = Depends(get_db),
-    pagination: Pagination = Depends(Pagination),
+    redis: Redis = Depends(get_redis),
+    pagination: MessagePagination = Depends(MessagePagination),
 ):
     user, new_token = result
     if new_token:
@@ -68,12 +69,16 @@ async def get_messages_by_room(  # type: ignore[no-untyped-def]
             domain=".mushysoft.online",
             max_age=settings.TOKEN_EXPIRE_SECONDS,
         )
-    return await service.get_messages_by_room(
-        room_id=room_id,
-        db=db,
-        current_user=user,
-        pagination=pagination,
-    )
+    try:
+        return await service.get_messages_by_room(
+            room_id=room_id,
+            db=db,
+            redis=redis,
+            current_user=user,
+            pagination=pagination,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
 
 @router.get(
@@ -115,6 +120,7 @@ async def update_message(  # type: ignore[no-untyped-def]
     response: Response,
     result: tuple[User, str | None] = Depends(get_current_user),
     db: AsyncSession = Depends(get_db),
+    redis: Redis = Depends(get_redis),
 ):
     user, new_token = result
     if new_token:
@@ -127,7 +133,9 @@ async def update_message(  # type: ignore[no-untyped-def]
             domain=".mushysoft.online",
             max_age=settings.TOKEN_EXPIRE_SECONDS,
         )
-    return await service.update_message(data=data, db=db, current_user=user)
+    return await service.update_message(
+        data=data, db=db, redis=redis, current_user=user
+    )
 
 
 @router.delete(
@@ -141,6 +149,7 @@ async def delete_message(  # type: ignore[no-untyped-def]
     response: Response,
     result: tuple[User, str | None] = Depends(get_current_user),
     db: AsyncSession = Depends(get_db),
+    redis: Redis = Depends(get_redis),
 ):
     user, new_token = result
     if new_token:
@@ -153,7 +162,12 @@ async def delete_message(  # type: ignore[no-untyped-def]
             domain=".mushysoft.online",
             max_age=settings.TOKEN_EXPIRE_SECONDS,
         )
-    return await service.delete_message(message_id=message_id, db=db, current_user=user)
+    try:
+        return await service.delete_message(
+            message_id=message_id, db=db, redis=redis, current_user=user
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
 
 
 @router.get(
@@ -166,6 +180,7 @@ async def search_messages(  # type: ignore[no-untyped-def]
     room_id: int,
     text: str,
     response: Response,
+    pagination: SearchPagination = Depends(SearchPagination),
     result: tuple[User, str | None] = Depends(get_current_user),
     db: AsyncSession = Depends(get_db),
 ):
@@ -180,6 +195,13 @@ async def search_messages(  # type: ignore[no-untyped-def]
             domain=".mushysoft.online",
             max_age=settings.TOKEN_EXPIRE_SECONDS,
         )
-    return await service.search_messages(
-        room_id=room_id, text=text, db=db, current_user=user
-    )
+    try:
+        return await service.search_messages(
+            room_id=room_id,
+            text=text,
+            db=db,
+            current_user=user,
+            pagination=pagination,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
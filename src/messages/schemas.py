@@ -58,5 +58,7 @@ class MessagePublic(BaseModel):
     files: List[str] = Field(default_factory=list)
     status: str | None
     is_owner: bool
+    cursor: str | None = None
+    snippet: str | None = None
 
     model_config = {"from_attributes": True}
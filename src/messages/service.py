@@ -1,13 +1,39 @@
 import datetime
-from typing import List, Optional
+import re
+from typing import Any, List, Optional, Sequence
 
 from redis.asyncio import Redis
-from sqlalchemy import delete, select, update
+from sqlalchemy import (
+    ColumnElement,
+    Float,
+    Select,
+    String,
+    and_,
+    delete,
+    exists,
+    func,
+    insert,
+    literal,
+    or_,
+    select,
+    tuple_,
+    update,
+)
+from sqlalchemy.dialects.postgresql import array
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import selectinload
 
-from src import Pagination, clear_temp_files, get_temp_files
-from src.core import FileStorage, Message, MessageStatus, RoomUser, User
+from src import (
+    MessagePagination,
+    SearchPagination,
+    add_files_to_temp_redis,
+    take_temp_files,
+)
+from src.cache import bump_cache_versions
+from src.constants import SEARCH_CONFIG, SEARCH_MIN_SUBSTRING
+from src.core import FileStorage, HiddenMessage, Message, Room, RoomUser, User
+from src.events import MESSAGE_DELETED, MESSAGE_SENT, MESSAGE_UPDATED, bus
 from src.messages.schemas import (
     MessageCreateRequest,
     MessageCreateResponse,
@@ -17,82 +43,242 @@ from src.messages.schemas import (
     MessageUpdateRequest,
     MessageUpdateResponse,
 )
+from src.pagination import (
+    decode_cursor,
+    decode_search_cursor,
+    encode_cursor,
+    encode_search_cursor,
+)
+from src.rooms.schemas import LastMessageOut
+from src.unread import increment_unread, reset_unread
 
+# Search cursor rank of substring-fallback pages; real ranks are never negative.
+SUBSTRING_RANK = -1.0
 
-async def send_message(
-    data: MessageCreateRequest, db: AsyncSession, redis: Redis, current_user: User
-) -> MessageCreateResponse:
-    new_msg = Message(
-        room_id=data.room_id,
-        sender_id=current_user.id,
-        content=data.content,
-        created_at=datetime.datetime.now(),
-        updated_at=datetime.datetime.now(),
+SNIPPET = "StartSel=<mark>, StopSel=</mark>, MaxWords=30, MinWords=10, MaxFragments=2"
+
+
+def member_messages(user_id: int) -> Select[tuple[Message]]:
+    # A member can see the messages sent since they joined; delivery and read
+    # state live in the RoomUser watermarks.
+    return select(Message).join(
+        RoomUser,
+        and_(
+            RoomUser.room_id == Message.room_id,
+            RoomUser.user_id == user_id,
+            Message.created_at >= RoomUser.joined_at,
+        ),
     )
-    db.add(new_msg)
-    await db.flush()
 
-    participants_result = await db.execute(
-        select(RoomUser.user_id).where(RoomUser.room_id == data.room_id)
+
+def visible_messages(user_id: int) -> Select[tuple[Message]]:
+    return member_messages(user_id).where(~is_hidden(user_id))
+
+
+def is_hidden(user_id: int) -> ColumnElement[bool]:
+    return exists().where(
+        HiddenMessage.message_id == Message.id, HiddenMessage.user_id == user_id
     )
-    participant_ids = participants_result.scalars().all()
-
-    for user_id in participant_ids:
-        status_value = "delivered"
-        db.add(
-            MessageStatus(
-                message_id=new_msg.id,
-                user_id=user_id,
-                status=status_value,
-                updated_at=datetime.datetime.now(),
-            )
+
+
+def cursor_key(cursor: str) -> ColumnElement[Any]:
+    created_at, message_id = decode_cursor(cursor)
+    return tuple_(literal(created_at, Message.created_at.type), literal(message_id))
+
+
+def watermark(column: Any, message_id: Any) -> ColumnElement[int]:
+    return func.greatest(func.coalesce(column, 0), message_id)
+
+
+async def advance_watermarks(
+    room_id: int, user_id: int, message_id: int, db: AsyncSession
+) -> None:
+    # Reading a message implies it was delivered.
+    await db.execute(
+        update(RoomUser)
+        .where(RoomUser.room_id == room_id, RoomUser.user_id == user_id)
+        .values(
+            last_delivered_message_id=watermark(
+                RoomUser.last_delivered_message_id, message_id
+            ),
+            last_read_message_id=watermark(RoomUser.last_read_message_id, message_id),
         )
+    )
 
-    files = await get_temp_files(redis, current_user.id, room_id=data.room_id)
-    for file in files:
-        db.add(FileStorage(message_id=new_msg.id, file_url=file["url"]))
 
+async def mark_delivered(
+    room_id: int, message_id: int, db: AsyncSession, current_user: User
+) -> None:
+    # Delivery is acknowledged by the recipient's client, one row per ack,
+    # so sending stays O(1) writes however many members are online.
+    await db.execute(
+        update(RoomUser)
+        .where(RoomUser.room_id == room_id, RoomUser.user_id == current_user.id)
+        .values(
+            last_delivered_message_id=watermark(
+                RoomUser.last_delivered_message_id, message_id
+            )
+        )
+    )
     await db.commit()
-    await clear_temp_files(redis, current_user.id, data.room_id)
 
-    return MessageCreateResponse.model_validate(new_msg)
+
+async def get_receipts(
+    room_id: int, db: AsyncSession, current_user: User
+) -> tuple[int, int]:
+    result = await db.execute(
+        select(
+            func.coalesce(func.max(RoomUser.last_delivered_message_id), 0),
+            func.coalesce(func.max(RoomUser.last_read_message_id), 0),
+        ).where(RoomUser.room_id == room_id, RoomUser.user_id != current_user.id)
+    )
+    delivered, read = result.one()
+    return delivered, read
+
+
+def receipt_status(message_id: int, receipts: tuple[int, int]) -> str:
+    delivered, read = receipts
+    if message_id <= read:
+        return "viewed"
+    if message_id <= delivered:
+        return "delivered"
+    return "sent"
+
+
+async def emit_last_message(
+    event: str, room_id: int, user_ids: Sequence[int], message: Optional[Any]
+) -> None:
+    await bus.emit(
+        event,
+        {
+            "room_id": room_id,
+            "user_ids": list(user_ids),
+            "last_message": (
+                LastMessageOut.model_validate(message) if message else None
+            ),
+        },
+    )
+
+
+async def send_message(
+    data: MessageCreateRequest, db: AsyncSession, redis: Redis, current_user: User
+) -> MessageCreateResponse:
+    now = datetime.datetime.now()
+    files = await take_temp_files(redis, current_user.id, room_id=data.room_id)
+
+    # One round trip and O(1) rows per message: the message insert, the
+    # sender's watermarks, the room's last message and the staged files are
+    # chained as data-modifying CTEs, and the member ids for the push come
+    # back from the same statement.
+    new_message = (
+        insert(Message)
+        .values(
+            room_id=data.room_id,
+            sender_id=current_user.id,
+            content=data.content,
+            created_at=now,
+            updated_at=now,
+        )
+        .returning(
+            Message.id,
+            Message.room_id,
+            Message.sender_id,
+            Message.content,
+            Message.created_at,
+        )
+        .cte("new_message")
+    )
+    sender_watermarks = (
+        update(RoomUser)
+        .where(
+            RoomUser.room_id == new_message.c.room_id,
+            RoomUser.user_id == current_user.id,
+        )
+        .values(
+            last_delivered_message_id=new_message.c.id,
+            last_read_message_id=new_message.c.id,
+        )
+        .cte("sender_watermarks")
+    )
+    room_activity = (
+        update(Room)
+        .where(
+            Room.id == new_message.c.room_id,
+            or_(
+                Room.last_message_id.is_(None),
+                Room.last_message_id < new_message.c.id,
+            ),
+        )
+        .values(
+            last_message_id=new_message.c.id,
+            last_activity_at=new_message.c.created_at,
+        )
+        .cte("room_activity")
+    )
+    stmt = select(
+        new_message,
+        select(func.array_agg(RoomUser.user_id))
+        .where(RoomUser.room_id == data.room_id)
+        .scalar_subquery()
+        .label("participant_ids"),
+    ).add_cte(sender_watermarks, room_activity)
+    if files:
+        stored_files = (
+            insert(FileStorage)
+            .from_select(
+                ["message_id", "file_url", "created_at"],
+                select(
+                    new_message.c.id,
+                    func.unnest(
+                        array(  # type: ignore[no-untyped-call]
+                            [f["url"] for f in files], type_=String
+                        )
+                    ),
+                    literal(now, FileStorage.created_at.type),
+                ),
+            )
+            .cte("stored_files")
+        )
+        stmt = stmt.add_cte(stored_files)
+
+    try:
+        row = (await db.execute(stmt)).one()
+        await db.commit()
+    except Exception:
+        # The attachments were claimed before the insert; put them back so a
+        # retry of the send still finds them.
+        await add_files_to_temp_redis(
+            redis, current_user.id, data.room_id, [f["url"] for f in files]
+        )
+        raise
+    recipients = [uid for uid in row.participant_ids or [] if uid != current_user.id]
+    await increment_unread(redis, data.room_id, recipients)
+    await bump_cache_versions(redis, rooms=row.participant_ids or [])
+
+    new_msg = MessageCreateResponse.model_validate(row)
+    await emit_last_message(
+        MESSAGE_SENT, data.room_id, row.participant_ids or [], new_msg
+    )
+    return new_msg
 
 
 async def get_message_by_id(
     message_id: int, db: AsyncSession, current_user: User
 ) -> Optional[MessagePublic]:
     result = await db.execute(
-        select(Message)
-        .options(selectinload(Message.files))
-        .join(MessageStatus)
-        .where(
-            Message.id == message_id,
-            MessageStatus.user_id == current_user.id,
-            MessageStatus.status.in_(["delivered", "viewed"]),
-        )
+        visible_messages(current_user.id)
+        .options(selectinload(Message.files), selectinload(Message.sender))
+        .where(Message.id == message_id)
     )
     message = result.scalar_one_or_none()
 
     if not message:
         return None
 
-    await db.execute(
-        update(MessageStatus)
-        .where(
-            MessageStatus.message_id == message.id,
-            MessageStatus.user_id == current_user.id,
-        )
-        .values(status="viewed", updated_at=datetime.datetime.now())
-    )
+    await advance_watermarks(message.room_id, current_user.id, message.id, db)
     await db.commit()
 
-    status_result = await db.execute(
-        select(MessageStatus.status).where(
-            MessageStatus.message_id == message.id,
-            MessageStatus.user_id != current_user.id,
-        )
-    )
-    status = status_result.scalar_one_or_none() or "sent"
+    receipts = await get_receipts(message.room_id, db, current_user)
 
     return MessagePublic(
         id=message.id,
@@ -103,49 +289,58 @@ async def get_message_by_id(
         created_at=message.created_at,
         updated_at=message.updated_at,
         files=[file.file_url for file in (message.files or []) if file is not None],
-        status=status,
+        status=receipt_status(message.id, receipts),
         is_owner=(message.sender_id == current_user.id),
+        cursor=encode_cursor(message.created_at, message.id),
     )
 
 
 async def get_messages_by_room(
     room_id: int,
     db: AsyncSession,
+    redis: Redis,
     current_user: User,
-    pagination: Pagination,
+    pagination: MessagePagination,
 ) -> List[MessagePublic]:
-    result = await db.execute(
-        select(Message)
+    query = (
+        visible_messages(current_user.id)
         .options(selectinload(Message.files), selectinload(Message.sender))
-        .join(MessageStatus)
-        .where(
-            Message.room_id == room_id,
-            MessageStatus.user_id == current_user.id,
-            MessageStatus.status.in_(["delivered", "viewed"]),
-        )
-        .order_by(Message.created_at)
+        .where(Message.room_id == room_id)
         .limit(pagination.limit)
-        .offset(pagination.offset)
     )
-    messages = result.scalars().all()
+    key = tuple_(Message.created_at, Message.id)
+
+    # Keyset pages seek on the (room_id, created_at, id) index, so their cost
+    # does not depend on how far back they are; offset pages are kept for
+    # older clients.
+    if pagination.before is not None:
+        if pagination.before:
+            query = query.where(key < cursor_key(pagination.before))
+        query = query.order_by(Message.created_at.desc(), Message.id.desc())
+    elif pagination.after is not None:
+        query = query.where(key > cursor_key(pagination.after))
+        query = query.order_by(Message.created_at, Message.id)
+    else:
+        query = query.order_by(Message.created_at, Message.id).offset(pagination.offset)
 
-    await db.execute(
-        update(MessageStatus)
-        .where(
-            MessageStatus.message_id.in_([m.id for m in messages]),
-            MessageStatus.user_id != current_user.id,
-        )
-        .values(status="viewed", updated_at=datetime.datetime.now())
-    )
-    await db.commit()
+    result = await db.execute(query)
+    messages = list(result.scalars().all())
+    if pagination.before is not None:
+        messages.reverse()
 
-    status_result = await db.execute(
-        select(MessageStatus.message_id, MessageStatus.status).where(
-            MessageStatus.user_id == current_user.id,
-            MessageStatus.message_id.in_([m.id for m in messages]),
+    if messages:
+        await advance_watermarks(
+            room_id, current_user.id, max(m.id for m in messages), db
         )
-    )
-    statuses = {mid: status for mid, status in status_result.scalars().all()}
+        await db.commit()
+
+    # The unread badge clears once the newest messages have been shown: the
+    # first "before" page always ends at them, the other modes only when the
+    # page came back short.
+    if pagination.before == "" or len(messages) < pagination.limit:
+        await reset_unread(redis, current_user.id, room_id)
+
+    receipts = await get_receipts(room_id, db, current_user)
 
     return [
         MessagePublic(
@@ -157,15 +352,16 @@ async def get_messages_by_room(
             created_at=msg.created_at,
             updated_at=msg.updated_at,
             files=[f.file_url for f in (msg.files or []) if f is not None],
-            status=statuses.get(msg.id, "sent"),
+            status=receipt_status(msg.id, receipts),
             is_owner=(msg.sender_id == current_user.id),
+            cursor=encode_cursor(msg.created_at, msg.id),
         )
         for msg in messages
     ]
 
 
 async def update_message(
-    data: MessageUpdateRequest, db: AsyncSession, current_user: User
+    data: MessageUpdateRequest, db: AsyncSession, redis: Redis, current_user: User
 ) -> MessageUpdateResponse:
     result = await db.execute(
         select(Message)
@@ -190,56 +386,129 @@ async def update_message(
     for url in data.file_urls:
         db.add(FileStorage(message_id=message.id, file_url=url))
 
-    await db.execute(
-        update(MessageStatus)
-        .where(
-            MessageStatus.message_id == message.id,
-            MessageStatus.user_id != current_user.id,
-            MessageStatus.status != "deleted",
-        )
-        .values(status="delivered", updated_at=datetime.datetime.now())
-    )
-
     await db.commit()
 
+    last_id_result = await db.execute(
+        select(Room.last_message_id).where(Room.id == message.room_id)
+    )
+    if last_id_result.scalar_one_or_none() == message.id:
+        members_result = await db.execute(
+            select(RoomUser.user_id).where(RoomUser.room_id == message.room_id)
+        )
+        member_ids = members_result.scalars().all()
+        await bump_cache_versions(redis, rooms=member_ids)
+        await emit_last_message(MESSAGE_UPDATED, message.room_id, member_ids, message)
+
     return MessageUpdateResponse(message_id=message.id)
 
 
 async def delete_message(
-    message_id: int, db: AsyncSession, current_user: User
+    message_id: int, db: AsyncSession, redis: Redis, current_user: User
 ) -> MessageDeleteResponse:
+    # Hiding an already hidden message is a no-op, so only membership is
+    # checked here, not visibility.
+    message_result = await db.execute(
+        member_messages(current_user.id).where(Message.id == message_id)
+    )
+    message = message_result.scalar_one_or_none()
+    if not message:
+        raise ValueError("Message not found")
+
     await db.execute(
-        update(MessageStatus)
-        .where(
-            MessageStatus.message_id == message_id,
-            MessageStatus.user_id == current_user.id,
+        pg_insert(HiddenMessage)
+        .values(
+            user_id=current_user.id,
+            message_id=message_id,
+            hidden_at=datetime.datetime.now(),
         )
-        .values(status="deleted", updated_at=datetime.datetime.now())
+        .on_conflict_do_nothing()
     )
     await db.commit()
+
+    last_result = await db.execute(
+        visible_messages(current_user.id)
+        .where(Message.room_id == message.room_id)
+        .order_by(Message.created_at.desc())
+        .limit(1)
+    )
+    # The deleter's room list now ends at this same message, so their cached
+    # pages are dropped along with the push.
+    await bump_cache_versions(redis, rooms=[current_user.id])
+    await emit_last_message(
+        MESSAGE_DELETED,
+        message.room_id,
+        [current_user.id],
+        last_result.scalar_one_or_none(),
+    )
+
     return MessageDeleteResponse(message_id=message_id)
 
 
 async def search_messages(
-    room_id: int, text: Optional[str], db: AsyncSession, current_user: User
+    room_id: int,
+    text: str,
+    db: AsyncSession,
+    current_user: User,
+    pagination: SearchPagination,
 ) -> list[MessagePublic]:
-    query = (
-        select(Message)
+    # Word matches come from the GIN-indexed tsvector and are ranked. Only when
+    # the words match nothing does the trigram-indexed ILIKE run, newest first,
+    # so a page never has to rank every substring hit; its cursors carry
+    # SUBSTRING_RANK instead of a rank so later pages stay on the fallback.
+    cursor = decode_search_cursor(pagination.cursor) if pagination.cursor else None
+    ts_query = func.websearch_to_tsquery(SEARCH_CONFIG, text)
+    snippet = func.ts_headline(SEARCH_CONFIG, Message.content, ts_query, SNIPPET)
+    base = (
+        visible_messages(current_user.id)
         .options(selectinload(Message.files), selectinload(Message.sender))
-        .join(MessageStatus)
-        .where(
-            Message.room_id == room_id,
-            MessageStatus.status.in_(["delivered", "viewed"]),
-        )
-        .order_by(Message.created_at)
+        .where(Message.room_id == room_id)
+        .limit(pagination.limit)
     )
 
-    if text:
-        query = query.where(Message.content.ilike(f"%{text}%"))
+    if cursor is None or cursor[0] != SUBSTRING_RANK:
+        rank = func.ts_rank_cd(Message.search_vector, ts_query)
+        query = (
+            base.add_columns(rank.label("rank"), snippet.label("snippet"))
+            .where(Message.search_vector.op("@@")(ts_query))
+            .order_by(rank.desc(), Message.created_at.desc(), Message.id.desc())
+        )
+        if cursor:
+            last_rank, created_at, message_id = cursor
+            query = query.where(
+                tuple_(rank, Message.created_at, Message.id)
+                < tuple_(
+                    literal(last_rank, Float),
+                    literal(created_at, Message.created_at.type),
+                    literal(message_id),
+                )
+            )
+        rows = (await db.execute(query)).all()
+        if rows or cursor is not None:
+            return search_results(rows, current_user)
 
-    result = await db.execute(query)
-    messages = result.scalars().all()
+    # Shorter patterns have no trigram to look up and would scan the room.
+    if len(text) < SEARCH_MIN_SUBSTRING:
+        return []
 
+    pattern = "%" + re.sub(r"([\\%_])", r"\\\1", text) + "%"
+    query = (
+        base.add_columns(
+            literal(SUBSTRING_RANK, Float).label("rank"), snippet.label("snippet")
+        )
+        .where(Message.content.ilike(pattern, escape="\\"))
+        .order_by(Message.created_at.desc(), Message.id.desc())
+    )
+    if cursor:
+        _, created_at, message_id = cursor
+        query = query.where(
+            tuple_(Message.created_at, Message.id)
+            < tuple_(literal(created_at, Message.created_at.type), literal(message_id))
+        )
+    rows = (await db.execute(query)).all()
+    return search_results(rows, current_user)
+
+
+def search_results(rows: Sequence[Any], current_user: User) -> list[MessagePublic]:
     return [
         MessagePublic(
             id=msg.id,
@@ -252,6 +521,8 @@ async def search_messages(
             files=[f.file_url for f in (msg.files or []) if f is not None],
             status=None,
             is_owner=(msg.sender_id == current_user.id),
+            cursor=encode_search_cursor(msg_rank, msg.created_at, msg.id),
+            snippet=msg_snippet,
         )
-        for msg in messages
+        for msg, msg_rank, msg_snippet in rows
     ]
@@ -1,10 +1,11 @@
 from fastapi import APIRouter, Depends, WebSocket, WebSocketDisconnect
 from redis.asyncio import Redis
-from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
 
-from src import Pagination, get_db, get_redis
+from src import MessagePagination, get_redis, get_session_maker
 from src.auth import get_current_user_ws
 from src.core import User
+from src.frames import Frame
 from src.messages.manager import manager
 from src.messages.schemas import (
     MessageCreateRequest,
@@ -14,6 +15,7 @@ from src.messages.service import (
     delete_message,
     get_message_by_id,
     get_messages_by_room,
+    mark_delivered,
     send_message,
     update_message,
 )
@@ -25,83 +27,76 @@ router = APIRouter(prefix="/ws/chat", tags=["chat websocket"])
 async def chat_ws(  # type: ignore[no-untyped-def]
     websocket: WebSocket,
     room_id: int,
-    db: AsyncSession = Depends(get_db),
+    sessions: async_sessionmaker[AsyncSession] = Depends(get_session_maker),
     redis: Redis = Depends(get_redis),
     current_user: User = Depends(get_current_user_ws),
 ):
-    await manager.connect(current_user.id, websocket, room_id)
+    connection = await manager.connect(current_user.id, websocket, room_id)
     try:
         while True:
-            data = await websocket.receive_json()
+            data = await connection.receive()
             action = data.get("action")
 
-            match action:
-                case "send_message":
-                    payload_create = MessageCreateRequest(**data["data"])
-                    result_send = await send_message(
-                        payload_create, db, redis, current_user
-                    )
-                    online_users = manager.get_online_users_in_room(room_id)
-                    await manager.broadcast_to_room(
-                        user_ids=online_users,
-                        message={
-                            "type": "new_message",
-                            "data": result_send.model_dump(mode="json"),
-                        },
-                    )
+            async with sessions() as db:
+                match action:
+                    case "send_message":
+                        payload_create = MessageCreateRequest(**data["data"])
+                        result_send = await send_message(
+                            payload_create, db, redis, current_user
+                        )
+                        await manager.publish_to_room(
+                            room_id=room_id, frame=Frame("new_message", result_send)
+                        )
 
-                case "get_messages":
-                    pagination_data = data.get("pagination")
-                    pagination = (
-                        Pagination(**pagination_data)
-                        if pagination_data
-                        else Pagination()
-                    )
+                    case "get_messages":
+                        pagination_data = data.get("pagination")
+                        try:
+                            pagination = (
+                                MessagePagination(**pagination_data)
+                                if pagination_data
+                                else MessagePagination()
+                            )
+                            messages = await get_messages_by_room(
+                                room_id, db, redis, current_user, pagination=pagination
+                            )
+                        except ValueError:
+                            continue
+                        connection.send(Frame("message_history", messages))
 
-                    messages = await get_messages_by_room(
-                        room_id, db, current_user, pagination=pagination
-                    )
-                    await websocket.send_json(
-                        {
-                            "type": "message_history",
-                            "data": [m.model_dump(mode="json") for m in messages],
-                        }
-                    )
+                    case "get_message":
+                        msg_id = data["message_id"]
+                        message = await get_message_by_id(msg_id, db, current_user)
+                        if message:
+                            connection.send(Frame("message_detail", message))
 
-                case "get_message":
-                    msg_id = data["message_id"]
-                    message = await get_message_by_id(msg_id, db, current_user)
-                    if message:
-                        await websocket.send_json(
-                            {
-                                "type": "message_detail",
-                                "data": message.model_dump(mode="json"),
-                            }
+                    case "message_delivered":
+                        await mark_delivered(
+                            room_id, data["message_id"], db, current_user
                         )
 
-                case "edit_message":
-                    payload_update = MessageUpdateRequest(**data["data"])
-                    result_edit = await update_message(payload_update, db, current_user)
-                    online_users = manager.get_online_users_in_room(room_id)
-                    await manager.broadcast_to_room(
-                        user_ids=online_users,
-                        message={
-                            "type": "message_edited",
-                            "data": result_edit.model_dump(mode="json"),
-                        },
-                    )
+                    case "edit_message":
+                        payload_update = MessageUpdateRequest(**data["data"])
+                        result_edit = await update_message(
+                            payload_update, db, redis, current_user
+                        )
+                        await manager.publish_to_room(
+                            room_id=room_id, frame=Frame("message_edited", result_edit)
+                        )
 
-                case "delete_message":
-                    msg_id = data["message_id"]
-                    result_delete = await delete_message(msg_id, db, current_user)
-                    online_users = manager.get_online_users_in_room(room_id)
-                    await manager.broadcast_to_room(
-                        user_ids=online_users,
-                        message={
-                            "type": "message_deleted",
-                            "data": result_delete.model_dump(mode="json"),
-                        },
-                    )
+                    case "delete_message":
+                        msg_id = data["message_id"]
+                        try:
+                            result_delete = await delete_message(
+                                msg_id, db, redis, current_user
+                            )
+                        except ValueError:
+                            continue
+                        await manager.publish_to_room(
+                            room_id=room_id,
+                            frame=Frame("message_deleted", result_delete),
+                        )
 
     except WebSocketDisconnect:
-        manager.disconnect(current_user.id)
+        pass
+    finally:
+        await manager.disconnect(connection)
@@ -13,18 +13,32 @@ def ws_chat_docs():  # type: ignore[no-untyped-def]
     return {
         "endpoint": "ws://your-domain/ws/chat/{room_id}",
         "description": "WebSocket connection to chat rooms",
+        "subprotocols": {
+            "chat.json.v1": "JSON text frames (default)",
+            "chat.msgpack.v1": "MessagePack binary frames, same schema",
+        },
         "actions": {
             "send_message": {
                 "data": {"room_id": "int", "text": "str"},
                 "response": {"type": "new_message", "data": "Message schema"},
             },
             "get_messages": {
-                "response": {"type": "message_history", "data": "[Message schema]"}
+                "pagination": {
+                    "limit": "int, optional",
+                    "offset": "int, optional",
+                    "before": "str, optional: cursor, empty for the newest page",
+                    "after": "str, optional: cursor",
+                },
+                "response": {"type": "message_history", "data": "[Message schema]"},
             },
             "get_message": {
                 "message_id": "int",
                 "response": {"type": "message_detail", "data": "Message schema"},
             },
+            "message_delivered": {
+                "message_id": "int",
+                "description": "Ack of a received new_message, no response",
+            },
             "edit_message": {
                 "data": {"message_id": "int", "text": "str"},
                 "response": {"type": "message_edited", "data": "Message schema"},
@@ -33,5 +47,21 @@ def ws_chat_docs():  # type: ignore[no-untyped-def]
                 "message_id": "int",
                 "response": {"type": "message_deleted", "data": {"message_id": "int"}},
             },
+            "pong": {
+                "description": (
+                    "Answer to a server ping; once sent, the socket is closed "
+                    "after WS_IDLE_TIMEOUT without frames"
+                ),
+            },
+        },
+        "push_types": {
+            "ping": {
+                "description": (
+                    "Server heartbeat; idle sockets are closed with 1001 after "
+                    "WS_IDLE_TIMEOUT once they answered pong, WS_SILENT_TIMEOUT "
+                    "otherwise"
+                ),
+                "data": {},
+            },
         },
     }
@@ -1,34 +1,151 @@
-import io
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, BinaryIO, Callable, TypeVar
 from uuid import uuid4
 
+import urllib3
 from minio import Minio
 
 from src.config import settings
 
+logger = logging.getLogger(__name__)
 
-def get_minio_client() -> Minio:
-    return Minio(
-        settings.MINIO_ENDPOINT,
-        access_key=settings.MINIO_ACCESS_KEY,
-        secret_key=settings.MINIO_SECRET_KEY,
-        secure=False,
-    )
+T = TypeVar("T")
 
 
-def upload_file_to_minio(file_data: bytes, filename: str, content_type: str) -> str:
-    client = get_minio_client()
+class StorageEngine:
+    """One MinIO client and a bounded worker pool shared by every upload.
 
-    bucket = settings.MINIO_BUCKET_NAME
-    if not client.bucket_exists(bucket):
-        client.make_bucket(bucket)
+    The SDK is blocking, so transfers run in the pool rather than on the event
+    loop, and a semaphore caps how many uploads are in flight at once. Uploads
+    are streamed from the given file object (the `UploadFile` spool for request
+    uploads) in `MINIO_PART_SIZE` chunks, which makes anything larger than one
+    part a multipart upload.
+    """
 
-    unique_filename = f"{uuid4()}_{filename}"
-    client.put_object(
-        bucket,
-        unique_filename,
-        data=io.BytesIO(file_data),
-        length=len(file_data),
-        content_type=content_type,
-    )
+    def __init__(self) -> None:
+        self._client: Minio | None = None
+        self._http: urllib3.PoolManager | None = None
+        self._executor: ThreadPoolExecutor | None = None
+        self._semaphore: asyncio.Semaphore | None = None
+        self._bucket_ready = False
 
-    return f"http://{settings.MINIO_ENDPOINT}/{bucket}/{unique_filename}"
+    @property
+    def client(self) -> Minio:
+        if self._client is None:
+            self._http = urllib3.PoolManager(
+                maxsize=settings.MINIO_UPLOAD_CONCURRENCY,
+                timeout=urllib3.Timeout(
+                    connect=settings.HTTP_CONNECT_TIMEOUT,
+                    read=settings.MINIO_READ_TIMEOUT,
+                ),
+                retries=urllib3.Retry(
+                    total=3, backoff_factor=0.2, status_forcelist=[500, 502, 503, 504]
+                ),
+            )
+            self._client = Minio(
+                settings.MINIO_ENDPOINT,
+                access_key=settings.MINIO_ACCESS_KEY,
+                secret_key=settings.MINIO_SECRET_KEY,
+                secure=False,
+                http_client=self._http,
+            )
+        return self._client
+
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=settings.MINIO_UPLOAD_CONCURRENCY,
+                thread_name_prefix="minio",
+            )
+        return self._executor
+
+    @property
+    def semaphore(self) -> asyncio.Semaphore:
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(settings.MINIO_UPLOAD_CONCURRENCY)
+        return self._semaphore
+
+    async def start(self) -> None:
+        try:
+            await self._ensure_bucket()
+        except Exception as e:
+            logger.warning(f"Ошибка проверки бакета MinIO: {e}")
+
+    async def close(self) -> None:
+        if self._executor is not None:
+            # Waiting for in-flight uploads to drain must not block the loop
+            # that is still serving the rest of the shutdown.
+            await asyncio.to_thread(self._executor.shutdown, True)
+            self._executor = None
+        if self._http is not None:
+            self._http.clear()
+            self._http = None
+        self._client = None
+        self._bucket_ready = False
+
+    async def upload(
+        self, data: BinaryIO, filename: str, content_type: str, size: int | None
+    ) -> str:
+        if not self._bucket_ready:
+            await self._ensure_bucket()
+
+        bucket = settings.MINIO_BUCKET_NAME
+        object_name = f"{uuid4()}_{filename}"
+        async with self.semaphore:
+            await self._run(self._put, bucket, object_name, data, size, content_type)
+        return f"http://{settings.MINIO_ENDPOINT}/{bucket}/{object_name}"
+
+    async def remove(self, file_url: str) -> None:
+        bucket = settings.MINIO_BUCKET_NAME
+        object_name = file_url.removeprefix(
+            f"http://{settings.MINIO_ENDPOINT}/{bucket}/"
+        )
+        async with self.semaphore:
+            await self._run(self.client.remove_object, bucket, object_name)
+
+    async def _ensure_bucket(self) -> None:
+        bucket = settings.MINIO_BUCKET_NAME
+        if not await self._run(self.client.bucket_exists, bucket):
+            await self._run(self.client.make_bucket, bucket)
+        self._bucket_ready = True
+
+    def _put(
+        self,
+        bucket: str,
+        object_name: str,
+        data: BinaryIO,
+        size: int | None,
+        content_type: str,
+    ) -> None:
+        data.seek(0)
+        # One part in memory per upload; the pool is what bounds parallelism,
+        # so the SDK must not start threads of its own.
+        self.client.put_object(
+            bucket,
+            object_name,
+            data=data,
+            length=size if size is not None else -1,
+            content_type=content_type,
+            part_size=settings.MINIO_PART_SIZE,
+            num_parallel_uploads=1,
+        )
+
+    async def _run(self, func: Callable[..., T], *args: Any) -> T:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, func, *args)
+
+
+storage: StorageEngine = StorageEngine()
+
+
+async def upload_file_to_minio(
+    data: BinaryIO, filename: str, content_type: str, size: int | None = None
+) -> str:
+    return await storage.upload(data, filename, content_type, size)
+
+
+async def remove_file_from_minio(file_url: str) -> None:
+    await storage.remove(file_url)
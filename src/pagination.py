@@ -1,8 +1,76 @@
+import base64
+import datetime
+
 from pydantic import BaseModel, Field
 
 
 class Pagination(BaseModel):
-    limit: int = Field(default=20, le=100)
+    limit: int = Field(default=20, ge=1, le=100)
     offset: int = Field(default=0, ge=0)
 
     model_config = {"from_attributes": True}
+
+
+class MessagePagination(Pagination):
+    before: str | None = Field(
+        default=None,
+        description="Cursor of a message; returns the page just before it. "
+        "Pass an empty value to start from the newest message.",
+    )
+    after: str | None = Field(
+        default=None,
+        description="Cursor of a message; returns the page just after it.",
+    )
+
+    @property
+    def is_keyset(self) -> bool:
+        return self.before is not None or self.after is not None
+
+
+class SearchPagination(BaseModel):
+    limit: int = Field(default=20, ge=1, le=100)
+    cursor: str | None = Field(
+        default=None, description="Cursor of the last result of the previous page."
+    )
+
+
+def _encode(*parts: str) -> str:
+    raw = "|".join(parts).encode()
+    return base64.urlsafe_b64encode(raw).rstrip(b"=").decode()
+
+
+def _decode(cursor: str, size: int) -> list[str]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+    except ValueError:
+        raise ValueError("Invalid cursor")
+    parts = raw.split("|")
+    if len(parts) != size:
+        raise ValueError("Invalid cursor")
+    return parts
+
+
+def encode_cursor(created_at: datetime.datetime, row_id: int) -> str:
+    return _encode(created_at.isoformat(), str(row_id))
+
+
+def decode_cursor(cursor: str) -> tuple[datetime.datetime, int]:
+    created_at, row_id = _decode(cursor, 2)
+    try:
+        return datetime.datetime.fromisoformat(created_at), int(row_id)
+    except ValueError:
+        raise ValueError("Invalid cursor")
+
+
+def encode_search_cursor(
+    rank: float, created_at: datetime.datetime, row_id: int
+) -> str:
+    return _encode(repr(rank), created_at.isoformat(), str(row_id))
+
+
+def decode_search_cursor(cursor: str) -> tuple[float, datetime.datetime, int]:
+    rank, created_at, row_id = _decode(cursor, 3)
+    try:
+        return float(rank), datetime.datetime.fromisoformat(created_at), int(row_id)
+    except ValueError:
+        raise ValueError("Invalid cursor")
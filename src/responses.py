@@ -0,0 +1,13 @@
+from fastapi import Response
+
+
+def raw_json_response(content: bytes, response: Response) -> Response:
+    """Send already-encoded JSON as is, bypassing response_model serialisation.
+
+    Cookies set on the injected ``response`` (the token refresh) are carried
+    over, since FastAPI drops them when an endpoint returns its own Response.
+    """
+    raw = Response(content=content, media_type="application/json")
+    for cookie in response.headers.getlist("set-cookie"):
+        raw.headers.append("set-cookie", cookie)
+    return raw
@@ -0,0 +1,140 @@
+import datetime
+import logging
+
+from redis.asyncio import Redis
+from redis.exceptions import WatchError
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.constants import ROOM_MEMBERS_KEY, ROOM_MEMBERS_VERSION_KEY
+from src.core import RoomUser
+
+logger = logging.getLogger(__name__)
+
+# Room membership is mirrored into a sorted set per room (user id scored by
+# joined_at), so participant pages are a ZRANGE and membership is a ZSCORE.
+# A missing set means "not loaded yet", never "empty": writers only touch a
+# set that already exists, and readers rebuild a missing one from Postgres.
+# Every write bumps the room's version, and a rebuild is only stored if the
+# version did not move while it was reading, so a join or leave that races a
+# rebuild can't be lost.
+
+ADD_MEMBER_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 1 then
+    redis.call('ZADD', KEYS[1], ARGV[1], ARGV[2])
+end
+return redis.call('INCR', KEYS[2])
+"""
+
+REMOVE_MEMBER_SCRIPT = """
+redis.call('ZREM', KEYS[1], ARGV[1])
+return redis.call('INCR', KEYS[2])
+"""
+
+MEMBER_PAGE_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    return false
+end
+return redis.call('ZRANGE', KEYS[1], ARGV[1], ARGV[2], 'WITHSCORES')
+"""
+
+IS_MEMBER_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    return -1
+end
+if redis.call('ZSCORE', KEYS[1], ARGV[1]) then
+    return 1
+end
+return 0
+"""
+
+Members = list[tuple[int, datetime.datetime]]
+
+
+def member_keys(room_id: int) -> tuple[str, str]:
+    return (
+        ROOM_MEMBERS_KEY.format(room_id=room_id),
+        ROOM_MEMBERS_VERSION_KEY.format(room_id=room_id),
+    )
+
+
+async def add_room_member(
+    redis: Redis, room_id: int, user_id: int, joined_at: datetime.datetime
+) -> None:
+    await redis.eval(  # type: ignore[misc]
+        ADD_MEMBER_SCRIPT,
+        2,
+        *member_keys(room_id),
+        str(joined_at.timestamp()),
+        str(user_id),
+    )
+
+
+async def remove_room_member(redis: Redis, room_id: int, user_id: int) -> None:
+    await redis.eval(  # type: ignore[misc]
+        REMOVE_MEMBER_SCRIPT, 2, *member_keys(room_id), str(user_id)
+    )
+
+
+async def get_room_members(
+    room_id: int, db: AsyncSession, redis: Redis, offset: int, limit: int
+) -> Members:
+    # ZRANGE reads a negative stop as "from the end", so an empty page has to
+    # be answered here rather than turning into the whole set.
+    if limit < 1:
+        return []
+    key, _ = member_keys(room_id)
+    flat = await redis.eval(  # type: ignore[misc]
+        MEMBER_PAGE_SCRIPT, 1, key, str(offset), str(offset + limit - 1)
+    )
+    if flat is None:
+        return (await load_room_members(room_id, db, redis))[offset : offset + limit]
+    return [
+        (int(user_id), datetime.datetime.fromtimestamp(float(score)))
+        for user_id, score in zip(flat[::2], flat[1::2])
+    ]
+
+
+async def is_room_member(
+    room_id: int, user_id: int, db: AsyncSession, redis: Redis
+) -> bool:
+    key, _ = member_keys(room_id)
+    found = await redis.eval(  # type: ignore[misc]
+        IS_MEMBER_SCRIPT, 1, key, str(user_id)
+    )
+    if found == -1:
+        members = await load_room_members(room_id, db, redis)
+        return any(member_id == user_id for member_id, _ in members)
+    return bool(found)
+
+
+async def load_room_members(room_id: int, db: AsyncSession, redis: Redis) -> Members:
+    key, version_key = member_keys(room_id)
+    version = await redis.get(version_key)
+
+    result = await db.execute(
+        select(RoomUser.user_id, RoomUser.joined_at)
+        .where(RoomUser.room_id == room_id)
+        .order_by(RoomUser.joined_at, RoomUser.user_id)
+    )
+    members: Members = [(user_id, joined_at) for user_id, joined_at in result.all()]
+    if not members:
+        return members
+
+    try:
+        async with redis.pipeline(transaction=True) as pipe:
+            await pipe.watch(version_key)
+            if await pipe.get(version_key) != version:
+                return members
+            pipe.multi()  # type: ignore[no-untyped-call]
+            pipe.delete(key)
+            pipe.zadd(
+                key,
+                {str(user_id): joined_at.timestamp() for user_id, joined_at in members},
+            )
+            await pipe.execute()
+    except WatchError:
+        pass
+    except Exception as e:
+        logger.warning(f"Ошибка загрузки участников комнаты {room_id}: {e}")
+    return members
@@ -5,6 +5,7 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from src import Pagination, get_db, get_redis, settings
 from src.auth import get_current_user
 from src.core import User
+from src.responses import raw_json_response
 from src.rooms import service
 from src.rooms.schemas import (
     LeaveRoomResponse,
@@ -35,6 +36,7 @@ async def create_room(  # type: ignore[no-untyped-def]
     response: Response,
     result: tuple[User, str | None] = Depends(get_current_user),
     db: AsyncSession = Depends(get_db),
+    redis: Redis = Depends(get_redis),
 ):
     user, new_token = result
     if new_token:
@@ -47,7 +49,7 @@ async def create_room(  # type: ignore[no-untyped-def]
             domain=".mushysoft.online",
             max_age=settings.TOKEN_EXPIRE_SECONDS,
         )
-    return await service.create_room(data=data, db=db, current_user=user)
+    return await service.create_room(data=data, db=db, current_user=user, redis=redis)
 
 
 @router.post(
@@ -61,6 +63,7 @@ async def invite_user(  # type: ignore[no-untyped-def]
     response: Response,
     result: tuple[User, str | None] = Depends(get_current_user),
     db: AsyncSession = Depends(get_db),
+    redis: Redis = Depends(get_redis),
 ):
     user, new_token = result
     if new_token:
@@ -74,7 +77,9 @@ async def invite_user(  # type: ignore[no-untyped-def]
             max_age=settings.TOKEN_EXPIRE_SECONDS,
         )
     try:
-        return await service.invite_user(data=data, db=db, current_user=user)
+        return await service.invite_user(
+            data=data, db=db, current_user=user, redis=redis
+        )
     except PermissionError as e:
         raise HTTPException(status_code=403, detail=str(e))
 
@@ -103,9 +108,10 @@ async def get_sent_invitations(  # type: ignore[no-untyped-def]
             domain=".mushysoft.online",
             max_age=settings.TOKEN_EXPIRE_SECONDS,
         )
-    return await service.get_sent_invites(
+    content = await service.get_sent_invites(
         db=db, current_user=user, pagination=pagination, redis=redis
     )
+    return raw_json_response(content, response)
 
 
 @router.get(
@@ -132,9 +138,10 @@ async def received_invitations(  # type: ignore[no-untyped-def]
             domain=".mushysoft.online",
             max_age=settings.TOKEN_EXPIRE_SECONDS,
         )
-    return await service.get_received_invites(
+    content = await service.get_received_invites(
         db=db, current_user=user, pagination=pagination, redis=redis
     )
+    return raw_json_response(content, response)
 
 
 @router.post(
@@ -251,9 +258,10 @@ async def get_participants(  # type: ignore[no-untyped-def]
             domain=".mushysoft.online",
             max_age=settings.TOKEN_EXPIRE_SECONDS,
         )
-    return await service.get_room_participants(
+    content = await service.get_room_participants(
         room_id=room_id, db=db, pagination=pagination, redis=redis
     )
+    return raw_json_response(content, response)
 
 
 @router.get("/all", response_model=list[RoomWithLastMessageOut], status_code=200)
@@ -275,12 +283,13 @@ async def get_all_rooms(  # type: ignore[no-untyped-def]
             domain=".mushysoft.online",
             max_age=settings.TOKEN_EXPIRE_SECONDS,
         )
-    return await service.get_rooms(
+    content = await service.get_rooms(
         db=db,
         current_user=user,
         pagination=pagination,
         redis=redis,
     )
+    return raw_json_response(content, response)
 
 
 @router.patch(
@@ -295,6 +304,7 @@ async def patch_room(  # type: ignore[no-untyped-def]
     response: Response,
     result: tuple[User, str | None] = Depends(get_current_user),
     db: AsyncSession = Depends(get_db),
+    redis: Redis = Depends(get_redis),
 ):
     user, new_token = result
     if new_token:
@@ -308,7 +318,7 @@ async def patch_room(  # type: ignore[no-untyped-def]
             max_age=settings.TOKEN_EXPIRE_SECONDS,
         )
     return await service.update_room(
-        room_id=room_id, data=data, db=db, current_user=user
+        room_id=room_id, data=data, db=db, current_user=user, redis=redis
     )
 
 
@@ -349,6 +359,7 @@ async def join_public_room(  # type: ignore[no-untyped-def]
     response: Response,
     result: tuple[User, str | None] = Depends(get_current_user),
     db: AsyncSession = Depends(get_db),
+    redis: Redis = Depends(get_redis),
 ):
     user, new_token = result
     if new_token:
@@ -361,4 +372,6 @@ async def join_public_room(  # type: ignore[no-untyped-def]
             domain=".mushysoft.online",
             max_age=settings.TOKEN_EXPIRE_SECONDS,
         )
-    return await service.join_public_room(room_id=room_id, db=db, current_user=user)
+    return await service.join_public_room(
+        room_id=room_id, db=db, current_user=user, redis=redis
+    )
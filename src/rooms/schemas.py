@@ -70,6 +70,7 @@ class RoomWithLastMessageOut(BaseModel):
     created_by: int
     created_at: datetime
     last_message: LastMessageOut | None
+    unread_count: int = 0
 
     model_config = {"from_attributes": True}
 
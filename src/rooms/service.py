@@ -1,23 +1,41 @@
 import datetime
-import json
-from typing import Optional
+from typing import Any, Optional
 
+import orjson
 from fastapi import HTTPException
 from redis.asyncio import Redis
-from sqlalchemy import delete, or_, select, update
+from sqlalchemy import Select, case, delete, exists, or_, select, update
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import aliased
 
 from src import Pagination
 from src.cache import (
-    delete_cached_participants,
-    get_cached_invites,
-    get_cached_participants,
-    get_cached_rooms,
-    set_cached_invites,
-    set_cached_participants,
-    set_cached_rooms,
+    bump_cache_versions,
+    invites_cache,
+    rooms_cache,
+    versioned_key,
+)
+from src.constants import (
+    INVITES_VERSION_KEY,
+    ROOMS_VERSION_KEY,
+    TEMP_INVITES_KEY,
+    TEMP_ROOMS_KEY,
+)
+from src.core import (
+    HiddenMessage,
+    Message,
+    Room,
+    RoomInvitation,
+    RoomInvitationStatus,
+    RoomUser,
+    User,
+)
+from src.rooms.members import (
+    add_room_member,
+    get_room_members,
+    is_room_member,
+    remove_room_member,
 )
-from src.core import Message, Room, RoomInvitation, RoomInvitationStatus, RoomUser, User
 from src.rooms.schemas import (
     LastMessageOut,
     LeaveRoomResponse,
@@ -30,16 +48,51 @@ from src.rooms.schemas import (
     RoomInviteRespondResponse,
     RoomInviteResponse,
     RoomJoinResponse,
-    RoomParticipantOut,
     RoomSearchResponse,
     RoomUpdateRequest,
     RoomUpdateResponse,
     RoomWithLastMessageOut,
 )
+from src.unread import get_unread_counts
+
+
+def user_rooms_with_last_message(user_id: int) -> Select[tuple[Room, Message]]:
+    # rooms.last_message_id is kept up to date by send_message, so the whole
+    # list is one join instead of a "latest message" query per room. Only when
+    # the member hid that message does the room fall back to their newest
+    # visible one, a single index probe that CASE evaluates for those rooms
+    # alone.
+    hidden = HiddenMessage.user_id == user_id
+    candidate = aliased(Message)
+    latest_visible = (
+        select(candidate.id)
+        .where(
+            candidate.room_id == Room.id,
+            candidate.created_at >= RoomUser.joined_at,
+            ~exists().where(HiddenMessage.message_id == candidate.id, hidden),
+        )
+        .order_by(candidate.created_at.desc(), candidate.id.desc())
+        .limit(1)
+        .scalar_subquery()
+    )
+    last_message_id = case(
+        (
+            exists().where(HiddenMessage.message_id == Room.last_message_id, hidden),
+            latest_visible,
+        ),
+        else_=Room.last_message_id,
+    )
+    return (
+        select(Room, Message)
+        .join(RoomUser, RoomUser.room_id == Room.id)
+        .outerjoin(Message, Message.id == last_message_id)
+        .where(RoomUser.user_id == user_id)
+        .order_by(Room.last_activity_at.desc(), Room.id.desc())
+    )
 
 
 async def create_room(
-    data: RoomCreateRequest, db: AsyncSession, current_user: User
+    data: RoomCreateRequest, db: AsyncSession, current_user: User, redis: Redis
 ) -> RoomCreateResponse:
     new_room = Room(
         name=data.name,
@@ -51,14 +104,17 @@ async def create_room(
     db.add(new_room)
     await db.flush()
 
+    joined_at = datetime.datetime.now()
     db.add(
         RoomUser(
             room_id=new_room.id,
             user_id=current_user.id,
-            joined_at=datetime.datetime.now(),
+            joined_at=joined_at,
         )
     )
     await db.commit()
+    await add_room_member(redis, new_room.id, current_user.id, joined_at)
+    await bump_cache_versions(redis, rooms=[current_user.id])
     return RoomCreateResponse(
         id=new_room.id,
         name=new_room.name,
@@ -70,14 +126,9 @@ async def create_room(
 
 
 async def invite_user(
-    data: RoomInviteRequest, db: AsyncSession, current_user: User
+    data: RoomInviteRequest, db: AsyncSession, current_user: User, redis: Redis
 ) -> RoomInviteResponse:
-    result = await db.execute(
-        select(RoomUser).where(
-            RoomUser.room_id == data.room_id, RoomUser.user_id == current_user.id
-        )
-    )
-    if not result.scalar_one_or_none():
+    if not await is_room_member(data.room_id, current_user.id, db, redis):
         raise PermissionError("You are not a member of this rooms")
 
     invitation = RoomInvitation(
@@ -97,95 +148,78 @@ async def invite_user(
         )
     )
     await db.commit()
+    await bump_cache_versions(redis, invites=[current_user.id, data.receiver_id])
     return RoomInviteResponse(invitation_id=invitation.id)
 
 
 async def get_sent_invites(
     db: AsyncSession, current_user: User, pagination: Pagination, redis: Redis
-) -> list[RoomInvitationOut] | None:
-    cached = await get_cached_invites(
-        redis,
-        current_user.id,
-        sent=True,
-        limit=pagination.limit,
-        offset=pagination.offset,
-    )
-    if cached:
-        return [RoomInvitationOut.model_validate(json.loads(c)) for c in cached]
-
-    result = await db.execute(
-        select(RoomInvitation)
-        .join(RoomInvitationStatus)
-        .where(RoomInvitation.sender_id == current_user.id)
-        .limit(pagination.limit)
-        .offset(pagination.offset)
-    )
-    invites = result.scalars().all()
-
-    data = [
-        RoomInvitationOut(
-            id=i.id,
-            room_id=i.room_id,
-            sender_id=i.sender_id,
-            receiver_id=i.receiver_id,
-            status=i.status.status,
-            created_at=i.created_at,
+) -> bytes:
+    async def load() -> list[dict[str, Any]]:
+        result = await db.execute(
+            select(RoomInvitation)
+            .join(RoomInvitationStatus)
+            .where(RoomInvitation.sender_id == current_user.id)
+            .limit(pagination.limit)
+            .offset(pagination.offset)
         )
-        for i in invites
-    ]
-    await set_cached_invites(
-        redis=redis,
+        return [
+            RoomInvitationOut(
+                id=i.id,
+                room_id=i.room_id,
+                sender_id=i.sender_id,
+                receiver_id=i.receiver_id,
+                status=i.status.status,
+                created_at=i.created_at,
+            ).model_dump(mode="json")
+            for i in result.scalars().all()
+        ]
+
+    key = await versioned_key(
+        redis,
+        INVITES_VERSION_KEY.format(user_id=current_user.id),
+        TEMP_INVITES_KEY,
         user_id=current_user.id,
-        sent=True,
+        prefix="sent",
         limit=pagination.limit,
         offset=pagination.offset,
-        data=[i.model_dump_json() for i in data],
     )
-    return data
+    return await invites_cache.get_or_load(redis, key, load)
 
 
 async def get_received_invites(
     db: AsyncSession, current_user: User, pagination: Pagination, redis: Redis
-) -> list[RoomInvitationOut] | None:
-    cached = await get_cached_invites(
-        redis=redis,
-        user_id=current_user.id,
-        sent=False,
-        limit=pagination.limit,
-        offset=pagination.offset,
-    )
-    if cached:
-        return [RoomInvitationOut.model_validate(json.loads(c)) for c in cached]
-
-    result = await db.execute(
-        select(RoomInvitation)
-        .join(RoomInvitationStatus)
-        .where(RoomInvitation.receiver_id == current_user.id)
-        .limit(pagination.limit)
-        .offset(pagination.offset)
-    )
-    invites = result.scalars().all()
-
-    data = [
-        RoomInvitationOut(
-            id=i.id,
-            room_id=i.room_id,
-            sender_id=i.sender_id,
-            receiver_id=i.receiver_id,
-            status=i.status.status,
-            created_at=i.created_at,
+) -> bytes:
+    async def load() -> list[dict[str, Any]]:
+        result = await db.execute(
+            select(RoomInvitation)
+            .join(RoomInvitationStatus)
+            .where(RoomInvitation.receiver_id == current_user.id)
+            .limit(pagination.limit)
+            .offset(pagination.offset)
         )
-        for i in invites
-    ]
-    await set_cached_invites(
-        redis=redis,
+        return [
+            RoomInvitationOut(
+                id=i.id,
+                room_id=i.room_id,
+                sender_id=i.sender_id,
+                receiver_id=i.receiver_id,
+                status=i.status.status,
+                created_at=i.created_at,
+            ).model_dump(mode="json")
+            for i in result.scalars().all()
+        ]
+
+    key = await versioned_key(
+        redis,
+        INVITES_VERSION_KEY.format(user_id=current_user.id),
+        TEMP_INVITES_KEY,
         user_id=current_user.id,
-        sent=False,
+        prefix="received",
         limit=pagination.limit,
         offset=pagination.offset,
-        data=[i.model_dump_json() for i in data],
     )
-    return data
+    return await invites_cache.get_or_load(redis, key, load)
 
 
 async def respond_to_invite(
@@ -206,17 +240,24 @@ async def respond_to_invite(
         .values(status=status, updated_at=datetime.datetime.now())
     )
 
+    joined_at = datetime.datetime.now()
     if data.accept:
         db.add(
             RoomUser(
                 room_id=invitation.room_id,
                 user_id=current_user.id,
-                joined_at=datetime.datetime.now(),
+                joined_at=joined_at,
             )
         )
-        await delete_cached_participants(redis=redis, room_id=invitation.room_id)
 
     await db.commit()
+    if data.accept:
+        await add_room_member(redis, invitation.room_id, current_user.id, joined_at)
+    await bump_cache_versions(
+        redis,
+        rooms=[current_user.id] if data.accept else [],
+        invites=[invitation.sender_id, current_user.id],
+    )
     return RoomInviteRespondResponse(status=status)
 
 
@@ -233,7 +274,8 @@ async def remove_user_from_room(
         delete(RoomUser).where(RoomUser.room_id == room_id, RoomUser.user_id == user_id)
     )
     await db.commit()
-    await delete_cached_participants(redis=redis, room_id=room_id)
+    await remove_room_member(redis, room_id, user_id)
+    await bump_cache_versions(redis, rooms=[user_id])
     return RemoveUserResponse()
 
 
@@ -246,31 +288,20 @@ async def leave_room(
         )
     )
     await db.commit()
-    await delete_cached_participants(redis=redis, room_id=room_id)
+    await remove_room_member(redis, room_id, current_user.id)
+    await bump_cache_versions(redis, rooms=[current_user.id])
     return LeaveRoomResponse()
 
 
 async def get_room_participants(
     room_id: int, db: AsyncSession, pagination: Pagination, redis: Redis
-) -> list[RoomParticipantOut] | None:
-    cached = await get_cached_participants(redis, room_id)
-    if cached:
-        return [RoomParticipantOut.model_validate(json.loads(c)) for c in cached]
-
-    result = await db.execute(
-        select(RoomUser)
-        .where(RoomUser.room_id == room_id)
-        .limit(pagination.limit)
-        .offset(pagination.offset)
+) -> bytes:
+    members = await get_room_members(
+        room_id, db, redis, pagination.offset, pagination.limit
     )
-    participants = result.scalars().all()
-
-    data = [RoomParticipantOut.model_validate(p) for p in participants]
-
-    await set_cached_participants(
-        redis=redis, room_id=room_id, data=[i.model_dump_json() for i in data]
+    return orjson.dumps(
+        [{"user_id": user_id, "joined_at": joined_at} for user_id, joined_at in members]
     )
-    return data
 
 
 async def get_rooms(
@@ -278,33 +309,14 @@ async def get_rooms(
     redis: Redis,
     current_user: User,
     pagination: Pagination,
-) -> list[RoomWithLastMessageOut] | None:
-    cached = await get_cached_rooms(
-        redis, current_user.id, pagination.limit, pagination.offset
-    )
-    if cached:
-        return [RoomWithLastMessageOut.model_validate(json.loads(c)) for c in cached]
-
-    result = await db.execute(
-        select(Room)
-        .join(RoomUser)
-        .where(RoomUser.user_id == current_user.id)
-        .limit(pagination.limit)
-        .offset(pagination.offset)
-    )
-    rooms = result.scalars().all()
-
-    room_data = []
-    for room in rooms:
-        msg_result = await db.execute(
-            select(Message)
-            .where(Message.room_id == room.id)
-            .order_by(Message.created_at.desc())
-            .limit(1)
+) -> bytes:
+    async def load() -> list[dict[str, Any]]:
+        result = await db.execute(
+            user_rooms_with_last_message(current_user.id)
+            .limit(pagination.limit)
+            .offset(pagination.offset)
         )
-        last_msg = msg_result.scalar_one_or_none()
-
-        room_data.append(
+        return [
             RoomWithLastMessageOut(
                 id=room.id,
                 name=room.name,
@@ -321,21 +333,37 @@ async def get_rooms(
                     if last_msg
                     else None
                 ),
-            )
-        )
+            ).model_dump(mode="json")
+            for room, last_msg in result.all()
+        ]
 
-    await set_cached_rooms(
-        redis=redis,
+    key = await versioned_key(
+        redis,
+        ROOMS_VERSION_KEY.format(user_id=current_user.id),
+        TEMP_ROOMS_KEY,
         user_id=current_user.id,
         limit=pagination.limit,
         offset=pagination.offset,
-        data=[r.model_dump_json() for r in room_data],
     )
-    return room_data
+    content = await rooms_cache.get_or_load(redis, key, load)
+
+    # Unread counts change on every message, so the cached page carries zeros
+    # and only users with unread rooms pay for patching them in.
+    unread = await get_unread_counts(redis, current_user.id)
+    if not unread:
+        return content
+    rooms = orjson.loads(content)
+    for room in rooms:
+        room["unread_count"] = unread.get(room["id"], 0)
+    return orjson.dumps(rooms)
 
 
 async def update_room(
-    room_id: int, data: RoomUpdateRequest, db: AsyncSession, current_user: User
+    room_id: int,
+    data: RoomUpdateRequest,
+    db: AsyncSession,
+    current_user: User,
+    redis: Redis,
 ) -> RoomUpdateResponse:
     result = await db.execute(select(Room).where(Room.id == room_id))
     room = result.scalar_one_or_none()
@@ -356,6 +384,7 @@ async def update_room(
 
     room.updated_at = datetime.datetime.now()
     await db.commit()
+    await bump_cache_versions(redis, rooms=await get_room_user_ids(room_id, db))
     return RoomUpdateResponse()
 
 
@@ -403,6 +432,7 @@ async def join_public_room(
     room_id: int,
     db: AsyncSession,
     current_user: User,
+    redis: Redis,
 ) -> RoomJoinResponse:
     result = await db.execute(
         select(Room).where(Room.id == room_id, Room.is_private.is_(False))
@@ -411,19 +441,13 @@ async def join_public_room(
     if not room:
         raise ValueError("Room not found or not public")
 
-    result = await db.execute(
-        select(RoomUser).where(
-            RoomUser.room_id == room_id,
-            RoomUser.user_id == current_user.id,
-        )
-    )
-    if result.scalar_one_or_none():
-        RoomJoinResponse.model_validate(room)
-    new_participant = RoomUser(
-        room_id=room_id,
-        user_id=current_user.id,
-    )
-    db.add(new_participant)
+    if await is_room_member(room_id, current_user.id, db, redis):
+        return RoomJoinResponse.model_validate(room)
+
+    joined_at = datetime.datetime.now()
+    db.add(RoomUser(room_id=room_id, user_id=current_user.id, joined_at=joined_at))
     await db.commit()
+    await add_room_member(redis, room_id, current_user.id, joined_at)
+    await bump_cache_versions(redis, rooms=[current_user.id])
 
     return RoomJoinResponse.model_validate(room)
@@ -31,3 +31,27 @@ async def upload_file(  # type: ignore[no-untyped-def]
     return await service.upload_file(
         file=file, redis=redis, current_user=user, room_id=room_id
     )
+
+
+@router.post("/upload/batch", summary="Upload several files to MINIO")
+async def upload_files(  # type: ignore[no-untyped-def]
+    response: Response,
+    room_id: int,
+    result: tuple[User, str | None] = Depends(get_current_user),
+    files: list[UploadFile] = File(...),
+    redis: Redis = Depends(get_redis),
+):
+    user, new_token = result
+    if new_token:
+        response.set_cookie(
+            key="access_token",
+            value=new_token,
+            httponly=True,
+            secure=True,
+            samesite="none",
+            domain=".mushysoft.online",
+            max_age=settings.TOKEN_EXPIRE_SECONDS,
+        )
+    return await service.upload_files(
+        files=files, redis=redis, current_user=user, room_id=room_id
+    )
@@ -1,18 +1,54 @@
+import asyncio
+import logging
+
 from fastapi import UploadFile
 from redis.asyncio import Redis
 
-from src import add_file_to_temp_redis, upload_file_to_minio
+from src import (
+    add_file_to_temp_redis,
+    add_files_to_temp_redis,
+    remove_file_from_minio,
+    upload_file_to_minio,
+)
 from src.core import User
 
+logger = logging.getLogger(__name__)
 
-async def upload_file(
-    room_id: int, file: UploadFile, redis: Redis, current_user: User
-) -> dict[str, str]:
-    content = await file.read()
-    file_url = upload_file_to_minio(
-        content,
+
+async def upload_to_minio(file: UploadFile) -> str:
+    return await upload_file_to_minio(
+        file.file,
         file.filename if file.filename else "None",
         file.content_type if file.content_type else "None",
+        file.size,
     )
+
+
+async def upload_file(
+    room_id: int, file: UploadFile, redis: Redis, current_user: User
+) -> dict[str, str]:
+    file_url = await upload_to_minio(file)
     await add_file_to_temp_redis(redis, current_user.id, file_url, room_id)
     return {"file_url": file_url}
+
+
+async def upload_files(
+    room_id: int, files: list[UploadFile], redis: Redis, current_user: User
+) -> dict[str, list[str]]:
+    results = await asyncio.gather(
+        *(upload_to_minio(file) for file in files), return_exceptions=True
+    )
+    file_urls = [result for result in results if isinstance(result, str)]
+    errors = [result for result in results if isinstance(result, BaseException)]
+    if errors:
+        # The batch is all or nothing: drop what already made it to the bucket.
+        removed = await asyncio.gather(
+            *(remove_file_from_minio(url) for url in file_urls),
+            return_exceptions=True,
+        )
+        for url, result in zip(file_urls, removed):
+            if isinstance(result, BaseException):
+                logger.warning(f"Ошибка удаления файла {url} из MinIO: {result}")
+        raise errors[0]
+    await add_files_to_temp_redis(redis, current_user.id, room_id, file_urls)
+    return {"file_urls": file_urls}
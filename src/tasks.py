@@ -0,0 +1,38 @@
+import asyncio
+import logging
+from typing import Awaitable, Callable
+
+logger = logging.getLogger(__name__)
+
+
+class PeriodicTask:
+    """Runs a job every `interval` seconds until stopped."""
+
+    def __init__(
+        self, name: str, interval: float, job: Callable[[], Awaitable[object]]
+    ) -> None:
+        self.name = name
+        self.interval = interval
+        self.job = job
+        self._task: asyncio.Task[None] | None = None
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.job()
+            except Exception as e:
+                logger.warning(f"Ошибка фоновой задачи {self.name}: {e}")
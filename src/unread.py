@@ -0,0 +1,109 @@
+import logging
+from typing import Iterable
+
+from redis.asyncio import Redis
+from sqlalchemy import and_, exists, func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.constants import UNREAD_KEY
+from src.core import HiddenMessage, Message, RoomUser
+
+logger = logging.getLogger(__name__)
+
+# Unread badges live in one Redis hash per user (room id -> count): sends bump
+# the other members' counters, reading the newest page clears the field, and
+# reconcile() rebuilds the hashes from the read watermarks in Postgres.
+
+# Writes the recomputed counts, but only into fields still holding the value
+# read before the recompute: a field bumped or cleared meanwhile keeps the
+# newer value and is corrected by the next reconcile.
+# ARGV: field, value before the recompute ('' when absent), new count, ...
+RECONCILE_SCRIPT = """
+for i = 1, #ARGV, 3 do
+    local current = redis.call('HGET', KEYS[1], ARGV[i]) or ''
+    if current == ARGV[i + 1] then
+        if ARGV[i + 2] == '0' then
+            redis.call('HDEL', KEYS[1], ARGV[i])
+        else
+            redis.call('HSET', KEYS[1], ARGV[i], ARGV[i + 2])
+        end
+    end
+end
+"""
+
+
+async def increment_unread(redis: Redis, room_id: int, user_ids: Iterable[int]) -> None:
+    try:
+        async with redis.pipeline(transaction=False) as pipe:
+            for user_id in user_ids:
+                pipe.hincrby(UNREAD_KEY.format(user_id=user_id), str(room_id), 1)
+            await pipe.execute()
+    except Exception as e:
+        logger.warning(f"Ошибка обновления счетчиков непрочитанных: {e}")
+
+
+async def reset_unread(redis: Redis, user_id: int, room_id: int) -> None:
+    try:
+        await redis.hdel(  # type: ignore[misc]
+            UNREAD_KEY.format(user_id=user_id), str(room_id)
+        )
+    except Exception as e:
+        logger.warning(f"Ошибка сброса счетчика непрочитанных: {e}")
+
+
+async def get_unread_counts(redis: Redis, user_id: int) -> dict[int, int]:
+    try:
+        counts = await redis.hgetall(  # type: ignore[misc]
+            UNREAD_KEY.format(user_id=user_id)
+        )
+    except Exception as e:
+        logger.warning(f"Ошибка чтения счетчиков непрочитанных: {e}")
+        return {}
+    return {int(room_id): int(count) for room_id, count in counts.items()}
+
+
+async def reconcile_unread(user_ids: list[int], db: AsyncSession, redis: Redis) -> None:
+    if not user_ids:
+        return
+
+    keys = [UNREAD_KEY.format(user_id=user_id) for user_id in user_ids]
+    async with redis.pipeline(transaction=False) as pipe:
+        for key in keys:
+            pipe.hgetall(key)
+        snapshots: list[dict[str, str]] = await pipe.execute()
+
+    result = await db.execute(
+        select(RoomUser.user_id, RoomUser.room_id, func.count(Message.id))
+        .join(
+            Message,
+            and_(
+                Message.room_id == RoomUser.room_id,
+                Message.id > func.coalesce(RoomUser.last_read_message_id, 0),
+                Message.created_at >= RoomUser.joined_at,
+                Message.sender_id != RoomUser.user_id,
+            ),
+        )
+        .where(
+            RoomUser.user_id.in_(user_ids),
+            ~exists().where(
+                HiddenMessage.message_id == Message.id,
+                HiddenMessage.user_id == RoomUser.user_id,
+            ),
+        )
+        .group_by(RoomUser.user_id, RoomUser.room_id)
+    )
+    counts: dict[int, dict[str, int]] = {user_id: {} for user_id in user_ids}
+    for user_id, room_id, count in result.all():
+        counts[user_id][str(room_id)] = count
+
+    async with redis.pipeline(transaction=False) as pipe:
+        for user_id, key, snapshot in zip(user_ids, keys, snapshots):
+            rooms = counts[user_id]
+            args = [
+                str(value)
+                for room_id in snapshot.keys() | rooms.keys()
+                for value in (room_id, snapshot.get(room_id, ""), rooms.get(room_id, 0))
+            ]
+            if args:
+                pipe.eval(RECONCILE_SCRIPT, 1, key, *args)
+        await pipe.execute()
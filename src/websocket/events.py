@@ -0,0 +1,39 @@
+from typing import Any
+
+from src.events import (
+    MESSAGE_DELETED,
+    MESSAGE_SENT,
+    MESSAGE_UPDATED,
+    USER_OFFLINE,
+    USER_ONLINE,
+    bus,
+)
+from src.frames import Frame
+from src.websocket.manager import manager
+
+
+async def push_last_message(payload: dict[str, Any]) -> None:
+    frame = Frame(
+        "last_message_update",
+        {"room_id": payload["room_id"], "last_message": payload["last_message"]},
+    )
+    await manager.push(payload["user_ids"], frame)
+
+
+async def push_user_online(payload: dict[str, Any]) -> None:
+    await manager.push(
+        payload["user_ids"], Frame("user_online", {"user_id": payload["user_id"]})
+    )
+
+
+async def push_user_offline(payload: dict[str, Any]) -> None:
+    await manager.push(
+        payload["user_ids"], Frame("user_offline", {"user_id": payload["user_id"]})
+    )
+
+
+def register_push_handlers() -> None:
+    for event in (MESSAGE_SENT, MESSAGE_UPDATED, MESSAGE_DELETED):
+        bus.subscribe(event, push_last_message)
+    bus.subscribe(USER_ONLINE, push_user_online)
+    bus.subscribe(USER_OFFLINE, push_user_offline)
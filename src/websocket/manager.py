@@ -1,32 +1,64 @@
-from typing import Any, Dict
-
 from fastapi import WebSocket
 
+from src.broker import LocalBroker, create_broker, user_channel
+from src.cache import redis_client
+from src.connections import (
+    Connection,
+    ConnectionMetrics,
+    ConnectionRegistry,
+    heartbeat,
+)
+from src.frames import Frame
+from src.websocket.service import refresh_presence
+
 
 class GlobalConnectionManager:
-    def __init__(self) -> None:
-        self.active_connections: Dict[int, WebSocket] = {}
+    def __init__(self, broker: LocalBroker) -> None:
+        self.registry = ConnectionRegistry()
+        self.active_connections = self.registry.users
+        self.metrics = ConnectionMetrics()
+        self.broker = broker
+        self.broker.set_handler(self.send_personal_message)
 
-    async def connect(self, user_id: int, websocket: WebSocket) -> None:
-        await websocket.accept()
-        self.active_connections[user_id] = websocket
+    async def connect(self, user_id: int, websocket: WebSocket) -> Connection:
+        connection = await Connection.accept(websocket, user_id)
+        if self.registry.add(connection):
+            await self.broker.subscribe(user_id)
+        return connection
 
-    def disconnect(self, user_id: int) -> None:
-        self.active_connections.pop(user_id, None)
+    async def disconnect(self, connection: Connection, code: int | None = None) -> None:
+        if not self.registry.contains(connection):
+            return
+        self.registry.remove(connection)
+        if not self.registry.is_online(connection.user_id):
+            await self.broker.unsubscribe(connection.user_id)
+        await connection.close(code)
+        self.metrics.retire(connection)
 
     def has_connection(self, user_id: int) -> bool:
-        return user_id in self.active_connections
+        return self.registry.is_online(user_id)
 
-    async def send_personal_message(
-        self, user_id: int, message: dict[str, Any]
-    ) -> None:
-        ws = self.active_connections.get(user_id)
-        if ws:
-            await ws.send_json(message)
+    async def send_personal_message(self, user_id: int, frame: Frame) -> None:
+        for connection in self.registry.get(user_id):
+            connection.send(frame)
 
-    async def broadcast(self, user_ids: list[int], message: dict[str, Any]) -> None:
+    async def broadcast(self, user_ids: list[int], frame: Frame) -> None:
         for uid in user_ids:
-            await self.send_personal_message(uid, message)
+            await self.send_personal_message(uid, frame)
+
+    async def push(self, user_ids: list[int], frame: Frame) -> None:
+        await self.broker.publish_many(user_ids, frame)
+
+    async def heartbeat(self) -> int:
+        reaped = await heartbeat(self.registry.connections(), self.disconnect)
+        self.metrics.reaped += reaped
+        await refresh_presence(list(self.registry.users), redis_client)
+        return reaped
+
+    def stats(self) -> dict[str, int]:
+        return self.metrics.snapshot(self.registry.connections())
 
 
-manager: GlobalConnectionManager = GlobalConnectionManager()
+manager: GlobalConnectionManager = GlobalConnectionManager(
+    broker=create_broker(user_channel)
+)
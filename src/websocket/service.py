@@ -1,28 +1,160 @@
 import datetime
+import logging
+import os
+import socket
+import time
+from typing import Any
 
-from sqlalchemy import select
+from redis.asyncio import Redis
+from sqlalchemy import func, select, update
+from sqlalchemy.dialects.postgresql import insert
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import aliased
 
-from src.core import UserStatus
+from src.config import settings
+from src.constants import PRESENCE_KEY
+from src.core import Room, RoomUser, UserStatus
+from src.events import USER_OFFLINE, USER_ONLINE, bus
+from src.rooms.service import user_rooms_with_last_message
+from src.unread import get_unread_counts
 
+logger = logging.getLogger(__name__)
 
-async def set_user_active(user_id: int, db: AsyncSession) -> None:
-    result = await db.execute(select(UserStatus).where(UserStatus.user_id == user_id))
-    status = result.scalar_one_or_none()
+# Presence is a Redis hash per user holding one lease per worker, so a user
+# stays online while any worker still refreshes its lease for them.
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"
 
-    if status:
-        status.status = "active"
-    else:
-        db.add(UserStatus(user_id=user_id, status="active"))
+# Latest status per user waiting to be written to Postgres by the flusher.
+pending_statuses: dict[int, tuple[str, datetime.datetime]] = {}
 
+
+async def set_user_active(user_id: int, redis: Redis, db: AsyncSession) -> None:
+    was_online = bool(await get_online_users([user_id], redis))
+    await refresh_presence([user_id], redis)
+    pending_statuses[user_id] = ("active", datetime.datetime.now())
+    if not was_online:
+        await emit_presence(USER_ONLINE, user_id, db)
+
+
+async def set_user_offline(user_id: int, redis: Redis, db: AsyncSession) -> None:
+    key = PRESENCE_KEY.format(user_id=user_id)
+    await redis.hdel(key, WORKER_ID)  # type: ignore[misc]
+    pending_statuses[user_id] = ("offline", datetime.datetime.now())
+    if not await get_online_users([user_id], redis):
+        await emit_presence(USER_OFFLINE, user_id, db)
+
+
+async def get_room_list(
+    user_id: int, db: AsyncSession, redis: Redis
+) -> list[dict[str, Any]]:
+    result = await db.execute(user_rooms_with_last_message(user_id))
+    unread = await get_unread_counts(redis, user_id)
+    return [
+        {
+            "id": room.id,
+            "name": room.name,
+            "unread_count": unread.get(room.id, 0),
+            "last_message": (
+                {
+                    "id": last_msg.id,
+                    "content": last_msg.content,
+                    "created_at": last_msg.created_at.isoformat(),
+                    "sender_id": last_msg.sender_id,
+                }
+                if last_msg
+                else None
+            ),
+        }
+        for room, last_msg in result.all()
+    ]
+
+
+async def mark_rooms_delivered(user_id: int, db: AsyncSession) -> None:
+    # Loading the room list hands the client every room's last message.
+    await db.execute(
+        update(RoomUser)
+        .where(
+            RoomUser.user_id == user_id,
+            Room.id == RoomUser.room_id,
+            Room.last_message_id > func.coalesce(RoomUser.last_delivered_message_id, 0),
+        )
+        .values(last_delivered_message_id=Room.last_message_id)
+    )
     await db.commit()
 
 
-async def set_user_offline(user_id: int, db: AsyncSession) -> None:
-    result = await db.execute(select(UserStatus).where(UserStatus.user_id == user_id))
-    status = result.scalar_one_or_none()
+async def get_contact_ids(user_id: int, db: AsyncSession) -> list[int]:
+    other = aliased(RoomUser)
+    result = await db.execute(
+        select(other.user_id)
+        .distinct()
+        .join(RoomUser, RoomUser.room_id == other.room_id)
+        .where(RoomUser.user_id == user_id, other.user_id != user_id)
+    )
+    return list(result.scalars().all())
+
+
+async def emit_presence(event: str, user_id: int, db: AsyncSession) -> None:
+    try:
+        contact_ids = await get_contact_ids(user_id, db)
+    except Exception as e:
+        logger.warning(f"Ошибка получения контактов пользователя {user_id}: {e}")
+        return
+    await bus.emit(event, {"user_id": user_id, "user_ids": contact_ids})
 
-    if status:
-        status.status = "offline"
-        status.updated_at = datetime.datetime.now()
+
+async def refresh_presence(user_ids: list[int], redis: Redis) -> None:
+    if not user_ids:
+        return
+    expires_at = str(time.time() + settings.PRESENCE_TTL)
+    async with redis.pipeline(transaction=False) as pipe:
+        for user_id in user_ids:
+            key = PRESENCE_KEY.format(user_id=user_id)
+            pipe.hset(key, WORKER_ID, expires_at)
+            pipe.expire(key, settings.PRESENCE_TTL)
+        await pipe.execute()
+
+
+async def get_online_users(user_ids: list[int], redis: Redis) -> set[int]:
+    if not user_ids:
+        return set()
+    async with redis.pipeline(transaction=False) as pipe:
+        for user_id in user_ids:
+            pipe.hvals(PRESENCE_KEY.format(user_id=user_id))
+        leases = await pipe.execute()
+
+    now = time.time()
+    return {
+        user_id
+        for user_id, expires in zip(user_ids, leases)
+        if any(float(e) > now for e in expires)
+    }
+
+
+async def flush_user_statuses(db: AsyncSession) -> int:
+    if not pending_statuses:
+        return 0
+
+    batch = dict(pending_statuses)
+    pending_statuses.clear()
+
+    stmt = insert(UserStatus).values(
+        [
+            {"user_id": user_id, "status": status, "updated_at": updated_at}
+            for user_id, (status, updated_at) in batch.items()
+        ]
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[UserStatus.user_id],
+        set_={"status": stmt.excluded.status, "updated_at": stmt.excluded.updated_at},
+    )
+    try:
+        await db.execute(stmt)
         await db.commit()
+    except Exception:
+        for user_id, entry in batch.items():
+            pending_statuses.setdefault(user_id, entry)
+        raise
+
+    logger.info(f"Сохранено статусов пользователей: {len(batch)}")
+    return len(batch)
@@ -1,12 +1,18 @@
 from fastapi import APIRouter, Depends, WebSocket, WebSocketDisconnect
-from sqlalchemy import select
-from sqlalchemy.ext.asyncio import AsyncSession
+from redis.asyncio import Redis
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
 
-from src import get_db
+from src import get_redis, get_session_maker
 from src.auth import get_current_user_ws
-from src.core import Message, Room, RoomUser, User
+from src.core import User
+from src.frames import Frame
 from src.websocket.manager import manager
-from src.websocket.service import set_user_active, set_user_offline
+from src.websocket.service import (
+    get_room_list,
+    mark_rooms_delivered,
+    set_user_active,
+    set_user_offline,
+)
 
 router = APIRouter(prefix="/ws", tags=["websocket"])
 
@@ -14,53 +20,29 @@ router = APIRouter(prefix="/ws", tags=["websocket"])
 @router.websocket("")
 async def global_ws(  # type: ignore[no-untyped-def]
     websocket: WebSocket,
-    db: AsyncSession = Depends(get_db),
+    sessions: async_sessionmaker[AsyncSession] = Depends(get_session_maker),
+    redis: Redis = Depends(get_redis),
     current_user: User = Depends(get_current_user_ws),
 ):
-    await manager.connect(current_user.id, websocket)
-    await set_user_active(current_user.id, db)
+    connection = await manager.connect(current_user.id, websocket)
+    async with sessions() as db:
+        await set_user_active(current_user.id, redis, db)
     try:
         while True:
-            data = await websocket.receive_json()
+            data = await connection.receive()
             action = data.get("action")
 
             match action:
                 case "get_room_list":
-                    result = await db.execute(
-                        select(Room)
-                        .join(RoomUser)
-                        .where(RoomUser.user_id == current_user.id)
-                    )
-                    rooms = result.scalars().all()
-                    room_data = []
-
-                    for room in rooms:
-                        msg_result = await db.execute(
-                            select(Message)
-                            .where(Message.room_id == room.id)
-                            .order_by(Message.created_at.desc())
-                            .limit(1)
-                        )
-                        last_msg = msg_result.scalar_one_or_none()
-                        room_data.append(
-                            {
-                                "id": room.id,
-                                "name": room.name,
-                                "last_message": (
-                                    {
-                                        "id": last_msg.id,
-                                        "content": last_msg.content,
-                                        "created_at": last_msg.created_at.isoformat(),
-                                        "sender_id": last_msg.sender_id,
-                                    }
-                                    if last_msg
-                                    else None
-                                ),
-                            }
-                        )
-
-                    await websocket.send_json({"type": "room_list", "data": room_data})
+                    async with sessions() as db:
+                        room_data = await get_room_list(current_user.id, db, redis)
+                        await mark_rooms_delivered(current_user.id, db)
+                    connection.send(Frame("room_list", room_data))
 
     except WebSocketDisconnect:
-        manager.disconnect(current_user.id)
-        await set_user_offline(current_user.id, db)
+        pass
+    finally:
+        await manager.disconnect(connection)
+        if not manager.has_connection(current_user.id):
+            async with sessions() as db:
+                await set_user_offline(current_user.id, redis, db)
@@ -13,6 +13,10 @@ def websocket_global_docs():  # type: ignore[no-untyped-def]
     return {
         "endpoint": "ws://your-domain/ws",
         "description": "Global WebSocket (online, preview, invites, etc.)",
+        "subprotocols": {
+            "chat.json.v1": "JSON text frames (default)",
+            "chat.msgpack.v1": "MessagePack binary frames, same schema",
+        },
         "actions": {
             "get_room_list": {
                 "description": "Receive room list with last messages",
@@ -35,6 +39,10 @@ def websocket_global_docs():  # type: ignore[no-untyped-def]
             }
         },
         "push_types": {
+            "ping": {
+                "description": "Server heartbeat, answer with {'action': 'pong'}",
+                "data": {},
+            },
             "last_message_update": {
                 "description": "Push-notification about last message update",
                 "data": {
@@ -1,12 +1,16 @@
 import json
-from unittest.mock import AsyncMock, MagicMock, patch
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock
 
 from fastapi.testclient import TestClient
 
 from src.auth.deps import get_current_user, get_current_user_ws
+from src.cache import TAKE_TEMP_FILES_SCRIPT, invites_cache, rooms_cache
 from src.deps import get_db as real_get_db
 from src.deps import get_redis as real_get_redis
+from src.deps import get_session_maker as real_get_session_maker
 from src.main import app
+from src.rooms.members import IS_MEMBER_SCRIPT, MEMBER_PAGE_SCRIPT
 from tests.mocks import (
     MockMessage,
     MockRoom,
@@ -17,7 +21,6 @@ from tests.mocks import (
 )
 
 
-# noinspection PyUnreachableCode
 def get_client(active_user: int = 1, for_ws: bool = False):
     mock_db = AsyncMock()
     mock_redis = AsyncMock()
@@ -58,6 +61,25 @@ def get_client(active_user: int = 1, for_ws: bool = False):
                     return mock_room_user
                 return None
 
+            def one(self):
+                if "new_message" not in str(query):
+                    return 0, 0
+                inserted = {
+                    getattr(column, "key", column): getattr(value, "value", value)
+                    for cte in query.get_final_froms()
+                    for column, value in (cte.element._values or {}).items()
+                }
+                return SimpleNamespace(
+                    **{**vars(mock_message), **inserted}, participant_ids=[1, 2]
+                )
+
+            def all(self):
+                if "ts_rank_cd" in str(query):
+                    return [(mock_message, 0.1, "<mark>Hello</mark>!")]
+                if "rooms.last_message_id" in str(query):
+                    return [(mock_room, mock_message)]
+                return []
+
             def scalars(self):
                 class Scalars:
                     def all(inner_self):
@@ -75,25 +97,30 @@ def get_client(active_user: int = 1, for_ws: bool = False):
 
     mock_db.execute.side_effect = db_execute_mock
 
-    mock_redis.get.return_value = json.dumps([])
-
-    mock_oauth = AsyncMock()
-    mock_oauth.__aenter__.return_value.get.return_value.status_code = 200
-    mock_oauth.__aenter__.return_value.get.return_value.json.return_value = {
-        "email": mock_user1.email if active_user == 1 else mock_user2.email,
-    }
-
-    with (
-        patch("src.auth.deps.AsyncOAuth2Client", return_value=mock_oauth),
-        patch("src.cache.get_cached_invites", return_value=[]),
-        patch("src.cache.get_cached_participants", return_value=[]),
-        patch("src.cache.get_cached_rooms", return_value=[]),
-    ):
-
-        app.dependency_overrides[real_get_db] = lambda: mock_db
-        app.dependency_overrides[real_get_redis] = lambda: mock_redis
-        app.dependency_overrides[get_current_user] = lambda: (current_user, None)
-        if for_ws:
-            app.dependency_overrides[get_current_user_ws] = lambda: current_user
-        return TestClient(app)
-        app.dependency_overrides = {}
+    mock_sessions = MagicMock()
+    mock_sessions.return_value.__aenter__.return_value = mock_db
+
+    mock_redis.get.return_value = None
+    mock_redis.execute_command.return_value = None
+    mock_redis.eval.side_effect = lambda script, *args: {
+        MEMBER_PAGE_SCRIPT: ["1", "1704067200.0"],
+        IS_MEMBER_SCRIPT: 1,
+        TAKE_TEMP_FILES_SCRIPT: [],
+    }.get(script)
+    mock_redis.hgetall.return_value = {"1": "3"}
+
+    mock_pipeline = MagicMock()
+    mock_pipeline.__aenter__.return_value = mock_pipeline
+    mock_pipeline.execute = AsyncMock(return_value=[])
+    mock_redis.pipeline = MagicMock(return_value=mock_pipeline)
+
+    for cache in (rooms_cache, invites_cache):
+        cache.clear()
+
+    app.dependency_overrides[real_get_db] = lambda: mock_db
+    app.dependency_overrides[real_get_redis] = lambda: mock_redis
+    app.dependency_overrides[real_get_session_maker] = lambda: mock_sessions
+    app.dependency_overrides[get_current_user] = lambda: (current_user, None)
+    if for_ws:
+        app.dependency_overrides[get_current_user_ws] = lambda: current_user
+    return TestClient(app)
@@ -27,6 +27,8 @@ class MockRoom:
         self.is_private = False
         self.created_by = 1
         self.created_at = self.updated_at = datetime(2024, 1, 1)
+        self.last_message_id = 1
+        self.last_activity_at = datetime(2024, 1, 1)
 
 
 class MockRoomInvitation:
@@ -1,5 +1,30 @@
+import asyncio
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+
+from src.auth.exceptions import AuthException
+from src.auth.introspection import TokenCache
+from src.auth.service import auth_callback, refresh_session
+from src.auth.tokens import (
+    CLAIM_REFRESH_SCRIPT,
+    REVOKE_FAMILY_SCRIPT,
+    create_access_token,
+    decode_access_token,
+    hash_token,
+)
 from tests.conftest import get_client
 from tests.fixtures.oauth import patch_google_oauth
+from tests.mocks import MockUser
+
+
+def redis_with_pipeline():
+    redis = AsyncMock()
+    pipeline = MagicMock()
+    pipeline.__aenter__.return_value = pipeline
+    pipeline.execute = AsyncMock(return_value=[])
+    redis.pipeline = MagicMock(return_value=pipeline)
+    return redis
 
 
 def test_login_redirect():
@@ -13,12 +38,141 @@ def test_auth_callback_success():
     client = get_client()
     response = client.get("/auth/callback")
     assert response.status_code == 200
-    assert response.json()["access_token"] == "mock_token"
+    assert decode_access_token(response.json()["access_token"]) == 1
+    assert response.json()["refresh_token"]
     assert response.json()["user"]["username"] == "TestUser"
 
 
+@pytest.mark.asyncio
+async def test_auth_callback_stores_google_refresh_token_for_returning_user():
+    user = MockUser()
+    user.refresh_token = ""
+    db = AsyncMock()
+    db.add = MagicMock()
+    db.execute.return_value = MagicMock(scalar_one_or_none=MagicMock(return_value=user))
+
+    await auth_callback(MagicMock(), db, redis_with_pipeline())
+
+    assert user.refresh_token == "mock_refresh_token"
+
+
 def test_logout():
     client = get_client()
     headers = {"Authorization": "Bearer mock_access_token"}
     response = client.get("/auth/logout", headers=headers)
     assert response.status_code == 204
+
+
+def test_access_token_is_verified_locally():
+    token = create_access_token(1)
+    assert decode_access_token(token) == 1
+    assert decode_access_token(token[:-2]) is None
+
+
+@pytest.mark.asyncio
+async def test_refresh_rotates_session_tokens(monkeypatch):
+    redis = redis_with_pipeline()
+    redis.eval.return_value = ["fresh", "1"]
+    db = AsyncMock()
+    db.execute.return_value = MagicMock(
+        scalar_one_or_none=MagicMock(return_value=MockUser())
+    )
+    fetch = AsyncMock(return_value={"access_token": "google_token"})
+    monkeypatch.setattr("src.auth.service.refresh_google_token", fetch)
+
+    user, access_token, refresh_token = await refresh_session("old", db, redis)
+
+    assert user.id == 1
+    assert decode_access_token(access_token) == 1
+    assert refresh_token != "old"
+    old_hash = hash_token("old")
+    redis.eval.assert_awaited_once_with(
+        CLAIM_REFRESH_SCRIPT,
+        3,
+        f"auth:refresh:{old_hash}",
+        f"auth:refresh:{old_hash}:used",
+        f"auth:refresh:{old_hash}:next",
+        "30",
+        "2592000",
+    )
+    fetch.assert_awaited_once_with("mock_refresh_token")
+
+    # Within the grace window a parallel request with the same cookie gets the
+    # pair the first refresh stored, not a session of its own.
+    successor_key, successor = redis.set.await_args.args
+    assert successor_key == f"auth:refresh:{old_hash}:next"
+    redis.eval.return_value = ["grace", successor]
+    second = await refresh_session("old", db, redis)
+    assert second[1:] == (access_token, refresh_token)
+    fetch.assert_awaited_once()
+
+    redis.eval.return_value = None
+    with pytest.raises(AuthException):
+        await refresh_session("old", db, redis)
+
+
+@pytest.mark.asyncio
+async def test_refresh_waits_for_pending_successor(monkeypatch):
+    redis = AsyncMock()
+    redis.eval.return_value = ["grace", "pending"]
+    redis.get.side_effect = [
+        "pending",
+        '{"user_id": 1, "access_token": "a", "refresh_token": "r"}',
+    ]
+    db = AsyncMock()
+    db.execute.return_value = MagicMock(
+        scalar_one_or_none=MagicMock(return_value=MockUser())
+    )
+    fetch = AsyncMock()
+    monkeypatch.setattr("src.auth.service.refresh_google_token", fetch)
+
+    _, access_token, refresh_token = await refresh_session("old", db, redis)
+
+    assert (access_token, refresh_token) == ("a", "r")
+    fetch.assert_not_awaited()
+
+
+@pytest.mark.asyncio
+async def test_refresh_reuse_revokes_family(monkeypatch):
+    redis = AsyncMock()
+    redis.eval.return_value = ["reused", "1"]
+    fetch = AsyncMock()
+    monkeypatch.setattr("src.auth.service.refresh_google_token", fetch)
+
+    with pytest.raises(AuthException):
+        await refresh_session("old", AsyncMock(), redis)
+
+    redis.eval.assert_awaited_with(
+        REVOKE_FAMILY_SCRIPT, 1, "auth:refresh_family:1", "auth:refresh:"
+    )
+    fetch.assert_not_awaited()
+
+
+@pytest.mark.asyncio
+async def test_token_cache_shares_one_upstream_call():
+    redis = AsyncMock()
+    pipeline = MagicMock()
+    pipeline.__aenter__.return_value = pipeline
+    pipeline.execute = AsyncMock(return_value=[None, -2])
+    redis.pipeline = MagicMock(return_value=pipeline)
+    calls = 0
+
+    async def introspect():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return 1, 3600
+
+    cache = TokenCache(maxsize=2)
+    results = await asyncio.gather(
+        *(cache.resolve("ya29.token", redis, introspect) for _ in range(10))
+    )
+    assert results == [1] * 10
+    assert calls == 1
+    redis.set.assert_awaited_once_with(
+        f"auth:token:{hash_token('ya29.token')}", 1, ex=300
+    )
+
+    assert await cache.resolve("ya29.token", redis, introspect) == 1
+    assert calls == 1
+    assert redis.pipeline.call_count == 1
@@ -0,0 +1,98 @@
+import asyncio
+import time
+from unittest.mock import AsyncMock
+
+import orjson
+import pytest
+
+from src.cache import ENTRY_HEADER, ReadThroughCache
+
+
+def make_redis(cached=None):
+    redis = AsyncMock()
+    redis.execute_command.return_value = cached
+    return redis
+
+
+def entry(value, delta, expires_at):
+    return ENTRY_HEADER.pack(delta, expires_at) + orjson.dumps(value)
+
+
+def make_loader(value):
+    calls = []
+
+    async def load():
+        calls.append(1)
+        await asyncio.sleep(0)
+        return value
+
+    return load, calls
+
+
+@pytest.mark.asyncio
+async def test_miss_loads_and_stores_with_jittered_ttl():
+    cache = ReadThroughCache("test", ttl=1000, jitter=0.1)
+    redis = make_redis()
+    load, calls = make_loader([{"id": 1}])
+
+    assert await cache.get_or_load(redis, "k", load) == b'[{"id":1}]'
+    assert await cache.get_or_load(redis, "k", load) == b'[{"id":1}]'
+
+    assert len(calls) == 1
+    key, payload = redis.set.await_args.args
+    _, expires_at = ENTRY_HEADER.unpack_from(payload)
+    assert key == "k" and payload[ENTRY_HEADER.size :] == b'[{"id":1}]'
+    assert 900 <= redis.set.await_args.kwargs["ex"] <= 1000
+    assert expires_at > time.time() + 899
+    assert cache.stats()["misses"] == 1
+    assert cache.stats()["local_hits"] == 1
+
+
+@pytest.mark.asyncio
+async def test_redis_hit_skips_loader():
+    cache = ReadThroughCache("test", ttl=1000)
+    redis = make_redis(entry([1, 2], 0.001, time.time() + 500))
+    load, calls = make_loader(None)
+
+    assert await cache.get_or_load(redis, "k", load) == b"[1,2]"
+    assert calls == []
+    assert cache.stats()["redis_hits"] == 1
+
+
+@pytest.mark.asyncio
+async def test_entry_near_expiry_is_refreshed_early():
+    cache = ReadThroughCache("test", ttl=1000)
+    # Took 10 s to build and expires in 1 ms: XFetch all but guarantees a refresh.
+    redis = make_redis(entry("old", 10.0, time.time() + 0.001))
+    load, calls = make_loader("new")
+
+    assert await cache.get_or_load(redis, "k", load) == b'"new"'
+    assert len(calls) == 1
+    assert cache.stats()["early_refreshes"] == 1
+
+
+@pytest.mark.asyncio
+async def test_concurrent_misses_share_one_load():
+    cache = ReadThroughCache("test", ttl=1000)
+    redis = make_redis()
+    load, calls = make_loader("v")
+
+    results = await asyncio.gather(
+        *(cache.get_or_load(redis, "k", load) for _ in range(10))
+    )
+
+    assert results == [b'"v"'] * 10
+    assert len(calls) == 1
+    assert cache.stats()["coalesced"] == 9
+
+
+@pytest.mark.asyncio
+async def test_redis_errors_fall_back_to_loader():
+    cache = ReadThroughCache("test", ttl=1000)
+    redis = make_redis()
+    redis.execute_command.side_effect = ConnectionError("down")
+    redis.set.side_effect = ConnectionError("down")
+    load, calls = make_loader("v")
+
+    assert await cache.get_or_load(redis, "k", load) == b'"v"'
+    assert cache.stats()["errors"] == 2
@@ -1,4 +1,27 @@
+from datetime import datetime
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+
+from src.messages.schemas import MessageCreateRequest
+from src.messages.service import (
+    SUBSTRING_RANK,
+    delete_message,
+    mark_delivered,
+    receipt_status,
+    search_messages,
+    send_message,
+)
+from src.pagination import (
+    SearchPagination,
+    decode_cursor,
+    decode_search_cursor,
+    encode_cursor,
+    encode_search_cursor,
+)
 from tests.conftest import get_client
+from tests.mocks import MockMessage, MockUser
 
 
 def test_send_message():
@@ -51,6 +74,36 @@ def test_delete_message():
     assert data["status"] == "deleted"
 
 
+@pytest.mark.asyncio
+async def test_delete_unknown_message_hides_nothing():
+    db = AsyncMock()
+    db.execute.return_value = MagicMock(scalar_one_or_none=MagicMock(return_value=None))
+
+    with pytest.raises(ValueError):
+        await delete_message(404, db, AsyncMock(), MockUser())
+
+    db.execute.assert_awaited_once()
+    db.commit.assert_not_awaited()
+
+
+@pytest.mark.asyncio
+async def test_delete_message_refreshes_the_deleters_room_list():
+    db = AsyncMock()
+    db.execute.return_value = MagicMock(
+        scalar_one_or_none=MagicMock(return_value=MockMessage())
+    )
+    redis = AsyncMock()
+
+    with (
+        patch("src.messages.service.bump_cache_versions", AsyncMock()) as bump,
+        patch("src.messages.service.emit_last_message", AsyncMock()) as emit,
+    ):
+        await delete_message(1, db, redis, MockUser())
+
+    bump.assert_awaited_once_with(redis, rooms=[1])
+    assert emit.await_args.args[2] == [1]
+
+
 def test_search_messages_in_room():
     client = get_client()
 
@@ -59,3 +112,129 @@ def test_search_messages_in_room():
     messages = search_resp.json()
     assert isinstance(messages, list)
     assert any("hello" in msg["content"].lower() for msg in messages)
+
+
+@pytest.mark.asyncio
+async def test_send_message_is_one_statement():
+    db = AsyncMock()
+    db.execute.return_value.one = lambda: SimpleNamespace(
+        **vars(MockMessage()), participant_ids=[1, 2]
+    )
+    redis = AsyncMock()
+    files = [{"url": "https://test/a.jpg"}, {"url": "https://test/b.jpg"}]
+
+    with (
+        patch("src.messages.service.take_temp_files", AsyncMock(return_value=files)),
+        patch("src.messages.service.increment_unread", AsyncMock()) as increment,
+        patch("src.messages.service.bump_cache_versions", AsyncMock()) as bump,
+    ):
+        result = await send_message(
+            MessageCreateRequest(room_id=1, content="Hello!"), db, redis, MockUser()
+        )
+
+    assert result.id == 1
+    db.execute.assert_awaited_once()
+    db.add.assert_not_called()
+    sql = str(db.execute.await_args.args[0])
+    assert "UPDATE room_user" in sql
+    assert "INSERT INTO file_storage" in sql
+    increment.assert_awaited_once_with(redis, 1, [2])
+    bump.assert_awaited_once_with(redis, rooms=[1, 2])
+
+
+@pytest.mark.asyncio
+async def test_delivery_ack_moves_only_the_delivered_watermark():
+    db = AsyncMock()
+
+    await mark_delivered(1, 7, db, MockUser())
+
+    statement = db.execute.await_args.args[0]
+    sql = str(statement)
+    assert "SET last_delivered_message_id" in sql
+    assert "last_read_message_id" not in sql
+    assert statement.compile().params["user_id_1"] == 1
+    db.commit.assert_awaited_once()
+    # The recipient's delivered watermark is now ahead of its read one.
+    assert receipt_status(7, (7, 0)) == "delivered"
+
+
+def test_receipt_status_follows_member_watermarks():
+    receipts = (5, 3)
+    assert receipt_status(3, receipts) == "viewed"
+    assert receipt_status(4, receipts) == "delivered"
+    assert receipt_status(6, receipts) == "sent"
+
+
+def test_message_cursor_round_trip():
+    created_at = datetime(2024, 1, 1, 12, 30)
+    assert decode_cursor(encode_cursor(created_at, 42)) == (created_at, 42)
+    with pytest.raises(ValueError):
+        decode_cursor("not-a-cursor")
+
+
+def test_get_messages_by_room_with_cursor():
+    client = get_client()
+    response = client.get("/messages/room/1", params={"before": ""})
+    assert response.status_code == 200
+    cursor = response.json()[0]["cursor"]
+
+    response = client.get("/messages/room/1", params={"before": cursor})
+    assert response.status_code == 200
+
+    response = client.get("/messages/room/1", params={"after": "broken"})
+    assert response.status_code == 400
+
+
+def test_search_messages_ranked_page():
+    client = get_client()
+    response = client.get("/messages/search/hello", params={"room_id": 1, "limit": 10})
+    assert response.status_code == 200
+    found = response.json()[0]
+    assert found["snippet"] == "<mark>Hello</mark>!"
+    assert decode_search_cursor(found["cursor"])[2] == found["id"]
+
+    response = client.get(
+        "/messages/search/hello", params={"room_id": 1, "cursor": found["cursor"]}
+    )
+    assert response.status_code == 200
+
+    response = client.get(
+        "/messages/search/hello", params={"room_id": 1, "cursor": "broken"}
+    )
+    assert response.status_code == 400
+
+
+@pytest.mark.asyncio
+async def test_search_falls_back_to_substring_only_without_word_matches():
+    message = MockMessage()
+    db = AsyncMock()
+    db.execute.side_effect = [
+        MagicMock(all=lambda: []),
+        MagicMock(all=lambda: [(message, SUBSTRING_RANK, "Hello!")]),
+    ]
+
+    results = await search_messages(1, "ell", db, MockUser(), SearchPagination())
+
+    fts, substring = (c.args[0] for c in db.execute.await_args_list)
+    assert "@@" in str(fts) and "LIKE" not in str(fts)
+    assert "LIKE" in str(substring) and "@@" not in str(substring)
+    assert decode_search_cursor(results[0].cursor)[0] == SUBSTRING_RANK
+
+    # Later fallback pages skip the word query entirely.
+    db.execute.reset_mock(side_effect=True)
+    db.execute.return_value = MagicMock(all=lambda: [])
+    await search_messages(
+        1, "ell", db, MockUser(), SearchPagination(cursor=results[0].cursor)
+    )
+    assert "@@" not in str(db.execute.await_args.args[0])
+
+    # Patterns too short for a trigram never reach the substring scan.
+    db.execute.reset_mock()
+    assert await search_messages(1, "el", db, MockUser(), SearchPagination()) == []
+    db.execute.assert_awaited_once()
+
+    # A word-query cursor keeps paging the ranked results, even when empty.
+    db.execute.reset_mock()
+    cursor = encode_search_cursor(0.1, datetime(2024, 1, 1), 1)
+    await search_messages(1, "ell", db, MockUser(), SearchPagination(cursor=cursor))
+    db.execute.assert_awaited_once()
@@ -1,4 +1,26 @@
+import time
+from datetime import datetime
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import orjson
+import pytest
+from fastapi import Response
+from pydantic import ValidationError
+
+from src import Pagination
+from src.cache import ENTRY_HEADER, rooms_cache, versioned_key
+from src.constants import TEMP_ROOMS_KEY
+from src.responses import raw_json_response
+from src.rooms.members import (
+    REMOVE_MEMBER_SCRIPT,
+    get_room_members,
+    load_room_members,
+)
+from src.rooms.schemas import RoomInviteRequest
+from src.rooms.service import get_rooms, invite_user, leave_room
+from src.websocket.service import get_room_list
 from tests.conftest import get_client
+from tests.mocks import MockMessage, MockRoom, MockRoomUser, MockUser
 
 
 def test_create_room():
@@ -54,7 +76,12 @@ def test_get_room_participants():
     client = get_client()
     response = client.get("/rooms/1/participants")
     assert response.status_code == 200
-    assert isinstance(response.json(), list)
+    assert response.json() == [
+        {
+            "user_id": 1,
+            "joined_at": datetime.fromtimestamp(1704067200.0).isoformat(),
+        }
+    ]
 
 
 def test_get_all_rooms():
@@ -62,6 +89,7 @@ def test_get_all_rooms():
     response = client.get("/rooms/all")
     assert response.status_code == 200
     assert isinstance(response.json(), list)
+    assert response.json()[0]["unread_count"] == 3
 
 
 def test_patch_room():
@@ -87,3 +115,167 @@ def test_join_public_room():
     data = response.json()
     assert data["id"] == 1
     assert data["is_private"] is False
+
+
+@pytest.mark.asyncio
+async def test_room_list_is_one_statement():
+    rooms = []
+    for room_id in range(1, 101):
+        room = MockRoom()
+        room.id = room_id
+        rooms.append((room, MockMessage() if room_id % 2 else None))
+
+    db = AsyncMock()
+    db.execute.return_value.all = lambda: rooms
+    redis = AsyncMock()
+    redis.get.return_value = "3"
+    redis.execute_command.return_value = None
+    redis.hgetall.return_value = {"3": "7"}
+
+    rooms_cache.clear()
+    result = orjson.loads(await get_rooms(db, redis, MockUser(), Pagination(limit=100)))
+    assert len(result) == 100
+    assert [room["unread_count"] for room in result[1:4]] == [0, 7, 0]
+    assert db.execute.await_count == 1
+    assert "JOIN messages" in str(db.execute.await_args.args[0])
+    assert "hidden_messages" in str(db.execute.await_args.args[0])
+    assert redis.set.await_args.args[0] == "user:1:rooms:v3:100:0"
+
+    db.execute.reset_mock()
+    room_list = await get_room_list(1, db, redis)
+    assert len(room_list) == 100
+    assert room_list[1]["last_message"] is None
+    assert room_list[2]["unread_count"] == 7
+    assert db.execute.await_count == 1
+
+
+@pytest.mark.asyncio
+async def test_versioned_key_embeds_current_version():
+    redis = AsyncMock()
+    redis.get.return_value = "4"
+    key = await versioned_key(
+        redis, "user:1:rooms:version", TEMP_ROOMS_KEY, user_id=1, limit=20, offset=0
+    )
+    assert key == "user:1:rooms:v4:20:0"
+    redis.get.assert_awaited_once_with("user:1:rooms:version")
+
+
+@pytest.mark.asyncio
+async def test_invite_bumps_sender_and_receiver_versions():
+    db = AsyncMock()
+    db.add = MagicMock(side_effect=lambda obj: setattr(obj, "id", 1))
+    db.execute.return_value.scalar_one_or_none = lambda: MockRoomUser()
+    redis = AsyncMock()
+
+    with patch("src.rooms.service.bump_cache_versions", AsyncMock()) as bump:
+        await invite_user(
+            RoomInviteRequest(room_id=1, receiver_id=2), db, MockUser(), redis
+        )
+    bump.assert_awaited_once_with(redis, invites=[1, 2])
+
+
+@pytest.mark.asyncio
+async def test_cached_rooms_are_served_as_stored_bytes():
+    stored = b'[{"id":1,"name":"Test Room","unread_count":0}]'
+    redis = AsyncMock()
+    redis.get.return_value = "1"
+    redis.execute_command.return_value = (
+        ENTRY_HEADER.pack(0.0, time.time() + 60) + stored
+    )
+    redis.hgetall.return_value = {}
+    db = AsyncMock()
+
+    rooms_cache.clear()
+    assert await get_rooms(db, redis, MockUser(), Pagination()) == stored
+    db.execute.assert_not_awaited()
+
+    client = get_client()
+    response = client.get("/rooms/invitations/received")
+    assert response.headers["content-type"] == "application/json"
+
+
+def test_raw_json_response_keeps_refreshed_cookie():
+    injected = Response()
+    injected.set_cookie(key="access_token", value="new")
+
+    raw = raw_json_response(b"[]", injected)
+
+    assert raw.body == b"[]"
+    assert raw.headers["content-length"] == "2"
+    assert "access_token=new" in raw.headers["set-cookie"]
+
+
+def make_members_redis(page, version="7", version_after="7"):
+    pipe = MagicMock()
+    pipe.__aenter__.return_value = pipe
+    pipe.watch = AsyncMock()
+    pipe.get = AsyncMock(return_value=version_after)
+    pipe.execute = AsyncMock()
+    redis = AsyncMock()
+    redis.eval.return_value = page
+    redis.get.return_value = version
+    redis.pipeline = MagicMock(return_value=pipe)
+    return redis, pipe
+
+
+@pytest.mark.asyncio
+async def test_participant_page_is_a_zrange():
+    redis, _ = make_members_redis(["2", "1704067200.0", "5", "1704067260.5"])
+    db = AsyncMock()
+
+    members = await get_room_members(1, db, redis, offset=20, limit=2)
+
+    assert [user_id for user_id, _ in members] == [2, 5]
+    assert members[1][1] == datetime.fromtimestamp(1704067260.5)
+    assert redis.eval.await_args.args[1:] == (1, "room:1:members", "20", "21")
+    db.execute.assert_not_awaited()
+
+
+@pytest.mark.asyncio
+async def test_empty_participant_page_never_reads_the_whole_set():
+    redis, _ = make_members_redis(["2", "1704067200.0"])
+
+    assert await get_room_members(1, AsyncMock(), redis, offset=0, limit=0) == []
+    redis.eval.assert_not_awaited()
+    with pytest.raises(ValidationError):
+        Pagination(limit=0)
+
+
+@pytest.mark.asyncio
+async def test_missing_member_set_is_rebuilt_from_postgres():
+    redis, pipe = make_members_redis(None)
+    db = AsyncMock()
+    joined = datetime(2024, 1, 1)
+    db.execute.return_value.all = lambda: [(1, joined), (2, joined), (3, joined)]
+
+    members = await get_room_members(1, db, redis, offset=1, limit=1)
+
+    assert members == [(2, joined)]
+    pipe.watch.assert_awaited_once_with("room:1:members:version")
+    pipe.zadd.assert_called_once_with(
+        "room:1:members", {str(i): joined.timestamp() for i in (1, 2, 3)}
+    )
+    pipe.execute.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_rebuild_racing_a_membership_change_is_not_stored():
+    redis, pipe = make_members_redis(None, version="7", version_after="8")
+    db = AsyncMock()
+    db.execute.return_value.all = lambda: [(1, datetime(2024, 1, 1))]
+
+    assert await load_room_members(1, db, redis) == [(1, datetime(2024, 1, 1))]
+    pipe.zadd.assert_not_called()
+    pipe.execute.assert_not_awaited()
+
+
+@pytest.mark.asyncio
+async def test_leave_room_removes_member_from_set():
+    db = AsyncMock()
+    redis, _ = make_members_redis(1)
+
+    await leave_room(1, db, MockUser(), redis)
+
+    script, numkeys, *args = redis.eval.await_args.args
+    assert script == REMOVE_MEMBER_SCRIPT
+    assert args == ["room:1:members", "room:1:members:version", "1"]
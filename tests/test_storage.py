@@ -1,6 +1,15 @@
+import asyncio
 import io
-from unittest.mock import patch
+import json
+import time
+from unittest.mock import AsyncMock, MagicMock, patch
 
+import pytest
+
+from src import add_files_to_temp_redis, settings, take_temp_files
+from src.cache import TAKE_TEMP_FILES_SCRIPT
+from src.minio_client import StorageEngine
+from src.storage.service import upload_files
 from tests.conftest import get_client
 
 
@@ -18,3 +27,120 @@ def test_upload_file(mock_upload):
     )
     assert response.status_code == 200
     assert response.json() == {"file_url": "https://fake-url.com/file.jpg"}
+
+
+@patch(
+    "src.storage.service.upload_file_to_minio",
+    side_effect=["https://fake-url.com/a.jpg", "https://fake-url.com/b.jpg"],
+)
+def test_upload_files_stages_in_one_transaction(mock_upload):
+    client = get_client()
+    response = client.post(
+        "/files/upload/batch?room_id=1",
+        files=[
+            ("files", ("a.jpg", io.BytesIO(b"a"), "image/jpeg")),
+            ("files", ("b.jpg", io.BytesIO(b"b"), "image/jpeg")),
+        ],
+    )
+    assert response.status_code == 200
+    assert response.json() == {
+        "file_urls": ["https://fake-url.com/a.jpg", "https://fake-url.com/b.jpg"]
+    }
+
+
+@pytest.mark.asyncio
+async def test_upload_files_removes_uploaded_objects_when_one_fails():
+    upload = AsyncMock(side_effect=["https://fake-url.com/a.jpg", OSError("boom")])
+    remove = AsyncMock()
+    redis = AsyncMock()
+    files = [MagicMock(filename="a.jpg"), MagicMock(filename="b.jpg")]
+    with (
+        patch("src.storage.service.upload_file_to_minio", upload),
+        patch("src.storage.service.remove_file_from_minio", remove),
+    ):
+        with pytest.raises(OSError):
+            await upload_files(1, files, redis, MagicMock(id=1))
+
+    remove.assert_awaited_once_with("https://fake-url.com/a.jpg")
+    redis.eval.assert_not_awaited()
+    redis.pipeline.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_staging_is_one_round_trip_each_way():
+    pipe = MagicMock()
+    pipe.__aenter__.return_value = pipe
+    pipe.execute = AsyncMock()
+    redis = MagicMock()
+    redis.pipeline.return_value = pipe
+    redis.eval = AsyncMock(return_value=['{"url": "https://t/a.jpg"}'])
+
+    await add_files_to_temp_redis(redis, 1, 2, ["https://t/a.jpg", "https://t/b.jpg"])
+    key, *entries = pipe.rpush.call_args.args
+    assert key == "user:1:2:staged_files"
+    assert [json.loads(e)["url"] for e in entries] == [
+        "https://t/a.jpg",
+        "https://t/b.jpg",
+    ]
+    pipe.expire.assert_called_once_with(key, settings.TEMP_FILES_TTL)
+
+    redis.pipeline.assert_called_once_with(transaction=True)
+    pipe.execute.assert_awaited_once()
+
+    assert await take_temp_files(redis, 1, 2) == [{"url": "https://t/a.jpg"}]
+    redis.eval.assert_awaited_once_with(TAKE_TEMP_FILES_SCRIPT, 1, key)
+
+
+@pytest.mark.asyncio
+async def test_storage_engine_streams_from_spool_and_checks_bucket_once():
+    engine = StorageEngine()
+    client = MagicMock()
+    client.bucket_exists.return_value = True
+    engine._client = client
+
+    spool = io.BytesIO(b"x" * 1024)
+    spool.seek(512)
+    urls = [
+        await engine.upload(spool, "a.bin", "application/octet-stream", 1024)
+        for _ in range(2)
+    ]
+    await engine.close()
+
+    client.bucket_exists.assert_called_once_with(settings.MINIO_BUCKET_NAME)
+    assert client.put_object.call_count == 2
+    call = client.put_object.call_args
+    assert call.kwargs["data"] is spool
+    assert call.kwargs["length"] == 1024
+    assert call.kwargs["part_size"] == settings.MINIO_PART_SIZE
+    assert call.kwargs["num_parallel_uploads"] == 1
+    assert spool.tell() == 0
+    assert all(url.endswith("_a.bin") for url in urls)
+
+
+@pytest.mark.asyncio
+async def test_storage_engine_close_waits_for_uploads_off_the_loop():
+    engine = StorageEngine()
+    client = MagicMock()
+    client.bucket_exists.return_value = True
+    client.put_object.side_effect = lambda *args, **kwargs: time.sleep(0.2)
+    engine._client = client
+
+    upload = asyncio.create_task(
+        engine.upload(io.BytesIO(b"x"), "a.bin", "application/octet-stream", 1)
+    )
+    await asyncio.sleep(0.05)
+    ticks = 0
+
+    async def tick():
+        nonlocal ticks
+        while True:
+            ticks += 1
+            await asyncio.sleep(0.01)
+
+    ticker = asyncio.create_task(tick())
+    await engine.close()
+    ticker.cancel()
+
+    assert client.put_object.call_count == 1
+    assert ticks > 5
+    await upload
@@ -0,0 +1,67 @@
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+
+from src.unread import (
+    RECONCILE_SCRIPT,
+    get_unread_counts,
+    increment_unread,
+    reconcile_unread,
+)
+
+
+def make_redis():
+    pipe = MagicMock()
+    pipe.__aenter__.return_value = pipe
+    pipe.execute = AsyncMock(return_value=[])
+    redis = AsyncMock()
+    redis.pipeline = MagicMock(return_value=pipe)
+    return redis, pipe
+
+
+@pytest.mark.asyncio
+async def test_increment_unread_pipelines_one_hincrby_per_member():
+    redis, pipe = make_redis()
+    await increment_unread(redis, 5, [2, 3])
+
+    assert [c.args for c in pipe.hincrby.call_args_list] == [
+        ("user:2:unread", "5", 1),
+        ("user:3:unread", "5", 1),
+    ]
+    pipe.execute.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_get_unread_counts_survives_redis_errors():
+    redis = AsyncMock()
+    redis.hgetall.return_value = {"5": "2"}
+    assert await get_unread_counts(redis, 1) == {5: 2}
+
+    redis.hgetall.side_effect = ConnectionError("down")
+    assert await get_unread_counts(redis, 1) == {}
+
+
+@pytest.mark.asyncio
+async def test_reconcile_rebuilds_hashes_from_watermarks():
+    db = AsyncMock()
+    db.execute.return_value.all = lambda: [(1, 5, 4), (1, 6, 1)]
+    redis, pipe = make_redis()
+    pipe.execute.side_effect = [[{"5": "2", "7": "3"}, {}], []]
+
+    await reconcile_unread([1, 2], db, redis)
+
+    assert [c.args[0] for c in pipe.hgetall.call_args_list] == [
+        "user:1:unread",
+        "user:2:unread",
+    ]
+    (call,) = pipe.eval.call_args_list
+    script, numkeys, key, *args = call.args
+    assert (script, numkeys, key) == (RECONCILE_SCRIPT, 1, "user:1:unread")
+    assert sorted(zip(args[::3], args[1::3], args[2::3])) == [
+        ("5", "2", "4"),
+        ("6", "", "1"),
+        ("7", "3", "0"),
+    ]
+    sql = str(db.execute.await_args.args[0])
+    assert "last_read_message_id" in sql
+    assert "hidden_messages" in sql
@@ -1,9 +1,20 @@
+import asyncio
 import time
-from unittest.mock import AsyncMock
+from unittest.mock import AsyncMock, MagicMock
 
-from src import Pagination
+import msgpack
+import orjson
+import pytest
+
+from src import Pagination, settings
+from src.broker import RedisBroker, room_channel
+from src.connections import Connection, ConnectionRegistry, heartbeat
+from src.events import MESSAGE_SENT, bus
+from src.frames import Frame
 from src.messages.manager import manager as chat_manager
+from src.messages.schemas import MessageUpdateResponse
 from src.websocket.manager import manager as global_manager
+from src.websocket.service import get_online_users
 from tests.conftest import get_client
 
 
@@ -47,6 +58,20 @@ def test_chat_ws_get_messages():
         assert chat_manager.active_connections.get(1) is None
 
 
+def test_chat_ws_get_messages_ignores_bad_pagination():
+    client = get_client(for_ws=True)
+
+    with client.websocket_connect("/ws/chat/1") as websocket:
+        websocket.send_json(
+            {"action": "get_messages", "pagination": {"before": "not-a-cursor"}}
+        )
+        websocket.send_json({"action": "get_messages", "pagination": {"limit": 0}})
+        websocket.send_json({"action": "get_message", "message_id": 1})
+        response = websocket.receive_json()
+
+        assert response["type"] == "message_detail"
+
+
 def test_chat_ws_get_message():
     client = get_client(for_ws=True)
 
@@ -119,3 +144,209 @@ def test_chat_ws_delete_message(monkeypatch):
 
         websocket.close()
         time.sleep(0.1)
+
+
+@pytest.mark.asyncio
+async def test_redis_broker_publishes_to_room_channel():
+    redis = AsyncMock()
+    broker = RedisBroker(redis, room_channel)
+
+    await broker.publish(1, Frame("new_message", {"id": 1}))
+
+    redis.publish.assert_awaited_once_with(
+        "chat:room:1", '{"type":"new_message","data":{"id":1}}'
+    )
+
+
+def test_connection_queue_drops_oldest_when_full():
+    connection = Connection(AsyncMock(), user_id=1, max_queue=2, policy="drop_oldest")
+
+    for i in range(3):
+        assert connection.send(Frame("new_message", {"id": i}))
+
+    assert connection.depth == 2
+    assert connection.dropped == 1
+
+
+def test_connection_queue_coalesces_superseded_events():
+    connection = Connection(AsyncMock(), user_id=1, max_queue=2, policy="coalesce")
+
+    connection.send(Frame("message_edited", {"message_id": 1}))
+    connection.send(Frame("new_message", {"id": 2}))
+    connection.send(Frame("message_edited", {"message_id": 1}))
+
+    assert connection.depth == 2
+    assert connection.dropped == 1
+
+
+@pytest.mark.asyncio
+async def test_connection_evicts_slow_consumer():
+    websocket = AsyncMock()
+    connection = Connection(websocket, user_id=1, max_queue=1, policy="disconnect")
+
+    connection.send(Frame("new_message", {"id": 1}))
+    assert not connection.send(Frame("new_message", {"id": 2}))
+    assert connection.evicted
+
+    connection.start()
+    await asyncio.sleep(0)
+
+    websocket.close.assert_awaited_once_with(code=1013)
+    websocket.send_text.assert_not_awaited()
+
+
+def test_registry_indexes_connections_by_room():
+    registry = ConnectionRegistry()
+    first = Connection(AsyncMock(), user_id=1)
+    second = Connection(AsyncMock(), user_id=2)
+    registry.add(first)
+    registry.add(second)
+
+    assert registry.join(first, 1)
+    assert not registry.join(second, 1)
+    assert registry.room_count(1) == 2
+
+    assert registry.remove(first) == []
+    assert registry.in_room(1) == [second]
+    assert registry.remove(second) == [1]
+    assert registry.room_count(1) == 0
+
+
+def test_registry_keeps_every_socket_of_a_user():
+    registry = ConnectionRegistry()
+    phone = Connection(AsyncMock(), user_id=1)
+    laptop = Connection(AsyncMock(), user_id=1)
+
+    assert registry.add(phone)
+    assert not registry.add(laptop)
+    registry.join(phone, 1)
+    registry.join(laptop, 2)
+
+    assert registry.room_count(1) == 1
+    assert registry.users_in_room(2) == [1]
+
+    assert registry.remove(phone) == [1]
+    assert registry.is_online(1)
+    assert registry.get(1) == {laptop}
+    assert registry.remove(laptop) == [2]
+    assert not registry.is_online(1)
+
+
+def test_frame_is_encoded_once():
+    frame = Frame("message_edited", MessageUpdateResponse(message_id=1))
+
+    assert (
+        frame.text
+        == '{"type":"message_edited","data":{"message_id":1,"status":"updated"}}'
+    )
+    assert frame.text is frame.text
+    assert frame.get("message_id") == 1
+    assert msgpack.unpackb(frame.packed) == orjson.loads(frame.text)
+
+
+def test_chat_ws_msgpack_subprotocol():
+    client = get_client(for_ws=True)
+
+    with client.websocket_connect(
+        "/ws/chat/1", subprotocols=["chat.msgpack.v1"]
+    ) as websocket:
+        assert websocket.accepted_subprotocol == "chat.msgpack.v1"
+
+        websocket.send_bytes(msgpack.packb({"action": "get_message", "message_id": 1}))
+        response = msgpack.unpackb(websocket.receive_bytes())
+
+        assert response["type"] == "message_detail"
+        assert response["data"]["id"] == 1
+        assert response["data"]["content"] == "Hello!"
+
+        websocket.close()
+        time.sleep(0.1)
+
+
+@pytest.mark.asyncio
+async def test_heartbeat_pings_idle_and_reaps_dead_sockets():
+    idle = Connection(AsyncMock(), user_id=1)
+    dead = Connection(AsyncMock(), user_id=2)
+    legacy = Connection(AsyncMock(), user_id=3)
+    idle.last_seen -= 30
+    dead.last_seen -= 120
+    dead.answers_pings = True
+    legacy.last_seen -= 120
+    silent = Connection(AsyncMock(), user_id=4)
+    silent.last_seen -= 900
+    disconnect = AsyncMock()
+
+    reaped = await heartbeat([idle, dead, legacy, silent], disconnect)
+
+    assert reaped == 2
+    assert idle.depth == 1
+    assert legacy.depth == 1
+    assert [c.args for c in disconnect.await_args_list] == [
+        (dead, 1001),
+        (silent, 1001),
+    ]
+
+
+@pytest.mark.asyncio
+async def test_stuck_write_closes_the_connection(monkeypatch):
+    monkeypatch.setattr(settings, "WS_SEND_TIMEOUT", 0.05)
+
+    async def stuck(text):
+        await asyncio.sleep(10)
+
+    websocket = AsyncMock()
+    websocket.send_text.side_effect = stuck
+    connection = Connection(websocket, user_id=1)
+    connection.start()
+
+    connection.send(Frame("new_message", {"id": 1}))
+    await asyncio.sleep(0.2)
+
+    assert connection.closed
+    await connection.close()
+
+
+@pytest.mark.asyncio
+async def test_pong_opts_a_connection_into_idle_eviction():
+    websocket = AsyncMock()
+    websocket.receive_json.return_value = {"action": "pong"}
+    connection = Connection(websocket, user_id=1)
+
+    assert not connection.answers_pings
+    await connection.receive()
+    assert connection.answers_pings
+
+
+@pytest.mark.asyncio
+async def test_presence_lookup_is_one_pipelined_call():
+    redis = MagicMock()
+    pipeline = MagicMock()
+    pipeline.__aenter__.return_value = pipeline
+    pipeline.execute = AsyncMock(
+        return_value=[[str(time.time() + 60)], [], [str(time.time() - 1)]]
+    )
+    redis.pipeline.return_value = pipeline
+
+    online = await get_online_users([1, 2, 3], redis)
+
+    assert online == {1}
+    pipeline.execute.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_message_event_is_pushed_to_member_sockets():
+    member = Connection(AsyncMock(), user_id=2)
+    outsider = Connection(AsyncMock(), user_id=3)
+    global_manager.registry.add(member)
+    global_manager.registry.add(outsider)
+    try:
+        await bus.emit(
+            MESSAGE_SENT, {"room_id": 1, "user_ids": [1, 2], "last_message": None}
+        )
+    finally:
+        global_manager.registry.remove(member)
+        global_manager.registry.remove(outsider)
+
+    assert member.depth == 1
+    assert outsider.depth == 0
+    assert member._queue[0].type == "last_message_update"